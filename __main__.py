@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+
+"""
+Runs the `enterprise-security-team` command (see `src/cli.py`), from a checkout with
+`python . <subcommand>`, or as the zipapp that `make-zipapp.py` builds.
+"""
+
+from src import cli
+
+if __name__ == "__main__":
+    cli.main()
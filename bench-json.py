@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+"""
+Measures the CPU time and memory of decoding large API listings, comparing the
+standard `json` module with the optional backends in `src/fastjson.py`: `orjson`
+for whole documents, and `ijson` for parsing out only the fields that are used.
+Try one very large page (e.g. `--pages 1 --page-size 50000`) as well as many
+normal ones, to see where parsing incrementally starts to pay off.
+
+The listing is made of pages of REST members (shaped like GitHub's, with all their
+URLs), or of a saved JSON array response given with --sample. No API calls are made.
+
+Inputs:
+- Number of pages and members per page, or a sample response
+- Number of rounds to time
+
+Outputs:
+- CPU seconds per round, and peak memory to hold the decoded listing, per method
+"""
+
+from argparse import ArgumentParser
+import json
+import time
+import tracemalloc
+from typing import Any, Callable
+from src import fastjson
+from src.users import MEMBER_FIELDS
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+def add_args(parser: ArgumentParser) -> None:
+    """Add arguments to the command line parser."""
+    parser.add_argument(
+        "--pages",
+        type=int,
+        default=100,
+        help="Pages in the listing (default: 100)",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=100,
+        help="Members per page (default: 100)",
+    )
+    parser.add_argument(
+        "--sample",
+        required=False,
+        help="Saved JSON array response to use as every page, instead of generated members",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=5,
+        help="Times to decode the listing for the CPU timing (default: 5)",
+    )
+    parser.add_argument(
+        "--debug",
+        "-d",
+        action="store_true",
+        help="Enable debug logging",
+    )
+
+
+def make_member(i: int) -> dict[str, Any]:
+    """A member as GitHub's REST API lists it."""
+    login = "user-{:06d}".format(i)
+    url = "https://api.github.com/users/" + login
+    return {
+        "login": login,
+        "id": 1000000 + i,
+        "node_id": "MDQ6VXNlcj{:06d}".format(i),
+        "avatar_url": "https://avatars.githubusercontent.com/u/{}?v=4".format(i),
+        "gravatar_id": "",
+        "url": url,
+        "html_url": "https://github.com/" + login,
+        "followers_url": url + "/followers",
+        "following_url": url + "/following{/other_user}",
+        "gists_url": url + "/gists{/gist_id}",
+        "starred_url": url + "/starred{/owner}{/repo}",
+        "subscriptions_url": url + "/subscriptions",
+        "organizations_url": url + "/orgs",
+        "repos_url": url + "/repos",
+        "events_url": url + "/events{/privacy}",
+        "received_events_url": url + "/received_events",
+        "type": "User",
+        "user_view_type": "public",
+        "site_admin": False,
+    }
+
+
+def make_pages(pages: int, page_size: int) -> list[bytes]:
+    """Pages of generated members, as response bodies."""
+    return [
+        json.dumps(
+            [make_member(page * page_size + i) for i in range(page_size)]
+        ).encode("utf-8")
+        for page in range(pages)
+    ]
+
+
+def measure(
+    pages: list[bytes], decode: Callable[[bytes], list[Any]], rounds: int
+) -> tuple[float, int]:
+    """
+    CPU seconds per round to decode every page, and the peak memory (bytes) of
+    decoding the listing and holding the result.
+    """
+    start = time.process_time()
+    for _ in range(rounds):
+        for page in pages:
+            decode(page)
+    cpu = (time.process_time() - start) / rounds
+
+    tracemalloc.start()
+    listing = []
+    for page in pages:
+        listing.extend(decode(page))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def main() -> None:
+    """Command line entrypoint."""
+    parser = ArgumentParser(description=__doc__)
+    add_args(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    if args.sample:
+        with open(args.sample, "rb") as f:
+            pages = [f.read()] * args.pages
+    else:
+        pages = make_pages(args.pages, args.page_size)
+    LOG.info(
+        "Listing: {} pages, {:.1f} MB".format(
+            len(pages), sum(len(page) for page in pages) / 1e6
+        )
+    )
+
+    def select(items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        return [{field: item[field] for field in MEMBER_FIELDS} for item in items]
+
+    methods: dict[str, Callable[[bytes], list[Any]]] = {
+        "json": json.loads,
+        "json, used fields": lambda page: select(json.loads(page)),
+    }
+    if fastjson.orjson is not None:
+        methods["orjson"] = fastjson.orjson.loads
+        methods["orjson, used fields"] = lambda page: select(
+            fastjson.orjson.loads(page)
+        )
+    else:
+        LOG.info("orjson is not installed (pip install orjson)")
+    if fastjson.load_ijson():
+        methods["ijson ({}), used fields".format(fastjson.ijson.backend)] = (
+            lambda page: list(fastjson.stream_fields(page, MEMBER_FIELDS))
+        )
+    else:
+        LOG.info("ijson is not installed (pip install ijson)")
+    methods["src/fastjson.py"] = lambda page: list(
+        fastjson.iter_fields(page, MEMBER_FIELDS)
+    )
+
+    baseline = None
+    for name, decode in methods.items():
+        cpu, peak = measure(pages, decode, args.rounds)
+        if baseline is None:
+            baseline = cpu
+        LOG.info(
+            "{:<28} {:7.3f}s CPU ({:4.1f}x)  {:7.1f} MB peak".format(
+                name, cpu, baseline / cpu if cpu else 0.0, peak / 1e6
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
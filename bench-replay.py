@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+"""
+Replays a cassette of recorded API traffic (see `src/cassette.py`) against the
+`src` functions, without network access, to measure changes to pagination, batching
+and concurrency on the data of a real enterprise: its number of organizations,
+their sizes, and the API's latencies.
+
+Record a cassette by running any script with `--record CASSETTE`, e.g.
+`org-admin-promote.py` then `manage-sec-team.py`, each to its own cassette, or
+both to one with `cat`. Tokens, logins and email addresses are redacted.
+
+Scenarios:
+- `requests`: every recorded request again, in order, `--workers` at a time
+- `orgs`: list the organizations of the recorded enterprise(s)
+- `teams`: list the teams, team members and members of each recorded organization,
+  `--workers` organizations at a time
+
+Requests that a change to the `src` functions makes differently from the recording
+are not in the cassette, and are counted as such; record again to measure them.
+
+Inputs:
+- A cassette file
+- Scenarios, workers, and the factor to scale the recorded latencies by
+
+Outputs:
+- Requests and wall time per scenario
+"""
+
+from argparse import ArgumentParser
+import re
+import time
+from typing import Any, Callable
+from urllib.parse import unquote, urlsplit
+import requests
+from src import cassette, organizations, scheduler, teams, transport
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+SCENARIOS = ("requests", "orgs", "teams")
+
+
+def add_args(parser: ArgumentParser) -> None:
+    """Add arguments to the command line parser."""
+    parser.add_argument(
+        "cassette",
+        help="Cassette recorded with --record",
+    )
+    parser.add_argument(
+        "--scenario",
+        "-s",
+        action="append",
+        choices=SCENARIOS,
+        help="Scenario to run; repeat for several (default: all)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Requests or organizations at a time (default: 1)",
+    )
+    parser.add_argument(
+        "--latency-scale",
+        type=float,
+        default=1.0,
+        help="Factor for the recorded latencies; 0 to answer at once (default: 1)",
+    )
+    parser.add_argument(
+        "--no-coalesce",
+        action="store_true",
+        help="Send every read, even if an identical one is in flight",
+    )
+    parser.add_argument(
+        "--memoize",
+        action="store_true",
+        help="Reuse the responses of reads for the rest of each scenario",
+    )
+    parser.add_argument(
+        "--debug",
+        "-d",
+        action="store_true",
+        help="Enable debug logging",
+    )
+
+
+def recorded_paths(replayer: cassette.Replayer) -> list[list[str]]:
+    """The path segments of each recorded read (GET), unquoted."""
+    return [
+        [unquote(segment) for segment in urlsplit(interaction["url"]).path.split("/")]
+        for interaction in replayer.interactions
+        if interaction["method"] == "GET"
+    ]
+
+
+def recorded_enterprises(replayer: cassette.Replayer) -> list[str]:
+    """The enterprises whose organizations were listed in the recording."""
+    slugs: dict[str, None] = {}
+    for interaction in replayer.interactions:
+        query = (interaction["body"] or {}).get("query") or ""
+        if "listEnterpriseOrganizations" in query:
+            for slug in re.findall(r'enterprise\(slug:\s*"([^"]*)"', query):
+                slugs[slug] = None
+    return list(slugs)
+
+
+def recorded_orgs(replayer: cassette.Replayer) -> dict[str, dict[str, Any]]:
+    """
+    The organizations whose teams or members were listed in the recording, with the
+    teams whose members were.
+    """
+    orgs: dict[str, dict[str, Any]] = {}
+    for segments in recorded_paths(replayer):
+        if "orgs" not in segments:
+            continue
+        rest = segments[segments.index("orgs") + 1 :]
+        if len(rest) < 2:
+            continue
+        org = orgs.setdefault(
+            rest[0], {"teams": False, "members": False, "team_slugs": {}}
+        )
+        if rest[1:] == ["teams"]:
+            org["teams"] = True
+        elif rest[1:] == ["members"]:
+            org["members"] = True
+        elif len(rest) == 4 and rest[1] == "teams" and rest[3] == "members":
+            org["team_slugs"][rest[2]] = None
+    return orgs
+
+
+def replay_requests(
+    replayer: cassette.Replayer, api_url: str, headers: dict[str, str], workers: int
+) -> None:
+    """Send every recorded request again, in order."""
+    base = api_url.split("/api/v3")[0]
+
+    def send(interaction: dict[str, Any]) -> None:
+        body = interaction["body"]
+        query = (body or {}).get("query") or ""
+        transport.request(
+            interaction["method"],
+            base + interaction["url"],
+            json=body,
+            headers=headers,
+            idempotent=interaction["method"] != "POST"
+            or not query.lstrip().startswith("mutation"),
+        )
+
+    scheduler.run_parallel(replayer.interactions, send, workers)
+
+
+def list_orgs(
+    replayer: cassette.Replayer, graphql_url: str, headers: dict[str, str]
+) -> None:
+    """List the organizations of the recorded enterprises."""
+    for slug in recorded_enterprises(replayer):
+        orgs = organizations.list_orgs(graphql_url, slug, headers)
+        LOG.debug("{}: {} organizations".format(slug, len(orgs)))
+
+
+def list_teams(
+    replayer: cassette.Replayer, api_url: str, headers: dict[str, str], workers: int
+) -> None:
+    """List the teams, team members and members of the recorded organizations."""
+
+    def work(item: tuple[str, dict[str, Any]]) -> None:
+        org, listed = item
+        try:
+            if listed["teams"]:
+                teams.list_teams(api_url, headers, org)
+            for team_slug in listed["team_slugs"]:
+                teams.list_team_members(api_url, headers, org, team_slug)
+            if listed["members"]:
+                organizations.list_org_users(api_url, headers, org)
+        except requests.exceptions.RequestException as e:
+            LOG.debug("{}: {}".format(org, e))
+
+    scheduler.run_parallel(recorded_orgs(replayer).items(), work, workers)
+
+
+def main() -> None:
+    """Command line entrypoint."""
+    parser = ArgumentParser(description=__doc__)
+    add_args(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    try:
+        replayer = cassette.Replayer(args.cassette, latency_scale=args.latency_scale)
+    except (OSError, ValueError) as e:
+        LOG.error("⨯ Cannot read the cassette: {}".format(e))
+        return
+    api_url, graphql_url = replayer.api_urls()
+    headers = {"Authorization": "token replay"}
+    LOG.info(
+        "Cassette: {} requests, {:.1f}s of recorded latency; replaying at {}x".format(
+            len(replayer.interactions),
+            replayer.recorded_seconds(),
+            args.latency_scale,
+        )
+    )
+
+    scenarios: dict[str, Callable[[], None]] = {
+        "requests": lambda: replay_requests(replayer, api_url, headers, args.workers),
+        "orgs": lambda: list_orgs(replayer, graphql_url, headers),
+        "teams": lambda: list_teams(replayer, api_url, headers, args.workers),
+    }
+    for name in args.scenario or SCENARIOS:
+        replayer.reset()
+        t = transport.Transport(
+            replay=replayer, coalesce=not args.no_coalesce, memoize=args.memoize
+        )
+        transport.use_transport(t)
+        start = time.monotonic()
+        scenarios[name]()
+        wall = time.monotonic() - start
+        LOG.info(
+            "{:<9} {:6d} requests ({} not in the cassette, {} saved by coalescing), {:.2f}s wall".format(
+                name,
+                t.stats["requests"],
+                replayer.unmatched,
+                t.stats["coalesced"] + t.stats["memo_hits"],
+                wall,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
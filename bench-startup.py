@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+Measures the startup time of the `enterprise-security-team` command (see
+`src/cli.py`) and of the scripts it runs: `--help` of the command and of its
+subcommands, and a no-op run of `manage` (an empty org list, so no API calls).
+Each case is run in a new interpreter, as the wrappers and jobs that call the
+scripts do.
+
+Inputs:
+- Number of rounds to time each case
+- Optional zipapp (from `make-zipapp.py`) to time as well as the checkout
+
+Outputs:
+- Best and median wall time per case, with the interpreter's own startup to compare
+- Optionally, the slowest top-level imports of each case (`-X importtime`)
+"""
+
+from argparse import ArgumentParser
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def add_args(parser: ArgumentParser) -> None:
+    """Add arguments to the command line parser."""
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=10,
+        help="Times to run each case (default: 10)",
+    )
+    parser.add_argument(
+        "--zipapp",
+        required=False,
+        help="Zipapp from make-zipapp.py to time as well",
+    )
+    parser.add_argument(
+        "--import-time",
+        action="store_true",
+        help="Show the slowest top-level imports of each case",
+    )
+    parser.add_argument(
+        "--debug",
+        "-d",
+        action="store_true",
+        help="Enable debug logging",
+    )
+
+
+def make_cases(launchers: dict[str, list[str]], org_list: str) -> dict[str, list[str]]:
+    """The command lines to time, by name."""
+    cases = {"python -c pass": [sys.executable, "-c", "pass"]}
+    for name, launcher in launchers.items():
+        cases["{}: --help".format(name)] = launcher + ["--help"]
+        for command in ("manage", "promote", "demote", "query-inventory"):
+            cases["{}: {} --help".format(name, command)] = launcher + [
+                command,
+                "--help",
+            ]
+        cases["{}: manage (no-op)".format(name)] = launcher + [
+            "manage",
+            "--org-list",
+            org_list,
+            "--sec-team-name",
+            "startup-bench",
+            # Nothing is sent; an unreachable server makes sure of it
+            "--github-url",
+            "http://127.0.0.1:9",
+        ]
+    # The script on its own, if this runs from a checkout rather than the zipapp
+    script = os.path.join(ROOT, "manage-sec-team.py")
+    if os.path.isfile(script):
+        cases["manage-sec-team.py --help"] = [sys.executable, script, "--help"]
+    return cases
+
+
+def time_case(command: list[str], rounds: int, env: dict[str, str]) -> list[float]:
+    """Wall seconds of each run of a command."""
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run(
+            command,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def slowest_imports(
+    command: list[str], env: dict[str, str], count: int = 5
+) -> list[tuple[str, int]]:
+    """
+    The top-level imports of a command that took longest, with their cumulative
+    microseconds, from `-X importtime`.
+    """
+    result = subprocess.run(
+        [command[0], "-X", "importtime"] + command[1:],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        # Nested imports are indented further
+        if not cumulative.strip().isdigit() or name.startswith("  "):
+            continue
+        imports.append((name.strip(), int(cumulative)))
+    return sorted(imports, key=lambda item: -item[1])[:count]
+
+
+def main() -> None:
+    """Command line entrypoint."""
+    parser = ArgumentParser(description=__doc__)
+    add_args(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    launchers = {"checkout": [sys.executable, ROOT]}
+    if args.zipapp:
+        launchers["zipapp"] = [sys.executable, args.zipapp]
+
+    env = dict(os.environ, GITHUB_TOKEN="startup-bench")
+    with tempfile.TemporaryDirectory() as tmp:
+        org_list = os.path.join(tmp, "orgs.csv")
+        with open(org_list, "w", encoding="utf-8") as f:
+            f.write("id,login\n")
+
+        for name, command in make_cases(launchers, org_list).items():
+            try:
+                times = time_case(command, args.rounds, env)
+            except subprocess.CalledProcessError as e:
+                LOG.error("⨯ {} failed: {}".format(name, e))
+                continue
+            LOG.info(
+                "{:<34} {:6.0f} ms best  {:6.0f} ms median".format(
+                    name, min(times) * 1000, statistics.median(times) * 1000
+                )
+            )
+            if args.import_time:
+                for module, microseconds in slowest_imports(command, env):
+                    LOG.info(
+                        "    {:<30} {:6.1f} ms".format(module, microseconds / 1000)
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+"""
+Measures the HTTP transport against a GitHub API endpoint, comparing HTTP/1.1
+with HTTP/2 (when `httpx[http2]` is installed) for many concurrent requests.
+
+Each transport sends the same number of GETs to `/rate_limit`, which does not count
+against the rate limit, from a pool of concurrent workers.
+
+Inputs:
+- GitHub API endpoint (defaults to https://api.github.com)
+- PAT via --token-file or env var GITHUB_TOKEN
+- Number of requests and concurrency
+
+Outputs:
+- Wall time, requests per second, mean latency and negotiated HTTP versions per transport
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import time
+from src import transport, util
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+def add_args(parser: ArgumentParser) -> None:
+    """Add arguments to the command line parser."""
+    parser.add_argument(
+        "--github-url",
+        required=False,
+        help="GitHub URL for GHES, EMU or data residency",
+    )
+    parser.add_argument(
+        "--token-file",
+        required=False,
+        help="GitHub Personal Access Token file (or use GITHUB_TOKEN)",
+    )
+    parser.add_argument(
+        "--requests",
+        "-n",
+        type=int,
+        default=200,
+        help="Requests to send with each transport (default: 200)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        "-c",
+        type=int,
+        default=16,
+        help="Concurrent requests (default: 16)",
+    )
+    parser.add_argument(
+        "--ca-bundle",
+        required=False,
+        help="Path to a custom CA certificate or bundle (PEM) for TLS verification (self-signed/internal roots)",
+    )
+    parser.add_argument(
+        "--debug",
+        "-d",
+        action="store_true",
+        help="Enable debug logging",
+    )
+
+
+def bench(
+    t: transport.Transport,
+    url: str,
+    headers: dict[str, str],
+    requests_count: int,
+    concurrency: int,
+    verify: str | bool | None = True,
+) -> dict[str, float]:
+    """
+    Send `requests_count` GETs to a URL with a transport, and time them.
+    """
+
+    def get(_: int) -> int:
+        response = t.request(
+            "GET", url, headers=util.add_request_headers(headers), verify=verify
+        )
+        return response.status_code
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = list(pool.map(get, range(requests_count)))
+    wall = time.monotonic() - start
+    return {
+        "wall_s": wall,
+        "requests_per_s": requests_count / wall if wall else 0.0,
+        "mean_latency_ms": t.stats["elapsed_ms"] / max(1, t.stats["requests"]),
+        "errors": sum(1 for status in statuses if status >= 400),
+    }
+
+
+def main() -> None:
+    """Command line entrypoint."""
+    parser = ArgumentParser(description=__doc__)
+    add_args(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    github_pat = util.read_token(args.token_file)
+    if not github_pat:
+        LOG.error("⨯ GitHub Personal Access Token not found")
+        return
+    headers = {"Authorization": "token {}".format(github_pat)}
+
+    verify: str | bool | None = True
+    try:
+        verify = util.validate_ca_bundle(args.ca_bundle)
+    except FileNotFoundError:
+        return
+
+    url = util.rest_api_url_from_server_url(args.github_url) + "/rate_limit"
+
+    for name, http2 in (("HTTP/1.1", False), ("HTTP/2", True)):
+        # Every request goes to the network, rather than being coalesced
+        t = transport.Transport(http2=http2, coalesce=False)
+        if http2 and not t.http2:
+            LOG.info("Skipping HTTP/2: httpx[http2] is not installed")
+            continue
+        result = bench(t, url, headers, args.requests, args.concurrency, verify)
+        versions = ", ".join(
+            "{} {}".format(count, key)
+            for key, count in sorted(t.stats.items())
+            if key.startswith("http/")
+        )
+        LOG.info(
+            "{}: {:.2f}s wall, {:.1f} req/s, {:.0f} ms mean latency, {} errors ({})".format(
+                name,
+                result["wall_s"],
+                result["requests_per_s"],
+                result["mean_latency_ms"],
+                result["errors"],
+                versions,
+            )
+        )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
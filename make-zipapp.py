@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+"""
+Builds the `enterprise-security-team` command (see `src/cli.py`) as a single-file
+zipapp, to copy onto the machines and jobs that run the scripts.
+
+Inputs:
+- Where to write the zipapp, and the interpreter for its shebang line
+- Whether to bundle the dependencies from `requirements.txt` (with pip), so the
+  target needs only Python
+
+Outputs:
+- The zipapp, e.g. `./enterprise-security-team.pyz promote --enterprise-slug ...`
+"""
+
+from argparse import ArgumentParser
+import compileall
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipapp
+from src import cli
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def add_args(parser: ArgumentParser) -> None:
+    """Add arguments to the command line parser."""
+    parser.add_argument(
+        "--output",
+        "-o",
+        default=cli.PROG + ".pyz",
+        help="Zipapp to write (default: {}.pyz)".format(cli.PROG),
+    )
+    parser.add_argument(
+        "--python",
+        default="/usr/bin/env python3",
+        help="Interpreter for the shebang line (default: /usr/bin/env python3)",
+    )
+    parser.add_argument(
+        "--with-deps",
+        action="store_true",
+        help="Bundle the dependencies from requirements.txt (needs pip and network access)",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Compress the zipapp; smaller, but slower to start",
+    )
+    parser.add_argument(
+        "--debug",
+        "-d",
+        action="store_true",
+        help="Enable debug logging",
+    )
+
+
+def stage(target: str, with_deps: bool) -> None:
+    """
+    Copy the command's files (the scripts of the subcommands, `__main__.py` and
+    `src`) into a directory, with the dependencies if asked, and compile them.
+    """
+    modules = ["__main__"] + [module for module, _ in cli.COMMANDS.values()]
+    for module in modules:
+        shutil.copy2(os.path.join(ROOT, module + ".py"), target)
+    shutil.copytree(
+        os.path.join(ROOT, "src"),
+        os.path.join(target, "src"),
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+    if with_deps:
+        # Pure-Python packages only load from a zip; compiled extensions would not
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "pip",
+                "install",
+                "--quiet",
+                "--no-compile",
+                "--target",
+                target,
+                "-r",
+                os.path.join(ROOT, "requirements.txt"),
+            ],
+            check=True,
+        )
+    # Imports from a zip cannot cache their bytecode, so it is compiled in, next to
+    # each module where zipimport looks for it
+    compileall.compile_dir(target, quiet=1, legacy=True)
+
+
+def main() -> None:
+    """Command line entrypoint."""
+    parser = ArgumentParser(description=__doc__)
+    add_args(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    with tempfile.TemporaryDirectory() as target:
+        try:
+            stage(target, args.with_deps)
+        except subprocess.CalledProcessError as e:
+            LOG.error("⨯ Failed to bundle the dependencies: {}".format(e))
+            return
+        zipapp.create_archive(
+            target,
+            args.output,
+            interpreter=args.python,
+            compressed=args.compress,
+        )
+    LOG.info(
+        "✓ Wrote {} ({:.0f} kB)".format(
+            args.output, os.path.getsize(args.output) / 1024
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
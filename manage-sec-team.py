@@ -13,15 +13,54 @@ Inputs:
 - Optional list of security manager team members by handle (omit when managing
   membership via Team Sync)
 
+Or, instead of the team name and members, a config (`--config`) of several role teams,
+each with its members and the organizations it applies to (see `src/teamconfig.py`)
+
 Outputs:
 - Prints the members that were added to and removed from the security managers team
+- Optional JSON summary of the run (`--summary-file`), mergeable across shards
+- Optional SQLite inventory of teams and memberships (`--inventory`)
+- Optional stream of each organization's outcome and membership changes
+  (`--outcome-stream`), written as they happen (see `src/streams.py`)
+- Optional SQLite work queue (`--queue`) recording each organization's outcome, so
+  several workers can share a run and a rerun only does what is unfinished
+- With `--deadline`, a checkpoint org list of the organizations left for a later run
+- Optional metadata cache (`--metadata-cache`) of role IDs, shared with the other scripts
+- With `--audit-log`, a cursor into the enterprise audit log, so later runs only
+  reconcile the organizations with relevant changes since
+- With `--daemon`, keeps running: full passes on an interval, and single organizations
+  as webhook deliveries about them arrive (see `send-test-webhook.py`)
 """
 
-from argparse import ArgumentParser
-from typing import Any
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+import os
+import signal
+import socket
+import sqlite3
+import time
 from defusedcsv import csv
 import requests
-from src import teams, organizations, util
+from src import (
+    auditlog,
+    deadline,
+    estimate,
+    inventory,
+    metacache,
+    teamconfig,
+    teams,
+    organizations,
+    progress,
+    scheduler,
+    sharding,
+    streams,
+    summary,
+    transport,
+    users,
+    util,
+    workqueue,
+)
 import logging
 
 LOG = logging.getLogger(__name__)
@@ -50,6 +89,11 @@ def add_args(parser) -> None:
         help="Security team name (default: security-managers)",
     )
     parser.add_argument("--sec-team-members", nargs="*", help="Security team members")
+    parser.add_argument(
+        "--config",
+        required=False,
+        help="JSON (or TOML) config of the role teams to manage in each organization, instead of --sec-team-name and --sec-team-members",
+    )
     parser.add_argument(
         "--sec-team-members-file", required=False, help="Security team members file"
     )
@@ -61,7 +105,12 @@ def add_args(parser) -> None:
     parser.add_argument(
         "--progress",
         action="store_true",
-        help="Show progress information",
+        help="Show live throughput, rate limit budget and ETA",
+    )
+    parser.add_argument(
+        "--log-actions",
+        action="store_true",
+        help="Log each team and membership change as it is made",
     )
     parser.add_argument(
         "--debug",
@@ -74,6 +123,193 @@ def add_args(parser) -> None:
         required=False,
         help="Path to a custom CA certificate or bundle (PEM) to trust for TLS (self-signed/internal CAs)",
     )
+    parser.add_argument(
+        "--shard",
+        required=False,
+        help="Only process shard K of N of the organizations, e.g. 1/4",
+    )
+    parser.add_argument(
+        "--shard-key",
+        choices=sharding.SHARD_KEYS,
+        default="login",
+        help="Organization field to shard on (default: login)",
+    )
+    parser.add_argument(
+        "--summary-file",
+        required=False,
+        help="Write a JSON summary of the run to this file (for merge-shard-reports.py)",
+    )
+    parser.add_argument(
+        "--queue",
+        required=False,
+        help="SQLite work queue shared by several workers; loaded from --org-list on first use",
+    )
+    parser.add_argument(
+        "--worker-id",
+        default="{}-{}".format(socket.gethostname(), os.getpid()),
+        help="Name of this worker in the work queue (default: hostname-pid)",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=float,
+        default=900,
+        help="How long a claimed organization is held, renewed every third of it while its worker runs, before another worker may take it over (default: 900)",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Return failed organizations in the work queue to pending before starting",
+    )
+    parser.add_argument(
+        "--inventory",
+        required=False,
+        help="SQLite inventory database to update with the teams and members seen (see query-inventory.py)",
+    )
+    parser.add_argument(
+        "--outcome-stream",
+        required=False,
+        help="Stream each organization's outcome and membership changes to this file as it is reconciled: JSON Lines, or an Arrow stream if it ends in .arrow (needs pyarrow)",
+    )
+    parser.add_argument(
+        "--max-writes",
+        type=int,
+        default=4,
+        help="Membership changes to make concurrently within an organization (default: 4)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Organizations to process concurrently, largest first (default: 1)",
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="Estimate the API budget of the run, then exit without changing anything",
+    )
+    parser.add_argument(
+        "--deadline",
+        required=False,
+        help="Stop starting organizations when one could not finish before this time: a duration (45m, 2h) or an ISO 8601 time",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default="remaining_orgs.csv",
+        help="Org list of the organizations not started before the deadline, to pass as --org-list later (default: remaining_orgs.csv)",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running: reconcile every --interval seconds, and on webhook deliveries",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=3600,
+        help="Seconds between full reconciliations in --daemon mode (default: 3600)",
+    )
+    parser.add_argument(
+        "--webhook-host",
+        default="127.0.0.1",
+        help="Address to listen on for webhooks in --daemon mode (default: 127.0.0.1)",
+    )
+    parser.add_argument(
+        "--webhook-port",
+        type=int,
+        default=8080,
+        help="Port to listen on for webhooks in --daemon mode, 0 to not listen (default: 8080)",
+    )
+    parser.add_argument(
+        "--webhook-secret-file",
+        required=False,
+        help="File containing the webhook secret (or use GITHUB_WEBHOOK_SECRET)",
+    )
+    parser.add_argument(
+        "--no-precheck",
+        action="store_true",
+        help="Always list and diff every team's members, without a batched GraphQL pre-check",
+    )
+    parser.add_argument(
+        "--audit-log",
+        required=False,
+        help="JSON cursor into the enterprise audit log: only reconcile organizations with relevant events since the last run (needs --enterprise)",
+    )
+    parser.add_argument(
+        "--enterprise",
+        required=False,
+        help="Enterprise slug, to read its audit log with --audit-log",
+    )
+    metacache.add_cache_args(parser)
+    transport.add_transport_args(parser)
+
+
+def org_snapshot(
+    org_name: str,
+    org_teams: list[dict[str, Any]],
+    api_url: str,
+    headers: dict[str, str],
+    legacy: bool = False,
+    verify: str | bool | None = True,
+    inventory_db: sqlite3.Connection | None = None,
+    cache: metacache.MetaCache | None = None,
+    precheck: dict[str, dict[str, bool]] | None = None,
+) -> dict[str, Any]:
+    """
+    Fetch what reconciling an organization's teams needs, once for all of them: the
+    IDs of their roles, the organization's team names and, if any team's members are
+    managed, the logins of the organization's members.
+
+    With the organization's `precheck` (see `precheck_orgs`), the teams that exist
+    are known, and the members are only listed if a team's members are out of sync.
+    """
+    role_ids: dict[str, Any] = {}
+    if not legacy:
+        role_ids = organizations.get_role_ids(
+            api_url,
+            headers,
+            org_name,
+            sorted({team["role"] for team in org_teams}),
+            verify=verify,
+            cache=cache,
+        )
+
+    slugs: dict[str, str] = {}
+    if precheck is not None:
+        team_names = [
+            team["name"] for team in org_teams if precheck[team["name"]]["exists"]
+        ]
+    else:
+        teams_info = teams.list_teams(api_url, headers, org_name, verify=verify)
+        if inventory_db is not None:
+            inventory.record_teams(inventory_db, org_name, teams_info)
+        team_names = [team.name for team in teams_info]
+        slugs = {team.name: team.slug for team in teams_info}
+
+    org_members = None
+    if any(
+        team["members"] and (precheck is None or not precheck[team["name"]]["in_sync"])
+        for team in org_teams
+    ):
+        members_info = organizations.list_org_users(
+            api_url, headers, org_name, verify=verify
+        )
+        if inventory_db is not None:
+            inventory.record_org_members(inventory_db, org_name, members_info)
+        org_members = [member.login for member in members_info]
+
+    return {
+        "role_ids": role_ids,
+        "teams": team_names,
+        "slugs": slugs,
+        "org_members": org_members,
+    }
+
+
+def role_label(role_name: str) -> str:
+    """How a role is named in the logs."""
+    return "the {} role".format(
+        "security manager" if role_name == teamconfig.DEFAULT_ROLE else role_name
+    )
 
 
 def make_security_managers_team(
@@ -82,106 +318,210 @@ def make_security_managers_team(
     api_url: str,
     headers: dict[str, str],
     legacy=False,
-    progress=False,
+    log_actions=False,
     verify: str | bool | None = True,
+    inventory_db: sqlite3.Connection | None = None,
+    cache: metacache.MetaCache | None = None,
+    role_name: str = teamconfig.DEFAULT_ROLE,
+    snapshot: dict[str, Any] | None = None,
 ) -> None:
-    """Create or update the security managers team in the specified organization."""
-    security_manager_role_id: str | None = None
+    """
+    Create or update a team with an organization role (by default, the security
+    managers team) in the specified organization.
 
-    if not legacy:
-        org_roles: dict[str, Any] = organizations.list_org_roles(
-            api_url, headers, org_name, verify=verify
+    Uses the organization's `snapshot` (see `org_snapshot`) if given, and updates it.
+    """
+    if snapshot is None:
+        snapshot = org_snapshot(
+            org_name,
+            [{"name": sec_team_name, "role": role_name, "members": None}],
+            api_url,
+            headers,
+            legacy=legacy,
+            verify=verify,
+            inventory_db=inventory_db,
+            cache=cache,
         )
+    role_id: str | None = None
 
-        # Check if the "security manager" role exists
-        if "roles" not in org_roles:
-            LOG.error("⨯ Malformed response from GitHub API")
-            return
-
-        security_manager_role_id_list = [
-            role["id"]
-            for role in org_roles["roles"]
-            if role["name"] == "security_manager"
-        ]
-        if not security_manager_role_id_list:
+    if not legacy:
+        role_id = snapshot["role_ids"].get(role_name)
+        if role_id is None:
             LOG.error(
-                "⨯ Organization {} does not have a security manager role".format(
-                    org_name
+                "⨯ Organization {} does not have {}".format(
+                    org_name, role_label(role_name)
                 )
             )
             return
-        security_manager_role_id = security_manager_role_id_list[0]
 
-    # Get the list of teams
-    teams_info = teams.list_teams(api_url, headers, org_name, verify=verify)
-    teams_list = [team["name"] for team in teams_info]
+    # The inventory keys teams on their slug, which GitHub derives from the name
+    team_slug = snapshot["slugs"].get(sec_team_name) or teams.slugify(sec_team_name)
 
     # Create the team if it doesn't exist
-    if sec_team_name not in teams_list:
-        if progress:
+    if sec_team_name not in snapshot["teams"]:
+        if log_actions:
             LOG.info("Creating team {}".format(sec_team_name))
         try:
-            teams.create_team(api_url, headers, org_name, sec_team_name, verify=verify)
+            created = teams.create_team(
+                api_url, headers, org_name, sec_team_name, verify=verify
+            )
+            snapshot["teams"].append(sec_team_name)
+            team_slug = created.get("slug") or team_slug
+            snapshot["slugs"][sec_team_name] = team_slug
+            if inventory_db is not None:
+                inventory.record_team(
+                    inventory_db, org_name, team_slug, name=sec_team_name
+                )
         except Exception as e:
             LOG.error("⨯ Failed to create team {}: {}".format(sec_team_name, e))
 
-    # Update that team to have the "security manager" role
-    try:
-        # only update it if the team does not already have the role
-        if not teams.has_team_role(
+    def ensure_role(role_id: str | None) -> bool:
+        """Give the team the role unless it has it; returns whether it already had it."""
+        has_role = teams.has_team_role(
             api_url,
             headers,
             org_name,
             sec_team_name,
-            security_manager_role_id,
+            role_id,
             legacy=legacy,
             verify=verify,
-        ):
+        )
+        if not has_role:
             teams.change_team_role(
                 api_url,
                 headers,
                 org_name,
                 sec_team_name,
-                security_manager_role_id,
+                role_id,
                 legacy=legacy,
                 verify=verify,
             )
-            if progress:
+        return has_role
+
+    # Update that team to have the role
+    try:
+        # only update it if the team does not already have the role
+        try:
+            has_role = ensure_role(role_id)
+        except requests.exceptions.HTTPError as e:
+            # A cached role ID may be stale: resolve it again and retry once
+            if cache is None or legacy or not metacache.is_stale(e):
+                raise
+            organizations.invalidate_role_id(cache, api_url, org_name, role_name)
+            role_id = organizations.get_role_id(
+                api_url, headers, org_name, role_name, verify=verify, cache=cache
+            )
+            if role_id is None:
+                raise
+            snapshot["role_ids"][role_name] = role_id
+            has_role = ensure_role(role_id)
+        if not has_role:
+            if log_actions:
                 LOG.info(
-                    "✓ Team {} updated as a security manager for {}".format(
-                        sec_team_name, org_name
+                    "✓ Team {} given {} for {}".format(
+                        sec_team_name, role_label(role_name), org_name
                     )
                 )
         else:
             LOG.debug(
-                "✓ Team {} already has the security manager role for {}".format(
-                    sec_team_name, org_name
+                "✓ Team {} already has {} for {}".format(
+                    sec_team_name, role_label(role_name), org_name
                 )
             )
+        if inventory_db is not None:
+            inventory.record_team(inventory_db, org_name, team_slug, role=role_name)
     except Exception as e:
         LOG.error("⨯ Failed to update team {}: {}".format(sec_team_name, e))
         if LOG.getEffectiveLevel() == logging.DEBUG:
             raise e
 
 
+def membership_outcome(
+    username: str, action: str, error: Exception | None = None
+) -> dict[str, Any]:
+    """The outcome of one membership change (invite, add or remove)."""
+    return {
+        "user": username,
+        "action": action,
+        "ok": error is None,
+        "error": None if error is None else str(error),
+    }
+
+
 def add_security_managers_to_team(
     org_name: str,
     sec_team_name: str,
     sec_team_members: list[str],
     api_url: str,
     headers: dict[str, str],
-    progress: bool = False,
+    log_actions: bool = False,
     verify: str | bool | None = True,
-) -> None:
-    """Add security managers to the specified team in the organization."""
-    # Get the list of org members, adding the missing ones to the org
-    org_members = organizations.list_org_users(
-        api_url, headers, org_name, verify=verify
+    inventory_db: sqlite3.Connection | None = None,
+    max_writes: int = 4,
+    org_members_list: list[str] | None = None,
+    team_slug: str | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Add security managers to the specified team in the organization, and remove the rest.
+
+    The membership changes run concurrently (at most `max_writes` at once): each
+    missing user is invited to the org before being added to the team, while
+    removals are independent. Every change is attempted, and the outcome of each is
+    returned as a dict with `user`, `action`, `ok` and `error`.
+
+    The org's member logins are listed unless given (see `org_snapshot`); users
+    invited to the org are added to the given list. The memberships are recorded in
+    the inventory under the team's slug, derived from its name unless given.
+    """
+    team_slug = team_slug or teams.slugify(sec_team_name)
+    # Get the list of org members and team members
+    if org_members_list is None:
+        org_members = organizations.list_org_users(
+            api_url, headers, org_name, verify=verify
+        )
+        if inventory_db is not None:
+            inventory.record_org_members(inventory_db, org_name, org_members)
+        org_members_list = [member.login for member in org_members]
+
+    team_members = teams.list_team_members(
+        api_url, headers, org_name, sec_team_name, verify=verify
     )
-    org_members_list = [member["login"] for member in org_members]
+    if inventory_db is not None:
+        inventory.record_team_members(inventory_db, org_name, team_slug, team_members)
+    team_members_list = [member.login for member in team_members]
+
     for username in sec_team_members:
+        if username in team_members_list:
+            LOG.debug(
+                "✓ User {} is already a member of {}".format(username, sec_team_name)
+            )
+
+    def remove(username: str) -> list[dict[str, Any]]:
+        """Remove an extra user from the team."""
+        if log_actions:
+            LOG.info("Removing {} from {}".format(username, sec_team_name))
+        try:
+            teams.remove_team_member(
+                api_url, headers, org_name, sec_team_name, username, verify=verify
+            )
+        except Exception as e:
+            LOG.error(
+                "⨯ Failed to remove user {} from team {}: {}".format(
+                    username, sec_team_name, e
+                )
+            )
+            return [membership_outcome(username, "remove", e)]
+        if inventory_db is not None:
+            inventory.record_team_membership(
+                inventory_db, org_name, team_slug, username, False
+            )
+        return [membership_outcome(username, "remove")]
+
+    def add(username: str) -> list[dict[str, Any]]:
+        """Invite a missing user to the org if needed, then add them to the team."""
+        outcomes = []
         if username not in org_members_list:
-            if progress:
+            if log_actions:
                 LOG.info("Adding {} to {}".format(username, org_name))
             try:
                 organizations.add_org_user(
@@ -193,60 +533,689 @@ def add_security_managers_to_team(
                         username, org_name, e
                     )
                 )
-                return
+                return [membership_outcome(username, "invite", e)]
+            org_members_list.append(username)
+            outcomes.append(membership_outcome(username, "invite"))
+        if username in team_members_list:
+            return outcomes
+        if log_actions:
+            LOG.info("Adding {} to {}".format(username, sec_team_name))
+        try:
+            teams.add_team_member(
+                api_url, headers, org_name, sec_team_name, username, verify=verify
+            )
+        except Exception as e:
+            LOG.error(
+                "⨯ Failed to add user {} to team {}: {}".format(
+                    username, sec_team_name, e
+                )
+            )
+            outcomes.append(membership_outcome(username, "add", e))
+            return outcomes
+        if inventory_db is not None:
+            inventory.record_team_membership(
+                inventory_db, org_name, team_slug, username, True
+            )
+        outcomes.append(membership_outcome(username, "add"))
+        return outcomes
 
-    # Get the list of team members, adding the missing ones to the team and removing the extra ones
-    team_members = teams.list_team_members(
-        api_url, headers, org_name, sec_team_name, verify=verify
-    )
-    team_members_list = [member["login"] for member in team_members]
-    for username in team_members_list:
-        if username not in sec_team_members:
-            if progress:
-                LOG.info("Removing {} from {}".format(username, sec_team_name))
-            try:
-                teams.remove_team_member(
-                    api_url, headers, org_name, sec_team_name, username, verify=verify
+    # One task per user: removals, and invite-then-add chains
+    tasks = [
+        (remove, username)
+        for username in team_members_list
+        if username not in sec_team_members
+    ] + [
+        (add, username)
+        for username in sec_team_members
+        if username not in org_members_list or username not in team_members_list
+    ]
+    if not tasks:
+        return []
+
+    outcomes: list[dict[str, Any]] = []
+    with ThreadPoolExecutor(max_workers=max(1, max_writes)) as pool:
+        futures = [transport.submit(pool, fn, username) for fn, username in tasks]
+        for future in futures:
+            outcomes.extend(future.result())
+    return outcomes
+
+
+def reconcile_org(
+    org_name: str,
+    org_teams: list[dict[str, Any]],
+    api_url: str,
+    headers: dict[str, str],
+    legacy: bool = False,
+    log_actions: bool = False,
+    verify: str | bool | None = True,
+    inventory_db: sqlite3.Connection | None = None,
+    max_writes: int = 4,
+    cache: metacache.MetaCache | None = None,
+    precheck: dict[str, dict[str, bool]] | None = None,
+    changes: list[dict[str, Any]] | None = None,
+) -> str | None:
+    """
+    Create/update the role teams of one organization (from `teamconfig.teams_for`) and
+    sync their members, fetching the organization's snapshot once for all of them.
+    Teams whose members the `precheck` found in sync are not listed and diffed.
+    The outcome of each membership change, with its team, is added to `changes`.
+
+    Returns None on success, or the reason the organization failed.
+    """
+    if not org_teams:
+        LOG.debug("No teams to manage in {}".format(org_name))
+        return None
+    try:
+        snapshot = org_snapshot(
+            org_name,
+            org_teams,
+            api_url,
+            headers,
+            legacy=legacy,
+            verify=verify,
+            inventory_db=inventory_db,
+            cache=cache,
+            precheck=precheck,
+        )
+        reasons = []
+        for team in org_teams:
+            make_security_managers_team(
+                org_name,
+                team["name"],
+                api_url,
+                headers,
+                legacy=legacy,
+                log_actions=log_actions,
+                verify=verify,
+                inventory_db=inventory_db,
+                cache=cache,
+                role_name=team["role"],
+                snapshot=snapshot,
+            )
+            if not team["members"]:
+                continue
+            if precheck is not None and precheck[team["name"]]["in_sync"]:
+                LOG.debug(
+                    "✓ Team {} in {} already has its members".format(
+                        team["name"], org_name
+                    )
                 )
-            except Exception as e:
-                LOG.error(
-                    "⨯ Failed to remove user {} from team {}: {}".format(
-                        username, sec_team_name, e
+                continue
+            outcomes = add_security_managers_to_team(
+                org_name,
+                team["name"],
+                team["members"],
+                api_url,
+                headers,
+                log_actions=log_actions,
+                verify=verify,
+                inventory_db=inventory_db,
+                max_writes=max_writes,
+                org_members_list=snapshot["org_members"],
+                team_slug=snapshot["slugs"].get(team["name"]),
+            )
+            if changes is not None:
+                changes.extend(dict(outcome, team=team["name"]) for outcome in outcomes)
+            failures = [outcome for outcome in outcomes if not outcome["ok"]]
+            if failures:
+                reason = "{} membership change(s) failed: {}".format(
+                    len(failures),
+                    ", ".join(
+                        "{} {}".format(outcome["action"], outcome["user"])
+                        for outcome in failures
+                    ),
+                )
+                if len(org_teams) > 1:
+                    reason = "{}: {}".format(team["name"], reason)
+                reasons.append(reason)
+        if reasons:
+            return "; ".join(reasons)
+    except requests.exceptions.HTTPError as e:
+        status = e.response.status_code if e.response is not None else "unknown"
+        if status in (403, 404):
+            LOG.warning(
+                "⚠️ Organization '{}' is not accessible (HTTP {}); it may have been removed or the token lacks access. Skipping.".format(
+                    org_name, status
+                )
+            )
+        else:
+            LOG.warning(
+                "⚠️ Organization '{}' failed with HTTP {}: {}. Skipping.".format(
+                    org_name, status, e
+                )
+            )
+        return "HTTP {}".format(status)
+    except Exception as e:
+        LOG.warning("⚠️ Organization '{}' failed: {}. Skipping.".format(org_name, e))
+        return str(e)
+    return None
+
+
+def outcome_record(
+    org_name: str,
+    failure: str | None,
+    seconds: float | None = None,
+    changes: list[dict[str, Any]] | None = None,
+    status: str | None = None,
+) -> dict[str, Any]:
+    """
+    The record of an organization's outcome for the outcome stream, with the members
+    that were added to (or invited) and removed from its teams, as `team/user`.
+    """
+    done = [change for change in changes or [] if change["ok"]]
+    return {
+        "org": org_name,
+        "status": status or ("reconciled" if failure is None else "failed"),
+        "reason": failure,
+        "seconds": None if seconds is None else round(seconds, 3),
+        "added": [
+            "{}/{}".format(change["team"], change["user"])
+            for change in done
+            if change["action"] in ("add", "invite")
+        ],
+        "removed": [
+            "{}/{}".format(change["team"], change["user"])
+            for change in done
+            if change["action"] == "remove"
+        ],
+    }
+
+
+def validate_members(
+    plan: list[dict[str, Any]],
+    graphql_url: str,
+    headers: dict[str, str],
+    verify: str | bool | None = True,
+) -> list[dict[str, Any]]:
+    """
+    Look up every team's members at once, before any organization is touched.
+    Logins are spelled as on GitHub and deduplicated; unknown ones (misspelled or
+    deprovisioned) are reported and left out, rather than failing in every
+    organization.
+
+    Raises ValueError if a team has members, but none of them exist.
+    """
+    logins = [login for team in plan for login in team["members"] or []]
+    if not logins:
+        return plan
+    resolved = users.resolve_logins(graphql_url, headers, logins, verify=verify)
+    unknown = sorted({login for login in logins if resolved[login.lower()] is None})
+    if unknown:
+        LOG.warning(
+            "⚠️ Unknown users left out of the teams: {}".format(", ".join(unknown))
+        )
+    validated = []
+    for team in plan:
+        if team["members"]:
+            members = list(
+                dict.fromkeys(
+                    resolved[login.lower()]
+                    for login in team["members"]
+                    if resolved[login.lower()] is not None
+                )
+            )
+            if not members:
+                raise ValueError(
+                    "None of the members of team '{}' exist".format(team["name"])
+                )
+            team = dict(team, members=members)
+        validated.append(team)
+    return validated
+
+
+def use_precheck(args: Namespace) -> bool:
+    """
+    Whether to pre-check teams: not when asked not to, nor when filling the inventory,
+    which records the full listings.
+    """
+    return not args.no_precheck and not args.inventory
+
+
+def precheck_orgs(
+    orgs: list[dict[str, Any]],
+    plan: list[dict[str, Any]],
+    graphql_url: str,
+    headers: dict[str, str],
+    verify: str | bool | None = True,
+    workers: int = 1,
+) -> dict[str, dict[str, dict[str, bool]]]:
+    """
+    Pre-check the teams of many organizations with batched GraphQL queries: whether
+    each team exists, and has exactly its members.
+
+    Returns each organization's results (by lowercased login) by team name.
+    Organizations that could not be checked are left out, to be listed in full.
+    """
+    # Teams are looked up by slug; the results are by name
+    checks = []
+    names: dict[tuple[str, str], str] = {}
+    for org in orgs:
+        try:
+            org_teams = teamconfig.teams_for(plan, org["login"])
+        except ValueError:
+            continue
+        for team in org_teams:
+            slug = teams.slugify(team["name"])
+            names[(org["login"], slug)] = team["name"]
+            checks.append((org["login"], slug, team["members"] or None))
+
+    # Batches of at most PRECHECK_MAX_ALIASES aliased fields each
+    batches: list[list[tuple[str, str, list[str] | None]]] = [[]]
+    aliases = 0
+    for check in checks:
+        size = teams.precheck_aliases(check[2])
+        if batches[-1] and aliases + size > teams.PRECHECK_MAX_ALIASES:
+            batches.append([])
+            aliases = 0
+        batches[-1].append(check)
+        aliases += size
+
+    results: dict[str, dict[str, dict[str, bool]]] = {}
+    unchecked: set[str] = set()
+
+    def run_batch(batch: list[tuple[str, str, list[str] | None]]) -> None:
+        try:
+            outcomes = teams.precheck_teams(graphql_url, headers, batch, verify=verify)
+        except requests.exceptions.RequestException as e:
+            LOG.warning("⚠️ Pre-check failed, listing members in full: {}".format(e))
+            outcomes = [None] * len(batch)
+        for (org_name, slug, _), outcome in zip(batch, outcomes):
+            if outcome is None:
+                unchecked.add(org_name.lower())
+            else:
+                team_name = names[(org_name, slug)]
+                results.setdefault(org_name.lower(), {})[team_name] = outcome
+
+    scheduler.run_parallel([batch for batch in batches if batch], run_batch, workers)
+    # An organization is only pre-checked if all its teams are
+    for login in unchecked:
+        results.pop(login, None)
+    LOG.info(
+        "Pre-check: {} of {} organizations already in sync".format(
+            sum(
+                all(outcome["in_sync"] for outcome in org_results.values())
+                for org_results in results.values()
+            ),
+            len(orgs),
+        )
+    )
+    return results
+
+
+def estimate_run(
+    orgs: list[dict[str, Any]],
+    plan: list[dict[str, Any]],
+    api_url: str,
+    headers: dict[str, str],
+    verify: str | bool | None = True,
+    inventory_db: sqlite3.Connection | None = None,
+    workers: int = 1,
+    cache: metacache.MetaCache | None = None,
+    precheck: bool = False,
+) -> None:
+    """
+    Estimate the API budget of managing the plan's teams in the organizations, and log it.
+
+    Makes one API call, for the rate limit. With an inventory, only organizations
+    where a team is missing or differs are counted as needing changes; with a
+    metadata cache, organizations whose role IDs are cached skip listing the roles.
+    The members' validation and, with `precheck`, the teams' pre-check are counted
+    in GraphQL points.
+    """
+    sizes = inventory.org_sizes(inventory_db) if inventory_db is not None else None
+    team_estimates = []
+    precheck_aliases = 0
+    # Each organization's roles, teams and members are listed once, for its first team
+    listed: set[str] = set()
+    for team in plan:
+        logins = [
+            org["login"] for org in orgs if teamconfig.applies_to(team, org["login"])
+        ]
+        missing_team: list[str] = []
+        drift = None
+        if inventory_db is not None:
+            team_state = inventory.orgs_missing_team(
+                inventory_db, teams.slugify(team["name"])
+            )
+            missing_team = team_state["missing"] + team_state["unknown"]
+            if team["members"]:
+                drift = {
+                    org_login.lower(): (missing, extra)
+                    for org_login, missing, extra in inventory.team_drift(
+                        inventory_db, teams.slugify(team["name"]), team["members"]
+                    )
+                }
+        team_estimates.append(
+            estimate.estimate_manage(
+                logins,
+                team["members"] or [],
+                sizes=sizes,
+                missing_team=missing_team,
+                drift=drift,
+                cached_roles=[
+                    login
+                    for login in logins
+                    if cache is not None
+                    and cache.get(
+                        metacache.key("role_id", api_url, login.lower(), team["role"])
                     )
+                    is not None
+                ],
+                shared=[login for login in logins if login.lower() in listed],
+                precheck=precheck,
+            )
+        )
+        listed.update(login.lower() for login in logins)
+        if precheck:
+            precheck_aliases += len(logins) * teams.precheck_aliases(
+                team["members"] or None
+            )
+    members = {login.lower() for team in plan for login in team["members"] or []}
+    team_estimates.append(estimate.estimate_checks(len(members), precheck_aliases))
+    estimates = [estimate.combine(team_estimates, len(orgs))]
+    rate_limits, latency = estimate.get_rate_limits(api_url, headers, verify=verify)
+    estimate.log_plan(
+        estimates, estimate.plan(estimates, rate_limits, latency, workers=workers)
+    )
+
+
+def org_risk(
+    inventory_db: sqlite3.Connection, plan: list[dict[str, Any]]
+) -> Callable[[str], int]:
+    """
+    Rank organizations by risk from the inventory, by their riskiest team: the team
+    missing (or never listed, or the organization not recorded at all), then
+    membership drift, then the rest.
+    """
+    known = inventory.org_sizes(inventory_db)
+    team_risks = []
+    for team in plan:
+        team_state = inventory.orgs_missing_team(
+            inventory_db, teams.slugify(team["name"])
+        )
+        drifted = (
+            [
+                org_login
+                for org_login, _, _ in inventory.team_drift(
+                    inventory_db, teams.slugify(team["name"]), team["members"]
                 )
+            ]
+            if team["members"]
+            else []
+        )
+        team_risks.append(
+            (
+                team,
+                deadline.risk_of(
+                    team_state["missing"] + team_state["unknown"], drifted, known=known
+                ),
+            )
+        )
+
+    def risk(login: str) -> int:
+        return min(
+            (
+                team_risk(login)
+                for team, team_risk in team_risks
+                if teamconfig.applies_to(team, login)
+            ),
+            default=deadline.RISK_REVERIFY,
+        )
+
+    return risk
+
+
+def write_checkpoint(path: str, orgs: list[dict[str, Any]]) -> None:
+    """
+    Write organizations (rows of the org list) to a CSV that can be used as the org list.
+    """
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(orgs[0]))
+        writer.writeheader()
+        writer.writerows(orgs)
+
+
+def read_orgs(
+    org_list: str, shard: tuple[int, int] | None, shard_key: str = "login"
+) -> list[dict[str, Any]]:
+    """Read in the org list, keeping only this runner's shard."""
+    with open(org_list, "r") as f:
+        return sharding.filter_shard(
+            csv.DictReader(f), shard, key=lambda org: org[shard_key]
+        )
+
+
+def audit_log_orgs(
+    cursor_file: str,
+    enterprise_slug: str,
+    orgs: list[dict[str, Any]],
+    plan: list[dict[str, Any]],
+    api_url: str,
+    headers: dict[str, str],
+    verify: str | bool | None = True,
+    in_shard: Callable[[str], bool] = lambda login: True,
+) -> tuple[list[dict[str, Any]], dict[str, Any]]:
+    """
+    The organizations of the org list to reconcile: those with relevant audit log
+    events since the cursor, and those left pending by earlier runs. Returns them with
+    the cursor to store once they are done.
+
+    Without a cursor yet, every organization is reconciled, and the new cursor starts
+    at the end of the audit log. Organizations not in the org list are kept pending
+    for `auditlog.MAX_UNLISTED_RUNS` runs, with their count in the cursor's `unlisted`.
+    """
+    cursor = auditlog.read_cursor(cursor_file, enterprise_slug)
+    if cursor is None:
+        LOG.info(
+            "No audit log cursor in {} yet: reconciling every organization".format(
+                cursor_file
+            )
+        )
+        return orgs, auditlog.start_cursor(
+            api_url, headers, enterprise_slug, verify=verify
+        )
+
+    events, positions = auditlog.read_new_events(
+        api_url, headers, cursor, verify=verify
+    )
+    team_names = {team["name"].lower() for team in plan}
+    wanted = {login.lower(): login for login in cursor.get("pending", [])}
+    for event in events:
+        login = auditlog.affected_org(event, team_names)
+        if login is not None:
+            LOG.debug("Audit log: {} in {}".format(event["action"], login))
+            wanted.setdefault(login.lower(), login)
+    LOG.info(
+        "Audit log: {} new events, {} organizations to reconcile".format(
+            len(events), len(wanted)
+        )
+    )
+
+    by_login = {org["login"].lower(): org for org in orgs}
+    selected = [by_login[login] for login in wanted if login in by_login]
+    # e.g. new organizations, until org-admin-promote.py adds them to the org list,
+    # or another shard's, which cannot be told apart when sharding by ID
+    runs = cursor.get("unlisted") or {}
+    unlisted: dict[str, int] = {}
+    dropped = []
+    for key, login in sorted(wanted.items()):
+        if key in by_login or not in_shard(login):
+            continue
+        if runs.get(login, 0) >= auditlog.MAX_UNLISTED_RUNS:
+            dropped.append(login)
+        else:
+            unlisted[login] = runs.get(login, 0) + 1
+    if unlisted:
+        LOG.warning(
+            "⚠️ Not in the org list yet, kept for a later run: {}".format(
+                ", ".join(unlisted)
+            )
+        )
+    if dropped:
+        LOG.warning(
+            "⚠️ Not in the org list after {} runs, no longer kept: {}".format(
+                auditlog.MAX_UNLISTED_RUNS, ", ".join(dropped)
+            )
+        )
+    return selected, {
+        "enterprise": enterprise_slug,
+        "positions": positions,
+        "pending": sorted(unlisted),
+        "unlisted": unlisted,
+    }
+
+
+def read_webhook_secret(secret_file: str | None) -> bytes | None:
+    """
+    Read the webhook secret from a file, falling back to GITHUB_WEBHOOK_SECRET.
+    """
+    secret = None
+    if secret_file:
+        with open(secret_file, "r", encoding="utf-8") as f:
+            secret = f.read().strip()
+    secret = secret or os.environ.get("GITHUB_WEBHOOK_SECRET")
+    return secret.encode("utf-8") if secret else None
+
+
+def run_daemon(
+    args: Namespace,
+    plan: list[dict[str, Any]],
+    shard: tuple[int, int] | None,
+    api_url: str,
+    graphql_url: str,
+    headers: dict[str, str],
+    verify: str | bool | None = True,
+    inventory_db: sqlite3.Connection | None = None,
+    outcomes: streams.RecordStream | None = None,
+) -> None:
+    """
+    Reconcile the organizations in the org list every `--interval` seconds, and the
+    organizations that webhook deliveries are about as they arrive, until interrupted.
+
+    Connections, role IDs and organization logins are kept between passes, and each
+    organization's outcome is written to the `outcomes` stream, if given.
+    """
+    # Imported here, as its HTTP server is slow to import for the runs that don't
+    # need it
+    from src import daemon
+
+    cache = metacache.MetaCache(args.metadata_cache, ttl=args.metadata_ttl)
+    triggers = daemon.Triggers()
+    team_names = {team["name"].lower() for team in plan}
+
+    def on_delivery(event: str, payload: dict[str, Any]) -> dict[str, str] | None:
+        org = daemon.affected_org(event, payload, team_names)
+        # Organizations in other shards are left to their own daemon
+        if org is None or not sharding.filter_shard(
+            [org], shard, key=lambda o: o[args.shard_key]
+        ):
+            return None
+        triggers.add(org)
+        return org
+
+    def reconcile(orgs: list[dict[str, Any]] | None) -> None:
+        if orgs is None:
+            try:
+                orgs = read_orgs(args.org_list, shard, args.shard_key)
+            except OSError as e:
+                LOG.error("⨯ Cannot read the org list: {}".format(e))
                 return
-    for username in sec_team_members:
-        if username not in team_members_list:
-            if progress:
-                LOG.info("Adding {} to {}".format(username, sec_team_name))
+            LOG.info("Reconciling all {} organizations".format(len(orgs)))
+        # Responses from an earlier pass may be out of date
+        transport.get_transport().clear_memo()
+        failed: list[tuple[str, str]] = []
+        prechecks = (
+            precheck_orgs(
+                orgs, plan, graphql_url, headers, verify=verify, workers=args.workers
+            )
+            if use_precheck(args)
+            else {}
+        )
+
+        def process(org: dict[str, Any]) -> None:
+            start = time.monotonic()
+            changes: list[dict[str, Any]] = []
             try:
-                teams.add_team_member(
-                    api_url, headers, org_name, sec_team_name, username, verify=verify
+                failure = reconcile_org(
+                    org["login"],
+                    teamconfig.teams_for(plan, org["login"]),
+                    api_url,
+                    headers,
+                    legacy=args.legacy,
+                    log_actions=args.log_actions,
+                    verify=verify,
+                    inventory_db=inventory_db,
+                    max_writes=args.max_writes,
+                    cache=cache,
+                    precheck=prechecks.get(org["login"].lower()),
+                    changes=changes,
                 )
-            except Exception as e:
-                LOG.error(
-                    "⨯ Failed to add user {} to team {}: {}".format(
-                        username, sec_team_name, e
+            except ValueError as e:
+                failure = str(e)
+            if failure is not None:
+                failed.append((org["login"], failure))
+            if outcomes is not None:
+                outcomes.write(
+                    outcome_record(
+                        org["login"], failure, time.monotonic() - start, changes
                     )
                 )
-                return
-        else:
-            LOG.debug(
-                "✓ User {} is already a member of {}".format(username, sec_team_name)
+
+        scheduler.run_parallel(orgs, process, args.workers)
+        cache.save()
+        LOG.info(
+            "Reconciled {} organizations, {} with issues".format(len(orgs), len(failed))
+        )
+        for name, reason in failed:
+            LOG.info("  - {}: {}".format(name, reason))
+
+    server = None
+    if args.webhook_port:
+        secret = read_webhook_secret(args.webhook_secret_file)
+        if secret is None:
+            LOG.warning(
+                "⚠️ No webhook secret (--webhook-secret-file or GITHUB_WEBHOOK_SECRET): deliveries are not verified"
             )
+        server = daemon.start_server(
+            args.webhook_host, args.webhook_port, secret, on_delivery
+        )
+
+    # Stop cleanly on SIGTERM too, e.g. from a service manager
+    signal.signal(signal.SIGTERM, lambda *_: triggers.close())
+    try:
+        daemon.run(reconcile, triggers, args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        triggers.close()
+        if server is not None:
+            server.shutdown()
+        cache.save()
+        LOG.info("Stopped")
 
 
-def main() -> None:
+def main(argv: list[str] | None = None) -> None:
     """Command line entrypoint."""
     parser = ArgumentParser(description=__doc__)
     add_args(parser)
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    transport.configure_from_args(args)
 
-    # Read in the org list
-    with open(args.org_list, "r") as f:
-        orgs = list(csv.DictReader(f))
+    try:
+        shard = sharding.parse_shard(args.shard)
+    except ValueError as e:
+        LOG.error("⨯ {}".format(e))
+        return
+
+    run_deadline = None
+    if args.deadline:
+        try:
+            run_deadline = deadline.Deadline(deadline.parse_deadline(args.deadline))
+        except ValueError as e:
+            LOG.error("⨯ {}".format(e))
+            return
 
     github_pat = util.read_token(args.token_file)
 
@@ -258,6 +1227,20 @@ def main() -> None:
         LOG.error("⨯ Please use either --sec-team-members or --sec-team-members-file")
         return
 
+    if args.config and (args.sec_team_members or args.sec_team_members_file):
+        LOG.error(
+            "⨯ Please give the team members either in --config or with --sec-team-members(-file)"
+        )
+        return
+
+    if args.audit_log and not args.enterprise:
+        LOG.error("⨯ --audit-log needs the enterprise slug in --enterprise")
+        return
+
+    if args.audit_log and (args.queue or args.daemon):
+        LOG.error("⨯ --audit-log cannot be combined with --queue or --daemon")
+        return
+
     sec_team_members: list[str] = []
     if args.sec_team_members_file:
         sec_team_members = util.read_lines(args.sec_team_members_file)
@@ -268,14 +1251,28 @@ def main() -> None:
 
     elif args.sec_team_members:
         sec_team_members = args.sec_team_members
-    else:
+    elif not args.config:
         LOG.info(
             "No security team members provided; "
             "the security managers team will be created and assigned "
             "the security manager role, but membership will not be modified. "
         )
 
+    # The teams to keep in each organization: from the config, or the one team given
+    try:
+        plan = (
+            teamconfig.load_plan(args.config, legacy=args.legacy)
+            if args.config
+            else teamconfig.compile_plan(
+                teamconfig.single_team_config(args.sec_team_name, sec_team_members)
+            )
+        )
+    except (OSError, ValueError) as e:
+        LOG.error("⨯ {}".format(e))
+        return
+
     api_url = util.rest_api_url_from_server_url(args.github_url)
+    graphql_url = util.graphql_api_url_from_server_url(args.github_url)
 
     # Optional custom CA bundle / cert file
     verify: str | bool | None = True
@@ -289,64 +1286,287 @@ def main() -> None:
         "Authorization": "token {}".format(github_pat),
     }
 
-    # For each organization, do
-    total_orgs = len(orgs)
-    successful_orgs: list[str] = []
-    failed_orgs: list[tuple[str, str]] = []
+    # Drop unknown members once, rather than failing on them in every organization
+    try:
+        plan = validate_members(plan, graphql_url, headers, verify=verify)
+    except ValueError as e:
+        LOG.error("⨯ {}".format(e))
+        return
+    except requests.exceptions.RequestException as e:
+        LOG.warning("⚠️ Could not validate the team members: {}".format(e))
 
-    for org in orgs:
-        org_name = org["login"]
+    # Estimate each organization's cost from its size, so the largest go first
+    inventory_db = inventory.open_inventory(args.inventory) if args.inventory else None
+    sizes = inventory.org_sizes(inventory_db) if inventory_db is not None else {}
+
+    def cost(org: dict[str, Any]) -> float:
+        return scheduler.estimate_org_cost(org, sizes.get(org["login"].lower()))
 
+    # With a deadline, the riskiest organizations go first
+    risk = None
+    if run_deadline is not None and inventory_db is not None:
+        risk = org_risk(inventory_db, plan)
+
+    def priority(org: dict[str, Any]) -> int:
+        return risk(org["login"]) if risk is not None else 0
+
+    if args.daemon:
+        if args.queue or args.estimate or args.deadline:
+            LOG.error(
+                "⨯ --daemon cannot be combined with --queue, --estimate or --deadline"
+            )
+            return
         try:
-            make_security_managers_team(
-                org_name,
-                args.sec_team_name,
+            outcome_stream = streams.open_stream(
+                args.outcome_stream, streams.OUTCOME_FIELDS
+            )
+        except (OSError, ValueError) as e:
+            LOG.error("⨯ Cannot open the output stream: {}".format(e))
+            return
+        with outcome_stream:
+            run_daemon(
+                args,
+                plan,
+                shard,
                 api_url,
+                graphql_url,
                 headers,
-                legacy=args.legacy,
-                progress=args.progress,
                 verify=verify,
+                inventory_db=inventory_db,
+                outcomes=outcome_stream,
             )
-            if sec_team_members:
-                add_security_managers_to_team(
-                    org_name,
-                    args.sec_team_name,
-                    sec_team_members,
+        return
+
+    # Read in the org list, or load it once into the work queue
+    queue = None
+    orgs: list[dict[str, Any]] = []
+    audit_cursor = None
+    if args.queue and not args.estimate:
+        queue = workqueue.open_queue(args.queue)
+        if args.retry_failed:
+            LOG.info(
+                "Failed organizations returned to the queue: {}".format(
+                    workqueue.reset_failed(queue)
+                )
+            )
+        if not any(workqueue.counts(queue).values()):
+            org_rows = read_orgs(args.org_list, shard, args.shard_key)
+            try:
+                teamconfig.check_plan(plan, [org["login"] for org in org_rows])
+            except ValueError as e:
+                LOG.error("⨯ {}".format(e))
+                return
+            added = workqueue.load_orgs(queue, org_rows, cost=cost, priority=priority)
+            LOG.info("Organizations loaded into the queue: {}".format(added))
+    else:
+        orgs = deadline.prioritize(
+            scheduler.lpt_order(read_orgs(args.org_list, shard, args.shard_key), cost),
+            priority,
+        )
+        try:
+            teamconfig.check_plan(plan, [org["login"] for org in orgs])
+        except ValueError as e:
+            LOG.error("⨯ {}".format(e))
+            return
+        if args.audit_log:
+
+            def in_shard(login: str) -> bool:
+                # Unlisted organizations have only a login to shard on
+                return args.shard_key != "login" or bool(
+                    sharding.filter_shard([login], shard, key=str)
+                )
+
+            try:
+                orgs, audit_cursor = audit_log_orgs(
+                    args.audit_log,
+                    args.enterprise,
+                    orgs,
+                    plan,
                     api_url,
                     headers,
-                    progress=args.progress,
                     verify=verify,
+                    in_shard=in_shard,
                 )
-        except requests.exceptions.HTTPError as e:
-            status = e.response.status_code if e.response is not None else "unknown"
-            if status in (403, 404):
-                LOG.warning(
-                    "⚠️ Organization '{}' is not accessible (HTTP {}); it may have been removed or the token lacks access. Skipping.".format(
-                        org_name, status
-                    )
-                )
-            else:
-                LOG.warning(
-                    "⚠️ Organization '{}' failed with HTTP {}: {}. Skipping.".format(
-                        org_name, status, e
+            except requests.exceptions.HTTPError as e:
+                LOG.error(
+                    "⨯ Cannot read the audit log (the token needs read:audit_log): {}".format(
+                        e
                     )
                 )
-            failed_orgs.append((org_name, "HTTP {}".format(status)))
-        except Exception as e:
-            LOG.warning(
-                "⚠️ Organization '{}' failed: {}. Skipping.".format(org_name, e)
-            )
-            failed_orgs.append((org_name, str(e)))
+                return
+
+    # Role IDs found in earlier runs save a call per organization
+    cache = metacache.open_cache(args.metadata_cache, args.metadata_ttl)
+
+    if args.estimate:
+        estimate_run(
+            orgs,
+            plan,
+            api_url,
+            headers,
+            verify=verify,
+            inventory_db=inventory_db,
+            workers=args.workers,
+            cache=cache,
+            precheck=use_precheck(args),
+        )
+        return
+
+    try:
+        outcome_stream = streams.open_stream(
+            args.outcome_stream, streams.OUTCOME_FIELDS
+        )
+    except (OSError, ValueError) as e:
+        LOG.error("⨯ Cannot open the output stream: {}".format(e))
+        return
+
+    # Skip listing the members of teams that are already in sync
+    prechecks: dict[str, dict[str, dict[str, bool]]] = {}
+    if orgs and use_precheck(args):
+        prechecks = precheck_orgs(
+            orgs, plan, graphql_url, headers, verify=verify, workers=args.workers
+        )
+
+    # For each organization, do
+    successful_orgs: list[str] = []
+    failed_orgs: list[tuple[str, str]] = []
+    timings = scheduler.Timings()
+
+    if queue is not None:
+        remaining = workqueue.counts(queue)
+        total = remaining["pending"] + remaining["claimed"]
+    else:
+        total = len(orgs)
+    tracker = progress.tracker(args.progress, total)
+
+    deferred: list[dict[str, Any]] = []
+
+    def process(org: dict[str, Any]) -> str | None:
+        org_name = org["login"]
+        start = time.monotonic()
+        tracker.started()
+        changes: list[dict[str, Any]] = []
+
+        try:
+            org_teams = teamconfig.teams_for(plan, org_name)
+        except ValueError as e:
+            # Only possible for a queue loaded before the config changed
+            LOG.warning("⚠️ {}. Skipping.".format(e))
+            failure: str | None = str(e)
         else:
+            failure = reconcile_org(
+                org_name,
+                org_teams,
+                api_url,
+                headers,
+                legacy=args.legacy,
+                log_actions=args.log_actions,
+                verify=verify,
+                inventory_db=inventory_db,
+                max_writes=args.max_writes,
+                cache=cache,
+                precheck=prechecks.get(org_name.lower()),
+                changes=changes,
+            )
+        elapsed = time.monotonic() - start
+        timings.record(org_name, org.get("cost") or cost(org), elapsed)
+        if run_deadline is not None:
+            run_deadline.record(elapsed)
+        tracker.finished()
+        if failure is None:
             successful_orgs.append(org_name)
+        else:
+            failed_orgs.append((org_name, failure))
+        outcome_stream.write(outcome_record(org_name, failure, elapsed, changes))
+        return failure
+
+    def queue_worker(index: int) -> None:
+        # Each worker thread claims with its own connection and name
+        conn = workqueue.open_queue(args.queue)
+        worker_id = args.worker_id
+        if args.workers > 1:
+            worker_id = "{}/{}".format(args.worker_id, index + 1)
+
+        def claim() -> dict[str, Any] | None:
+            # Past the deadline, leave what is unclaimed in the queue for later
+            if run_deadline is not None and not run_deadline.allows_start():
+                return None
+            return workqueue.claim(conn, worker_id, args.lease_seconds)
+
+        # Claim organizations one at a time until none are left, each in a slot of
+        # the process's shared workers, if limited, so idle workers do not hold one
+        while True:
+            with scheduler.shared_slot():
+                org = claim()
+                if org is None:
+                    break
+                # Renew the lease while the organization takes, however long
+                with workqueue.Heartbeat(
+                    args.queue, org["login"], worker_id, args.lease_seconds
+                ):
+                    failure = process(org)
+                workqueue.complete(conn, org["login"], worker_id, failure)
+        conn.close()
+
+    def process_in_time(org: dict[str, Any]) -> None:
+        # Past the deadline, leave the organization for a later run
+        if run_deadline is not None and not run_deadline.allows_start():
+            deferred.append(org)
+            outcome_stream.write(outcome_record(org["login"], None, status="deferred"))
+            return
+        process(org)
+
+    with tracker, outcome_stream:
+        if queue is not None:
+            scheduler.run_parallel(
+                range(max(1, args.workers)), queue_worker, args.workers, shared=False
+            )
+        else:
+            scheduler.run_parallel(orgs, process_in_time, args.workers)
+
+    if cache is not None:
+        cache.save()
+
+    # Organizations that did not get reconciled are retried on the next run
+    if audit_cursor is not None:
+        audit_cursor["pending"] = sorted(
+            set(audit_cursor["pending"])
+            | {name for name, _ in failed_orgs}
+            | {org["login"] for org in deferred}
+        )
+        auditlog.write_cursor(args.audit_log, audit_cursor)
+        LOG.info("Audit log cursor written to {}".format(args.audit_log))
 
     # Summary of the run
-    LOG.info("===== Summary =====")
-    LOG.info("Organizations processed: {}".format(total_orgs))
-    LOG.info("Successful: {}".format(len(successful_orgs)))
-    LOG.info("With issues: {}".format(len(failed_orgs)))
-    for name, reason in failed_orgs:
-        LOG.info("  - {}: {}".format(name, reason))
+    run_summary = summary.make_summary(
+        "manage-sec-team",
+        shard=sharding.format_shard(shard),
+        total=len(successful_orgs) + len(failed_orgs),
+        successful=successful_orgs,
+        failed=failed_orgs,
+        timings=timings.report(),
+        deferred=(
+            [org["login"] for org in deferred] if run_deadline is not None else None
+        ),
+        requests=transport.request_counts(),
+    )
+    summary.log_summary(run_summary)
+    if args.summary_file:
+        summary.write_summary(args.summary_file, run_summary)
+    if deferred and queue is None:
+        write_checkpoint(args.checkpoint, deferred)
+        LOG.info(
+            "Organizations left for a later run written to {}".format(args.checkpoint)
+        )
+    if queue is not None:
+        LOG.info(
+            "Queue: {}".format(
+                ", ".join(
+                    "{} {}".format(count, status)
+                    for status, count in workqueue.counts(queue).items()
+                )
+            )
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+"""
+Merges the per-shard JSON summaries written by `org-admin-promote.py` or
+`manage-sec-team.py` with `--shard K/N --summary-file ...` into one report.
+
+Inputs:
+- Two or more summary files from the same script, one per shard
+
+Outputs:
+- Combined summary printed to stdout, with missing or duplicated shards flagged
+- Optional combined JSON summary (`--output`)
+- Optional combined newline-delimited list of promoted org IDs (`--unmanaged-orgs`),
+  for use with `org-admin-demote.py`
+"""
+
+from argparse import ArgumentParser
+from src import summary
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+def add_args(parser: ArgumentParser) -> None:
+    """Add arguments to the command line parser."""
+    parser.add_argument(
+        "summary_files",
+        nargs="+",
+        help="Per-shard JSON summary files",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        required=False,
+        help="Write the merged JSON summary to this file",
+    )
+    parser.add_argument(
+        "--unmanaged-orgs",
+        required=False,
+        help="Write the merged list of promoted organization IDs to this file",
+    )
+    parser.add_argument(
+        "--debug",
+        "-d",
+        action="store_true",
+        help="Enable debug logging",
+    )
+
+
+def main() -> None:
+    """Command line entrypoint."""
+    parser = ArgumentParser(description=__doc__)
+    add_args(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    try:
+        summaries = [summary.read_summary(path) for path in args.summary_files]
+        merged = summary.merge_summaries(summaries)
+    except (OSError, ValueError, KeyError) as e:
+        LOG.error("⨯ Failed to merge summaries: {}".format(e))
+        return
+
+    summary.log_summary(merged)
+
+    if args.output:
+        summary.write_summary(args.output, merged)
+
+    if args.unmanaged_orgs:
+        with open(args.unmanaged_orgs, "w", encoding="utf-8") as f:
+            for oid in merged["unmanaged"]:
+                print(oid, file=f)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
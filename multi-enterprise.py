@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+"""
+Runs the scripts against several enterprises side by side, in one process: GitHub
+Enterprise Cloud and Server instances, each with its own URL, CA bundle and token,
+from a targets config (see `src/targets.py`).
+
+Each target runs its steps (`promote`, `manage`, `demote`) in order, on a thread of
+its own, with a transport of its own: its own connections and rate limit budget.
+The targets share the process's workers (`--max-workers` items, such as
+organizations, in progress at a time across all of them) and its logs, where each
+line names its target; a step's own `--debug` enables debug logging for that step.
+Every step runs even if an earlier one failed, so a `demote` step still undoes what
+a `promote` step did.
+
+Inputs:
+- A targets config (JSON, or TOML with Python 3.11+)
+
+Outputs:
+- What each step outputs, in its target's directory unless the step names the file
+- A combined summary with a section per enterprise, logged and optionally written as
+  JSON (`--summary-file`)
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+import importlib
+import os
+import threading
+import time
+from typing import Any
+from src import cli, scheduler, summary, targets, transport
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+# The target run in the current context, named in the logs
+TARGET: ContextVar[str] = ContextVar("target", default="-")
+# Whether the step run in the current context asked for debug logging
+DEBUG: ContextVar[bool] = ContextVar("debug", default=False)
+
+LOG_FORMAT = "%(levelname)s:%(target)s:%(name)s:%(message)s"
+
+
+def add_args(parser: ArgumentParser) -> None:
+    """Add arguments to the command line parser."""
+    parser.add_argument(
+        "config",
+        help="Targets config (JSON, or TOML): the enterprises and the steps to run on each",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=0,
+        help="Items (such as organizations) in progress at a time across all targets, whatever each step's --workers (default: no limit)",
+    )
+    parser.add_argument(
+        "--summary-file",
+        required=False,
+        help="Write the combined JSON summary, with a section per enterprise, to this file",
+    )
+    parser.add_argument(
+        "--debug",
+        "-d",
+        action="store_true",
+        help="Enable debug logging",
+    )
+
+
+class TargetLogFilter(logging.Filter):
+    """
+    Names the target in each log record, counts the errors of each target, and drops
+    debug records unless `debug` is set or the step they come from has `--debug`.
+    """
+
+    def __init__(self, debug: bool = False) -> None:
+        super().__init__()
+        self.debug = debug
+        self.errors: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.INFO and not (self.debug or DEBUG.get()):
+            return False
+        target = TARGET.get()
+        record.target = target
+        if record.levelno >= logging.ERROR:
+            with self._lock:
+                self.errors[target] = self.errors.get(target, 0) + 1
+        return True
+
+
+def asks_debug(step: list[str]) -> bool:
+    """Whether a step's arguments ask for debug logging."""
+    return targets.has_option(step[1:], "--debug") or "-d" in step[1:]
+
+
+def run_step(step: list[str], log_filter: TargetLogFilter) -> dict[str, Any]:
+    """
+    Run one step of the current target, and report how it went: whether it logged
+    errors, its time, its API requests and rate limit budget, and its summary.
+    """
+    command, args = step[0], step[1:]
+    module = importlib.import_module(cli.COMMANDS[command][0])
+    # The step configures its own transport in place of this one
+    placeholder = transport.Transport()
+    transport.use_transport(placeholder)
+    DEBUG.set(asks_debug(step))
+    errors = log_filter.errors.get(TARGET.get(), 0)
+    started_at = time.time()
+    start = time.monotonic()
+    result: dict[str, Any] = {"command": command, "ok": True}
+    LOG.info("Running {}".format(command))
+    try:
+        module.main(args)
+    except SystemExit as e:
+        # The step's arguments were rejected
+        if e.code:
+            result["ok"] = False
+    except Exception as e:
+        LOG.error("⨯ {} failed: {}".format(command, e))
+        result["ok"] = False
+    result["errors"] = log_filter.errors.get(TARGET.get(), 0) - errors
+    result["ok"] = result["ok"] and not result["errors"]
+    result["seconds"] = round(time.monotonic() - start, 3)
+    current = transport.get_transport()
+    result["requests"] = transport.request_counts()
+    result["rate_limits"] = {
+        resource: dict(budget) for resource, budget in current.rate_limits.items()
+    }
+    # The next step has a transport of its own
+    current.close()
+    if current is not placeholder:
+        placeholder.close()
+    summary_file = targets.option_value(args, "--summary-file")
+    if (
+        summary_file
+        and os.path.exists(summary_file)
+        and os.path.getmtime(summary_file) >= started_at
+    ):
+        try:
+            result["summary"] = summary.read_summary(summary_file)
+        except (OSError, ValueError) as e:
+            LOG.warning("⚠️ Cannot read the summary of {}: {}".format(command, e))
+    return result
+
+
+def run_target(target: dict[str, Any], log_filter: TargetLogFilter) -> dict[str, Any]:
+    """Run the steps of a target, in order, in the current context."""
+    TARGET.set(target["name"])
+    start = time.monotonic()
+    try:
+        os.makedirs(target["directory"], exist_ok=True)
+    except OSError as e:
+        LOG.error("⨯ Cannot create the target's directory: {}".format(e))
+        steps = []
+    else:
+        steps = [run_step(step, log_filter) for step in target["steps"]]
+    return {
+        "name": target["name"],
+        "enterprise": target["enterprise"],
+        "github_url": target["github_url"] or "https://github.com",
+        "ok": bool(steps) and all(step["ok"] for step in steps),
+        "seconds": round(time.monotonic() - start, 3),
+        "steps": steps,
+    }
+
+
+def combine(results: list[dict[str, Any]], makespan: float) -> dict[str, Any]:
+    """The combined summary of the targets' runs, with their total API requests."""
+    requests: dict[str, int] = {}
+    for result in results:
+        result["requests"] = {}
+        for step in result["steps"]:
+            for name, count in step["requests"].items():
+                result["requests"][name] = result["requests"].get(name, 0) + count
+                requests[name] = requests.get(name, 0) + count
+    return {
+        "script": "multi-enterprise",
+        "makespan": round(makespan, 3),
+        "requests": requests,
+        "targets": results,
+    }
+
+
+def log_combined(combined: dict[str, Any]) -> None:
+    """Log the combined summary, with a section per enterprise."""
+    for result in combined["targets"]:
+        LOG.info(
+            "===== {} ({}{}) =====".format(
+                result["name"],
+                result["github_url"],
+                ", " + result["enterprise"] if result["enterprise"] else "",
+            )
+        )
+        for step in result["steps"]:
+            LOG.info(
+                "{} {}: {:.1f}s, {} requests{}".format(
+                    "✓" if step["ok"] else "⨯",
+                    step["command"],
+                    step["seconds"],
+                    step["requests"]["sent"],
+                    (
+                        ", {} errors logged".format(step["errors"])
+                        if step["errors"]
+                        else ""
+                    ),
+                )
+            )
+            step_summary = step.get("summary")
+            if step_summary:
+                LOG.info(
+                    "  Organizations: {}, successful: {}, with issues: {}".format(
+                        step_summary["total"],
+                        len(step_summary["successful"]),
+                        len(step_summary["failed"]),
+                    )
+                )
+                for name, reason in step_summary["failed"]:
+                    LOG.info("    - {}: {}".format(name, reason))
+            for resource, budget in sorted(step["rate_limits"].items()):
+                LOG.info(
+                    "  Rate limit {}: {}/{} left".format(
+                        resource, budget["remaining"], budget["limit"]
+                    )
+                )
+    failed = [result["name"] for result in combined["targets"] if not result["ok"]]
+    counts = combined["requests"]
+    LOG.info("===== All enterprises =====")
+    LOG.info(
+        "Enterprises: {}, with issues: {}{}".format(
+            len(combined["targets"]),
+            len(failed),
+            " ({})".format(", ".join(failed)) if failed else "",
+        )
+    )
+    if counts:
+        LOG.info(
+            "API requests: {} sent, {} saved by coalescing".format(
+                counts["sent"], counts["coalesced"] + counts["memo_hits"]
+            )
+        )
+    LOG.info("Makespan: {:.1f}s".format(combined["makespan"]))
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line entrypoint."""
+    parser = ArgumentParser(description=__doc__)
+    add_args(parser)
+    args = parser.parse_args(argv)
+
+    log_filter = TargetLogFilter(args.debug)
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(log_filter)
+
+    try:
+        target_list = targets.load_targets(args.config)
+    except (OSError, ValueError) as e:
+        LOG.error("⨯ {}".format(e))
+        return
+    # The filter keeps the debug records of the steps that asked for them only
+    if args.debug or any(
+        asks_debug(step) for target in target_list for step in target["steps"]
+    ):
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    # Import the steps' scripts once, before the targets' threads need them
+    for command in {step[0] for target in target_list for step in target["steps"]}:
+        importlib.import_module(cli.COMMANDS[command][0])
+
+    scheduler.share_workers(args.max_workers)
+    LOG.info(
+        "Running {} enterprises: {}".format(
+            len(target_list), ", ".join(target["name"] for target in target_list)
+        )
+    )
+    start = time.monotonic()
+    with ThreadPoolExecutor(
+        max_workers=len(target_list), thread_name_prefix="target"
+    ) as pool:
+        futures = [
+            transport.submit(pool, run_target, target, log_filter)
+            for target in target_list
+        ]
+        results = [future.result() for future in futures]
+    scheduler.share_workers(None)
+
+    combined = combine(results, time.monotonic() - start)
+    log_combined(combined)
+    if args.summary_file:
+        summary.write_summary(args.summary_file, combined)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,12 +12,28 @@ Inputs:
 - A newline-delimited file of organization IDs (default: unmanaged_orgs.txt)
 
 Outputs:
-- Prints progress lines for each organization demotion
+- Optional live progress (`--progress`) or a line for each organization demotion (`--log-actions`)
+- With `--deadline`, a checkpoint list of the organization IDs left for a later run
+- Optional metadata cache (`--metadata-cache`) of the enterprise ID and organization
+  logins, so the logs name each organization
+- Optional stream of the demotions (`--demotion-stream`), written as they happen (see
+  `src/streams.py`)
 """
 
 from argparse import ArgumentParser
+import time
 from typing import Iterable, List
-from src import enterprises, util
+from src import (
+    deadline,
+    enterprises,
+    estimate,
+    metacache,
+    organizations,
+    progress as progress_module,
+    streams,
+    transport,
+    util,
+)
 import logging
 
 
@@ -49,7 +65,12 @@ def add_args(parser: ArgumentParser) -> None:
         "--progress",
         "-p",
         action="store_true",
-        help="Show progress during demotion",
+        help="Show live throughput, rate limit budget and ETA during demotion",
+    )
+    parser.add_argument(
+        "--log-actions",
+        action="store_true",
+        help="Log each organization as it is demoted from",
     )
     parser.add_argument(
         "--debug",
@@ -62,38 +83,127 @@ def add_args(parser: ArgumentParser) -> None:
         required=False,
         help="Path to a custom CA certificate or bundle (PEM) for TLS verification (self-signed/internal roots)",
     )
+    parser.add_argument(
+        "--org-catalog",
+        required=False,
+        help="JSON cache of the enterprise's organizations (from org-admin-promote.py) to update with the demotions",
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="Estimate the API budget of the demotions, then exit without changing anything",
+    )
+    parser.add_argument(
+        "--deadline",
+        required=False,
+        help="Stop demoting when one more could not finish before this time: a duration (45m, 2h) or an ISO 8601 time",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default="remaining_unmanaged_orgs.txt",
+        help="Organization IDs not demoted before the deadline, to pass as --unmanaged-orgs later (default: remaining_unmanaged_orgs.txt)",
+    )
+    parser.add_argument(
+        "--demotion-stream",
+        required=False,
+        help="Stream each demotion to this file as it is made: JSON Lines, or an Arrow stream if it ends in .arrow (needs pyarrow)",
+    )
+    metacache.add_cache_args(parser)
+    transport.add_transport_args(parser)
 
 
 def demote_admin(
     api_url: str,
     headers: dict[str, str],
+    enterprise_slug: str,
     enterprise_id: str,
     org_ids: Iterable[str],
     progress: bool = False,
     verify: str | bool | None = True,
-) -> None:
-    """Demote the enterprise admin from each organization ID provided."""
+    log_actions: bool = False,
+    run_deadline: deadline.Deadline | None = None,
+    cache: metacache.MetaCache | None = None,
+    demotions: streams.RecordStream | None = None,
+    failed: list[str] | None = None,
+) -> List[str]:
+    """
+    Demote the enterprise admin from each organization ID provided.
+
+    With a deadline, stops when one more demotion could not finish in time, and
+    returns the organization IDs that were left. When logging each demotion, the
+    organizations' logins are looked up (in the metadata cache first, if given).
+    Each demotion is written to the `demotions` stream, if given. The IDs of the
+    organizations that GraphQL reported errors for are added to `failed`.
+    """
     org_ids_list = list(org_ids)
     LOG.info("Total count of orgs to demote admin from: {}".format(len(org_ids_list)))
-    for i, org_id in enumerate(org_ids_list):
-        if progress:
-            LOG.info(
-                "Removing from organization: {} [{}/{}]".format(
-                    org_id, i + 1, len(org_ids_list)
+    logins = (
+        organizations.get_org_logins(
+            api_url, headers, org_ids_list, verify=verify, cache=cache
+        )
+        if log_actions
+        else {}
+    )
+    with progress_module.tracker(progress, len(org_ids_list)) as tracker:
+        for i, org_id in enumerate(org_ids_list):
+            if run_deadline is not None and not run_deadline.allows_start():
+                return org_ids_list[i:]
+            start = time.monotonic()
+            if log_actions:
+                LOG.info(
+                    "Removing from organization: {} ({}) [{}/{}]".format(
+                        logins.get(org_id, "unknown login"),
+                        org_id,
+                        i + 1,
+                        len(org_ids_list),
+                    )
                 )
+            tracker.started()
+            result, enterprise_id = enterprises.change_org_role(
+                api_url,
+                headers,
+                enterprise_slug,
+                enterprise_id,
+                org_id,
+                "UNAFFILIATED",
+                verify=verify,
+                cache=cache,
             )
-        enterprises.promote_admin(
-            api_url, headers, enterprise_id, org_id, "UNAFFILIATED", verify=verify
-        )
+            tracker.finished()
+            change = streams.role_change(
+                org_id, logins.get(org_id), "UNAFFILIATED", result
+            )
+            if demotions is not None:
+                demotions.write(change)
+            if not change["ok"]:
+                LOG.error(
+                    "⨯ Failed to demote from organization {}: {}".format(
+                        logins.get(org_id, org_id), change["error"]
+                    )
+                )
+                if failed is not None:
+                    failed.append(org_id)
+            if run_deadline is not None:
+                run_deadline.record(time.monotonic() - start)
+    return []
 
 
-def main() -> None:
+def main(argv: list[str] | None = None) -> None:
     """Command line entrypoint."""
     parser = ArgumentParser(description=__doc__)
     add_args(parser)
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    transport.configure_from_args(args)
+
+    run_deadline = None
+    if args.deadline:
+        try:
+            run_deadline = deadline.Deadline(deadline.parse_deadline(args.deadline))
+        except ValueError as e:
+            LOG.error("⨯ {}".format(e))
+            return
 
     github_pat = util.read_token(args.token_file)
 
@@ -114,20 +224,70 @@ def main() -> None:
     except FileNotFoundError:
         return
 
-    enterprise_id = enterprises.get_enterprise_id(
-        api_url, args.enterprise_slug, headers, verify=verify
-    )
-
     unmanaged_orgs = util.read_lines(args.unmanaged_orgs)
 
     if not unmanaged_orgs:
         LOG.error("⨯ No unmanaged organizations found to demote admin from")
         return
 
-    demote_admin(
-        api_url, headers, enterprise_id, unmanaged_orgs, args.progress, verify=verify
+    if args.estimate:
+        estimates = [estimate.estimate_demote(len(unmanaged_orgs))]
+        rate_limits, latency = estimate.get_rate_limits(
+            util.rest_api_url_from_server_url(args.github_url), headers, verify=verify
+        )
+        estimate.log_plan(estimates, estimate.plan(estimates, rate_limits, latency))
+        return
+
+    try:
+        demotion_stream = streams.open_stream(
+            args.demotion_stream, streams.ROLE_CHANGE_FIELDS
+        )
+    except (OSError, ValueError) as e:
+        LOG.error("⨯ Cannot open the output stream: {}".format(e))
+        return
+
+    cache = metacache.open_cache(args.metadata_cache, args.metadata_ttl)
+    enterprise_id = enterprises.get_enterprise_id(
+        api_url, args.enterprise_slug, headers, verify=verify, cache=cache
     )
 
+    failed_orgs: list[str] = []
+    with demotion_stream:
+        remaining = demote_admin(
+            api_url,
+            headers,
+            args.enterprise_slug,
+            enterprise_id,
+            unmanaged_orgs,
+            args.progress,
+            verify=verify,
+            log_actions=args.log_actions,
+            run_deadline=run_deadline,
+            cache=cache,
+            demotions=demotion_stream,
+            failed=failed_orgs,
+        )
+    if cache is not None:
+        cache.save()
+    if remaining:
+        with open(args.checkpoint, "w", encoding="utf-8") as f:
+            for org_id in remaining:
+                print(org_id, file=f)
+        LOG.warning(
+            "⚠️ Deadline reached: {} organizations left in {}".format(
+                len(remaining), args.checkpoint
+            )
+        )
+
+    # Organizations whose demotion failed are still administered
+    if args.org_catalog:
+        organizations.update_org_catalog(
+            args.org_catalog,
+            args.enterprise_slug,
+            set(unmanaged_orgs) - set(remaining) - set(failed_orgs),
+            False,
+        )
+
 
 if __name__ == "__main__":  # pragma: no cover
     main()
@@ -14,12 +14,34 @@ Outputs:
 - Summary counts printed to stdout
 - Newline-delimited list of previously unmanaged org IDs (default: unmanaged_orgs.txt)
 - CSV of all organizations (default: all_orgs.csv)
+- Optional SQLite inventory of all organizations (`--inventory`)
+- Optional JSON summary of the run (`--summary-file`), mergeable across shards
+- Optional metadata cache (`--metadata-cache`) of the enterprise ID and organization logins
+- Optional streams of the organizations listed (`--org-stream`) and of the promotions
+  (`--promotion-stream`), written as they happen (see `src/streams.py`)
 """
 
 from argparse import ArgumentParser
+from math import ceil
+import os
 from typing import List
 from urllib.parse import urlparse
-from src import enterprises, organizations, util
+from defusedcsv import csv
+from src import (
+    enterprises,
+    estimate,
+    inventory,
+    metacache,
+    organizations,
+    progress as progress_module,
+    records,
+    sharding,
+    streams,
+    summary,
+    teams,
+    transport,
+    util,
+)
 import logging
 
 
@@ -65,11 +87,26 @@ def add_args(parser: ArgumentParser) -> None:
         default="all_orgs.csv",
         help="Output CSV file listing all organizations in the enterprise (default: all_orgs.csv)",
     )
+    parser.add_argument(
+        "--org-stream",
+        required=False,
+        help="Stream the organizations written to the CSV to this file as they are listed: JSON Lines, or an Arrow stream if it ends in .arrow (needs pyarrow)",
+    )
+    parser.add_argument(
+        "--promotion-stream",
+        required=False,
+        help="Stream each promotion to this file as it is made: JSON Lines, or an Arrow stream if it ends in .arrow (needs pyarrow)",
+    )
     parser.add_argument(
         "--progress",
         "-p",
         action="store_true",
-        help="Show progress during promotion",
+        help="Show live throughput, rate limit budget and ETA during promotion",
+    )
+    parser.add_argument(
+        "--log-actions",
+        action="store_true",
+        help="Log each organization as it is promoted on",
     )
     parser.add_argument(
         "--debug",
@@ -82,15 +119,45 @@ def add_args(parser: ArgumentParser) -> None:
         required=False,
         help="Path to a custom CA certificate or bundle (PEM) for TLS verification (self-signed/internal roots)",
     )
-
-
-def write_unmanaged_orgs(path: str, unmanaged_org_ids: List[str]) -> None:
-    """
-    Write the list of unmanaged organization IDs to a file.
-    """
-    with open(path, "w", encoding="utf-8") as f:
-        for oid in unmanaged_org_ids:
-            print(oid, file=f)
+    parser.add_argument(
+        "--shard",
+        required=False,
+        help="Only process shard K of N of the organizations, e.g. 1/4",
+    )
+    parser.add_argument(
+        "--shard-key",
+        choices=sharding.SHARD_KEYS,
+        default="login",
+        help="Organization field to shard on (default: login)",
+    )
+    parser.add_argument(
+        "--summary-file",
+        required=False,
+        help="Write a JSON summary of the run to this file (for merge-shard-reports.py)",
+    )
+    parser.add_argument(
+        "--inventory",
+        required=False,
+        help="SQLite inventory database to update with the organizations listed (see query-inventory.py)",
+    )
+    parser.add_argument(
+        "--org-fields",
+        choices=sorted(organizations.ORG_FIELD_SETS),
+        default="full",
+        help="Organization fields to list for the CSV (default: full); 'minimal' skips the costly repository totals",
+    )
+    parser.add_argument(
+        "--org-catalog",
+        required=False,
+        help="JSON cache of the enterprise's organizations; when given, only organizations created since the last run are fetched",
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="Estimate the API budget of promoting, managing the team and demoting, then exit without changing anything",
+    )
+    metacache.add_cache_args(parser)
+    transport.add_transport_args(parser)
 
 
 def promote_all(
@@ -101,11 +168,30 @@ def promote_all(
     unmanaged_out: str,
     progress: bool = False,
     verify: str | bool | None = True,
+    shard: tuple[int, int] | None = None,
+    shard_key: str = "login",
+    org_catalog: str | None = None,
+    org_fields: str = "full",
+    log_actions: bool = False,
+    cache: metacache.MetaCache | None = None,
+    promotions: streams.RecordStream | None = None,
+    failed: list[tuple[str, str]] | None = None,
 ) -> List[str] | None:
     """
     Promote the enterprise admin to owner on all unmanaged organizations.
 
     If a subset of organizations is provided, only attempt to promote on those; otherwise, try on all organizations.
+    If a shard is provided, only organizations in that shard are considered.
+    If an org catalog is provided, it is used to list organizations incrementally, and
+    updated with the promotions; it holds `org_fields` for the CSV. Otherwise only the
+    minimal fields needed to promote are listed.
+    With a metadata cache, the enterprise ID is taken from it, and the organizations'
+    logins are recorded in it for the demotion's logs.
+
+    The IDs of the unmanaged organizations are written to `unmanaged_out` one by one,
+    before each promotion, so an interrupted run still leaves the list to demote from;
+    each promotion is also written to the `promotions` stream, if given. Promotions
+    that GraphQL reported errors for are added to `failed`, with the errors.
     """
     total_org_count = organizations.get_total_count(
         api_url, enterprise_slug, headers, verify=verify
@@ -113,52 +199,220 @@ def promote_all(
     if total_org_count == 0:
         LOG.warning("⚠️ No organizations found.")
         return []
-    orgs = organizations.list_orgs(api_url, enterprise_slug, headers, verify=verify)
+    if org_catalog:
+        orgs = organizations.list_orgs_incremental(
+            api_url,
+            enterprise_slug,
+            headers,
+            org_catalog,
+            verify=verify,
+            total_count=total_org_count,
+            fields=org_fields,
+        )
+    else:
+        orgs = organizations.list_orgs(
+            api_url, enterprise_slug, headers, verify=verify, fields="minimal"
+        )
     if len(orgs) != total_org_count:
         LOG.error(
             "⨯ Total count of organizations returned by the query is different from the expected count"
         )
         return None
     LOG.info("Total organizations: {}".format(total_org_count))
+    organizations.remember_org_logins(cache, api_url, orgs)
 
     if orgs_subset is not None:
-        orgs = [org for org in orgs if org["node"]["login"] in orgs_subset]
+        orgs = [org for org in orgs if org.login in orgs_subset]
 
         LOG.info("Organizations in scope: {}".format(len(orgs)))
 
+    if shard is not None:
+        orgs = sharding.filter_shard(
+            orgs, shard, key=lambda org: getattr(org, shard_key)
+        )
+
+        LOG.info(
+            "Organizations in shard {}: {}".format(
+                sharding.format_shard(shard), len(orgs)
+            )
+        )
+
     enterprise_id = enterprises.get_enterprise_id(
-        api_url, enterprise_slug, headers, verify=verify
+        api_url, enterprise_slug, headers, verify=verify, cache=cache
     )
-    unmanaged_orgs = [
-        org["node"]["id"] for org in orgs if not org["node"]["viewerCanAdminister"]
-    ]
+    unmanaged = [org for org in orgs if not org.viewer_can_administer]
+    unmanaged_orgs = [org.id for org in unmanaged]
     if not unmanaged_orgs:
         LOG.info("No organizations to promote on")
         return []
 
     LOG.info("Unmanaged organizations to promote on: {}".format(len(unmanaged_orgs)))
-    for i, org_id in enumerate(unmanaged_orgs):
-        if progress:
-            LOG.info(
-                "Promoting to owner on organization: {} [{}/{}]".format(
-                    org_id, i + 1, len(unmanaged_orgs)
+    failures: list[tuple[str, str]] = []
+    failed_ids: set[str] = set()
+    with (
+        open(unmanaged_out, "w", encoding="utf-8") as unmanaged_file,
+        progress_module.tracker(progress, len(unmanaged_orgs)) as tracker,
+    ):
+        for i, org in enumerate(unmanaged):
+            if log_actions:
+                LOG.info(
+                    "Promoting to owner on organization: {} ({}) [{}/{}]".format(
+                        org.login, org.id, i + 1, len(unmanaged_orgs)
+                    )
                 )
+            print(org.id, file=unmanaged_file, flush=True)
+            tracker.started()
+            result, enterprise_id = enterprises.change_org_role(
+                api_url,
+                headers,
+                enterprise_slug,
+                enterprise_id,
+                org.id,
+                "OWNER",
+                verify=verify,
+                cache=cache,
             )
-        enterprises.promote_admin(
-            api_url, headers, enterprise_id, org_id, "OWNER", verify=verify
+            tracker.finished()
+            change = streams.role_change(org.id, org.login, "OWNER", result)
+            if promotions is not None:
+                promotions.write(change)
+            if not change["ok"]:
+                LOG.error(
+                    "⨯ Failed to promote on organization {}: {}".format(
+                        org.login, change["error"]
+                    )
+                )
+                failures.append((org.login, change["error"]))
+                failed_ids.add(org.id)
+    # Organizations whose promotion failed are still unmanaged, to retry next time
+    if org_catalog:
+        organizations.update_org_catalog(
+            org_catalog, enterprise_slug, set(unmanaged_orgs) - failed_ids, True
         )
-    write_unmanaged_orgs(unmanaged_out, unmanaged_orgs)
-    LOG.info("Promoted on organizations: {}".format(len(unmanaged_orgs)))
+    LOG.info(
+        "Promoted on organizations: {}".format(len(unmanaged_orgs) - len(failures))
+    )
+    if failed is not None:
+        failed.extend(failures)
     return unmanaged_orgs
 
 
-def main() -> None:
+def read_known_orgs(
+    enterprise_slug: str,
+    org_catalog: str | None = None,
+    orgs_csv: str | None = None,
+    inventory_path: str | None = None,
+) -> list[records.Org] | None:
+    """
+    Read the organizations known from a previous run, without API calls: from the
+    org catalog, the org CSV, or the inventory, whichever is found first.
+    """
+    if org_catalog:
+        orgs = organizations.read_org_catalog(org_catalog, enterprise_slug)
+        if orgs is not None:
+            return orgs
+    if orgs_csv and os.path.isfile(orgs_csv):
+        with open(orgs_csv, "r", encoding="utf-8") as f:
+            return [records.org_from_row(row) for row in csv.DictReader(f)]
+    if inventory_path and os.path.isfile(inventory_path):
+        return inventory.known_orgs(inventory.open_inventory(inventory_path)) or None
+    return None
+
+
+def estimate_run(
+    api_url: str,
+    rest_api_url: str,
+    headers: dict[str, str],
+    enterprise_slug: str,
+    orgs_subset: set[str] | None,
+    verify: str | bool | None = True,
+    shard: tuple[int, int] | None = None,
+    shard_key: str = "login",
+    org_catalog: str | None = None,
+    orgs_csv: str | None = None,
+    inventory_path: str | None = None,
+) -> None:
+    """
+    Estimate the API budget of promoting, managing the team and demoting, and log it.
+
+    Makes two API calls: the enterprise's organization count, and the rate limit.
+    Organizations are read from a previous run's catalog, CSV or inventory; those not
+    found there are assumed to need promoting and the team.
+    """
+    total_org_count = organizations.get_total_count(
+        api_url, enterprise_slug, headers, verify=verify
+    )
+    orgs = read_known_orgs(enterprise_slug, org_catalog, orgs_csv, inventory_path) or []
+    # Organizations missing from the previous listing (or all, without one)
+    unknown_count = max(0, total_org_count - len(orgs))
+    if orgs_subset is not None:
+        orgs = [org for org in orgs if org.login in orgs_subset]
+        unknown_count = min(unknown_count, len(orgs_subset) - len(orgs))
+    if shard is not None:
+        orgs = sharding.filter_shard(
+            orgs, shard, key=lambda org: getattr(org, shard_key)
+        )
+        unknown_count = ceil(unknown_count / shard[1])
+    if unknown_count:
+        LOG.info(
+            "Organizations not in a previous listing: {}; assuming they are unmanaged and lack the team".format(
+                unknown_count
+            )
+        )
+
+    unmanaged_count = unknown_count + sum(
+        1 for org in orgs if not org.viewer_can_administer
+    )
+    sizes = None
+    missing_team: list[str] = []
+    if inventory_path and os.path.isfile(inventory_path):
+        inventory_db = inventory.open_inventory(inventory_path)
+        sizes = inventory.org_sizes(inventory_db)
+        # manage-sec-team.py's default team
+        team_state = inventory.orgs_missing_team(inventory_db, "security-managers")
+        missing_team = team_state["missing"] + team_state["unknown"]
+    # manage-sec-team.py pre-checks its team, unless it fills an inventory
+    precheck = sizes is None
+    manage_logins = [org.login for org in orgs] + [""] * unknown_count
+    estimates = [
+        estimate.estimate_promote(
+            total_org_count, unmanaged_count, catalog=bool(org_catalog)
+        ),
+        estimate.combine(
+            [
+                estimate.estimate_manage(
+                    manage_logins,
+                    sizes=sizes,
+                    missing_team=missing_team,
+                    precheck=precheck,
+                ),
+                estimate.estimate_checks(
+                    0,
+                    (
+                        len(manage_logins) * teams.precheck_aliases(None)
+                        if precheck
+                        else 0
+                    ),
+                ),
+            ],
+            len(manage_logins),
+        ),
+        estimate.estimate_demote(unmanaged_count),
+    ]
+    rate_limits, latency = estimate.get_rate_limits(
+        rest_api_url, headers, verify=verify
+    )
+    estimate.log_plan(estimates, estimate.plan(estimates, rate_limits, latency))
+
+
+def main(argv: list[str] | None = None) -> None:
     """Command line entrypoint."""
     parser = ArgumentParser(description=__doc__)
     add_args(parser)
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    transport.configure_from_args(args)
 
     api_url = (
         util.graphql_api_url_from_server_url(args.github_url)
@@ -185,8 +439,41 @@ def main() -> None:
         set(orgs_subset_list) if orgs_subset_list is not None else None
     )
 
-    if (
-        promote_all(
+    try:
+        shard = sharding.parse_shard(args.shard)
+    except ValueError as e:
+        LOG.error("⨯ {}".format(e))
+        return
+
+    if args.estimate:
+        estimate_run(
+            api_url,
+            util.rest_api_url_from_server_url(args.github_url),
+            headers,
+            args.enterprise_slug,
+            orgs_subset,
+            verify=verify,
+            shard=shard,
+            shard_key=args.shard_key,
+            org_catalog=args.org_catalog,
+            orgs_csv=args.orgs_csv,
+            inventory_path=args.inventory,
+        )
+        return
+
+    try:
+        org_stream = streams.open_stream(args.org_stream, streams.ORG_FIELDS)
+        promotion_stream = streams.open_stream(
+            args.promotion_stream, streams.ROLE_CHANGE_FIELDS
+        )
+    except (OSError, ValueError) as e:
+        LOG.error("⨯ Cannot open the output stream: {}".format(e))
+        return
+
+    cache = metacache.open_cache(args.metadata_cache, args.metadata_ttl)
+    failed_orgs: list[tuple[str, str]] = []
+    with promotion_stream:
+        unmanaged_orgs = promote_all(
             api_url,
             headers,
             args.enterprise_slug,
@@ -194,22 +481,91 @@ def main() -> None:
             args.unmanaged_orgs,
             args.progress,
             verify=verify,
+            shard=shard,
+            shard_key=args.shard_key,
+            org_catalog=args.org_catalog,
+            org_fields=args.org_fields,
+            log_actions=args.log_actions,
+            cache=cache,
+            promotions=promotion_stream,
+            failed=failed_orgs,
         )
-        is None
-    ):
+    if cache is not None:
+        cache.save()
+    if unmanaged_orgs is None:
         LOG.error("⨯ Promotion failed")
+        org_stream.close()
         return
 
-    # Refresh and write all orgs CSV after promotions
-    orgs = organizations.list_orgs(
-        api_url, args.enterprise_slug, headers, verify=verify
+    # Refresh and write all orgs CSV after promotions; the org catalog is already
+    # up to date with them. A listing is written page by page, as it comes.
+    catalog_orgs = (
+        organizations.read_org_catalog(
+            args.org_catalog, args.enterprise_slug, args.org_fields
+        )
+        if args.org_catalog
+        else None
+    )
+    pages = (
+        [catalog_orgs]
+        if catalog_orgs is not None
+        else organizations.iter_org_pages(
+            api_url,
+            args.enterprise_slug,
+            headers,
+            verify=verify,
+            fields=args.org_fields,
+        )
     )
+    all_orgs: list[records.Org] = []
+    orgs: list[records.Org] = []
+    with (
+        org_stream,
+        organizations.OrgCsvWriter(args.orgs_csv, args.org_fields) as csv_writer,
+    ):
+        for page in pages:
+            if page is None:
+                break
+            all_orgs.extend(page)
+            # Filter by the list of orgs, if provided, and keep only this runner's
+            # shard, so each shard's CSV feeds its manage run
+            if orgs_subset is not None:
+                page = [org for org in page if org.login in orgs_subset]
+            page = sharding.filter_shard(
+                page, shard, key=lambda org: getattr(org, args.shard_key)
+            )
+            orgs.extend(page)
+            csv_writer.write(page)
+            for org in page:
+                org_stream.write(org._asdict())
 
-    # Filter by the list of orgs, if provided
-    if orgs_subset is not None:
-        orgs = [org for org in orgs if org["node"]["login"] in orgs_subset]
+    if args.inventory:
+        # Only prune orgs missing from the listing if the listing was complete
+        inventory.record_orgs(
+            inventory.open_inventory(args.inventory),
+            all_orgs,
+            complete=len(all_orgs)
+            == organizations.get_total_count(
+                api_url, args.enterprise_slug, headers, verify=verify
+            ),
+        )
 
-    organizations.write_orgs_to_csv(orgs, args.orgs_csv)
+    if args.summary_file:
+        failed_logins = {name for name, _ in failed_orgs}
+        summary.write_summary(
+            args.summary_file,
+            summary.make_summary(
+                "org-admin-promote",
+                shard=sharding.format_shard(shard),
+                total=len(orgs),
+                successful=[
+                    org.login for org in orgs if org.login not in failed_logins
+                ],
+                failed=failed_orgs,
+                unmanaged=unmanaged_orgs,
+                requests=transport.request_counts(),
+            ),
+        )
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+Answers questions about the enterprise from the local inventory database that
+`org-admin-promote.py --inventory` and `manage-sec-team.py --inventory` populate,
+without making any API calls.
+
+Inputs:
+- Path to the inventory database
+- A query:
+  - `missing-team [TEAM]`: organizations that lack the team (default: security-managers)
+  - `user LOGIN [--role ROLE]`: teams (optionally only with a role) a user is a member of
+  - `drift [TEAM] --members ...`: organizations whose team members differ from a desired list
+  - `stats`: number of organizations, teams and memberships recorded
+
+Outputs:
+- Query results printed to stdout
+"""
+
+from argparse import ArgumentParser
+from src import inventory, util
+import logging
+
+LOG = logging.getLogger(__name__)
+
+
+def add_args(parser: ArgumentParser) -> None:
+    """Add arguments to the command line parser."""
+    parser.add_argument(
+        "--inventory",
+        default="inventory.db",
+        help="SQLite inventory database (default: inventory.db)",
+    )
+    parser.add_argument(
+        "--debug",
+        "-d",
+        action="store_true",
+        help="Enable debug logging",
+    )
+    subparsers = parser.add_subparsers(dest="query", required=True)
+
+    missing = subparsers.add_parser(
+        "missing-team", help="Organizations that lack the team"
+    )
+    missing.add_argument("team", nargs="?", default="security-managers")
+
+    user = subparsers.add_parser("user", help="Teams a user is a member of")
+    user.add_argument("login")
+    user.add_argument(
+        "--role",
+        required=False,
+        help="Only teams with this role, e.g. security_manager",
+    )
+
+    drift = subparsers.add_parser(
+        "drift", help="Organizations whose team members differ from a desired list"
+    )
+    drift.add_argument("team", nargs="?", default="security-managers")
+    drift.add_argument("--members", nargs="*", help="Desired team members")
+    drift.add_argument("--members-file", required=False, help="Desired members file")
+
+    subparsers.add_parser("stats", help="Counts of recorded objects")
+
+
+def main() -> None:
+    """Command line entrypoint."""
+    parser = ArgumentParser(description=__doc__)
+    add_args(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    db = inventory.open_inventory(args.inventory)
+
+    if args.query == "missing-team":
+        result = inventory.orgs_missing_team(db, args.team)
+        for org_login in result["missing"]:
+            print(org_login)
+        if result["unknown"]:
+            LOG.warning(
+                "⚠️ Teams never listed for {} organizations; run manage-sec-team.py --inventory to fill them in".format(
+                    len(result["unknown"])
+                )
+            )
+    elif args.query == "user":
+        for org_login, team_slug, role in inventory.user_teams(
+            db, args.login, role=args.role
+        ):
+            print(
+                "{}/{}{}".format(
+                    org_login, team_slug, " ({})".format(role) if role else ""
+                )
+            )
+    elif args.query == "drift":
+        desired = args.members or util.read_lines(args.members_file) or []
+        for org_login, missing, extra in inventory.team_drift(db, args.team, desired):
+            print(
+                "{}: missing [{}], extra [{}]".format(
+                    org_login, ", ".join(missing), ", ".join(extra)
+                )
+            )
+    elif args.query == "stats":
+        for table, count in inventory.stats(db).items():
+            print("{}: {}".format(table, count))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""
+Sends a test webhook delivery to `manage-sec-team.py --daemon`, signed like GitHub
+signs them, to check the daemon reacts to it.
+
+Inputs:
+- URL of the daemon's webhook endpoint (default: http://127.0.0.1:8080/)
+- Webhook secret via --secret-file or env var GITHUB_WEBHOOK_SECRET (optional, but
+  must match the daemon's)
+- Event, action, organization and (for team events) team to send
+
+Outputs:
+- The daemon's response: the organization it queued, if any
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+import uuid
+from src import daemon, transport
+import logging
+
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_ACTIONS = {
+    "organization": "member_added",
+    "membership": "removed",
+    "team": "edited",
+    "ping": None,
+}
+
+
+def add_args(parser: ArgumentParser) -> None:
+    """Add arguments to the command line parser."""
+    parser.add_argument(
+        "--url",
+        default="http://127.0.0.1:8080/",
+        help="Webhook endpoint of the daemon (default: http://127.0.0.1:8080/)",
+    )
+    parser.add_argument(
+        "--secret-file",
+        required=False,
+        help="File containing the webhook secret (or use GITHUB_WEBHOOK_SECRET)",
+    )
+    parser.add_argument(
+        "--event",
+        choices=sorted(DEFAULT_ACTIONS),
+        default="organization",
+        help="Event to send (default: organization)",
+    )
+    parser.add_argument(
+        "--action",
+        required=False,
+        help="Action of the event (default: member_added, removed or edited, by event)",
+    )
+    parser.add_argument(
+        "--org",
+        default="test-org",
+        help="Login of the organization the event is about (default: test-org)",
+    )
+    parser.add_argument(
+        "--team",
+        default="security-managers",
+        help="Team the membership or team event is about (default: security-managers)",
+    )
+    parser.add_argument(
+        "--debug",
+        "-d",
+        action="store_true",
+        help="Enable debug logging",
+    )
+
+
+def make_payload(event: str, action: str | None, org: str, team: str) -> dict:
+    """A minimal payload for an event, with the fields the daemon reads."""
+    if event == "ping":
+        return {"zen": "Keep it logically awesome.", "hook_id": 1}
+    payload = {
+        "action": action or DEFAULT_ACTIONS[event],
+        "organization": {"login": org, "node_id": "O_test_{}".format(org)},
+        "sender": {"login": "test-sender"},
+    }
+    if event in ("membership", "team"):
+        payload["team"] = {"name": team, "slug": team}
+    if event == "membership":
+        payload["scope"] = "team"
+        payload["member"] = {"login": "test-member"}
+    return payload
+
+
+def main() -> None:
+    """Command line entrypoint."""
+    parser = ArgumentParser(description=__doc__)
+    add_args(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    secret = None
+    if args.secret_file:
+        with open(args.secret_file, "r", encoding="utf-8") as f:
+            secret = f.read().strip()
+    secret = secret or os.environ.get("GITHUB_WEBHOOK_SECRET")
+
+    body = json.dumps(
+        make_payload(args.event, args.action, args.org, args.team)
+    ).encode("utf-8")
+    headers = {
+        "Content-Type": "application/json",
+        "X-GitHub-Event": args.event,
+        "X-GitHub-Delivery": str(uuid.uuid4()),
+    }
+    if secret:
+        headers["X-Hub-Signature-256"] = daemon.sign(secret.encode("utf-8"), body)
+    else:
+        LOG.warning("⚠️ No webhook secret: sending an unsigned delivery")
+
+    response = transport.request("POST", args.url, data=body, headers=headers)
+    LOG.info("HTTP {}: {}".format(response.status_code, response.text.strip()))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
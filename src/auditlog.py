@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+"""
+Drift detection from the enterprise audit log.
+
+Instead of listing every organization's teams and members to find what changed, the
+enterprise audit log is read from a stored cursor onwards, and only the organizations
+with relevant events are reconciled:
+
+- `org.create`: a new organization
+- `team.*`: changes to one of the managed teams (members, renames, deletion, ...)
+- `organization_role.*`: roles given to or taken from a managed team, or roles
+  themselves changed
+
+Each kind of event is searched separately, with its own cursor: the `@timestamp` of
+the last event read, and the `_document_id`s of the events at that timestamp, as the
+search is by the second. The cursor file also keeps the organizations still to be
+reconciled (failed, deferred or not yet in the org list), so no change is lost; those
+not in the org list are given up on after `MAX_UNLISTED_RUNS` runs.
+"""
+
+from datetime import datetime, timezone
+import json
+import os
+from typing import Any, Iterator
+from urllib.parse import quote
+from . import fastjson, teams, transport
+from .util import add_request_headers
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Audit log searches for the events that can put an organization out of sync
+PHRASES = ("action:org.create", "action:team", "action:organization_role")
+
+# Runs that an organization not in the org list is kept in the cursor for; with
+# shards keyed by ID, each shard keeps it, as it cannot tell whose it is
+MAX_UNLISTED_RUNS = 10
+
+
+def read_cursor(path: str, enterprise_slug: str) -> dict[str, Any] | None:
+    """
+    Read the audit log cursor of an enterprise.
+
+    Returns None if there is no cursor yet, or it is for a different enterprise.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cursor = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        LOG.warning("⚠️ Ignoring unreadable audit log cursor {}".format(path))
+        return None
+    if cursor.get("enterprise") != enterprise_slug:
+        LOG.warning(
+            "⚠️ Audit log cursor {} is for enterprise '{}'; ignoring it".format(
+                path, cursor.get("enterprise")
+            )
+        )
+        return None
+    return cursor
+
+
+def write_cursor(path: str, cursor: dict[str, Any]) -> None:
+    """
+    Write an audit log cursor, atomically, so an interrupted run leaves the old one.
+    """
+    tmp_path = "{}.tmp".format(path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cursor, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def make_phrase(search: str, after: int | None) -> str:
+    """
+    An audit log search phrase for events from a millisecond timestamp onwards.
+    """
+    if after is None:
+        return search
+    since = datetime.fromtimestamp(after // 1000, tz=timezone.utc)
+    return "{} created:>={}".format(search, since.strftime("%Y-%m-%dT%H:%M:%SZ"))
+
+
+def iter_events(
+    api_endpoint: str,
+    headers: dict[str, str],
+    enterprise_slug: str,
+    phrase: str,
+    order: str = "asc",
+    per_page: int = 100,
+    verify: str | bool | None = True,
+) -> Iterator[dict[str, Any]]:
+    """
+    Yield the enterprise audit log events matching a search phrase, following the
+    cursor pagination of the `Link` header.
+    """
+    url = (
+        api_endpoint
+        + "/enterprises/{}/audit-log?phrase={}&order={}&per_page={}".format(
+            quote(enterprise_slug), quote(phrase), order, per_page
+        )
+    )
+    while url:
+        response = transport.request(
+            "GET", url, headers=add_request_headers(headers), verify=verify
+        )
+        response.raise_for_status()
+        yield from fastjson.response_json(response)
+        url = response.links.get("next", {}).get("url")
+
+
+def latest_position(
+    api_endpoint: str,
+    headers: dict[str, str],
+    enterprise_slug: str,
+    search: str,
+    verify: str | bool | None = True,
+) -> dict[str, Any]:
+    """
+    A cursor position at the newest event of a search, to start reading after it.
+    """
+    for event in iter_events(
+        api_endpoint,
+        headers,
+        enterprise_slug,
+        search,
+        order="desc",
+        per_page=1,
+        verify=verify,
+    ):
+        return {"after": event["@timestamp"], "seen": [event["_document_id"]]}
+    return {"after": None, "seen": []}
+
+
+def start_cursor(
+    api_endpoint: str,
+    headers: dict[str, str],
+    enterprise_slug: str,
+    verify: str | bool | None = True,
+) -> dict[str, Any]:
+    """
+    A new cursor at the end of the audit log, for after a full reconciliation.
+    """
+    return {
+        "enterprise": enterprise_slug,
+        "positions": {
+            search: latest_position(
+                api_endpoint, headers, enterprise_slug, search, verify=verify
+            )
+            for search in PHRASES
+        },
+        "pending": [],
+    }
+
+
+def read_new_events(
+    api_endpoint: str,
+    headers: dict[str, str],
+    cursor: dict[str, Any],
+    verify: str | bool | None = True,
+) -> tuple[list[dict[str, Any]], dict[str, Any]]:
+    """
+    Read the events after a cursor.
+
+    Returns the new events, oldest first, and the advanced cursor positions.
+    """
+    events = []
+    positions = {}
+    for search in PHRASES:
+        position = cursor["positions"].get(search) or {"after": None, "seen": []}
+        after, seen = position["after"], set(position["seen"])
+        for event in iter_events(
+            api_endpoint,
+            headers,
+            cursor["enterprise"],
+            make_phrase(search, after),
+            verify=verify,
+        ):
+            timestamp, document_id = event["@timestamp"], event["_document_id"]
+            # The search is by the second, so it overlaps what was read before
+            if after is not None and (
+                timestamp < after or (timestamp == after and document_id in seen)
+            ):
+                continue
+            events.append(event)
+            if after is None or timestamp > after:
+                after, seen = timestamp, set()
+            seen.add(document_id)
+        positions[search] = {"after": after, "seen": sorted(seen)}
+    events.sort(key=lambda event: event["@timestamp"])
+    return events, positions
+
+
+def affected_org(event: dict[str, Any], team_names: set[str]) -> str | None:
+    """
+    The login of the organization an audit log event should trigger reconciling, or
+    None if it does not concern the managed teams.
+
+    `team_names` are the managed teams' names, lowercased; an event's team, given by
+    its slug, matches a name or the slug of a name.
+    """
+    action = event.get("action", "")
+    org = event.get("org")
+    if not org:
+        return None
+    if action == "org.create":
+        return org
+    if action.startswith("team.") or action.startswith("organization_role."):
+        # `team` is "org/team-slug"
+        team = event.get("team")
+        if team:
+            slug = team.split("/")[-1].lower()
+            managed = team_names | {teams.slugify(name) for name in team_names}
+            return org if slug in managed else None
+        # A change to a role itself, which a managed team may have
+        if action.startswith("organization_role.") and not event.get("user"):
+            return org
+    return None
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+
+"""
+Record and replay of API traffic, for performance tests without network access.
+
+A `Recorder` given to the transport (`--record CASSETTE`) writes each request and
+its response to a cassette: a JSON Lines file, one interaction per line, written as
+they happen. A `Replayer` given to a transport answers requests from a cassette
+instead of the network, after the recorded latency (optionally scaled), so the `src`
+functions can be run against the data of a real enterprise. `bench-replay.py` does
+that, per scenario.
+
+Cassettes are redacted as they are recorded:
+
+- request headers are not recorded (so neither is the token), and only the
+  response headers the scripts use are
+- logins (of users and organizations) and enterprise slugs are replaced with
+  pseudonyms, the same for every occurrence of a login in one recording, and email
+  addresses with placeholders. Logins are found where the API puts them: `login`
+  fields, URL paths (`/orgs/{org}`, `/users/{user}`, ...), audit log events and
+  GraphQL arguments. Once found, a login is redacted wherever it appears: in any URL
+  path segment, whatever the host, and as a word in any other text, such as error
+  messages. The pseudonyms are keyed with a random secret that is not kept, so they
+  cannot be reversed.
+- the API's host is replaced with `REPLAY_HOST`
+"""
+
+from datetime import datetime, timezone
+import hashlib
+from http import HTTPStatus
+import json
+import os
+import re
+import threading
+import time
+from typing import Any
+from urllib.parse import unquote, urlsplit, urlunsplit
+import requests
+from requests.structures import CaseInsensitiveDict
+import logging
+
+LOG = logging.getLogger(__name__)
+
+VERSION = 1
+
+# The host that recorded URLs point at instead of the API's
+REPLAY_HOST = "github.invalid"
+
+# URL path segments that are followed by a login or an enterprise slug
+LOGIN_SEGMENTS = frozenset(["orgs", "users", "members", "memberships", "enterprises"])
+
+# JSON fields whose values are logins: REST objects, GraphQL nodes and audit log events
+LOGIN_FIELDS = frozenset(["login", "org", "user", "actor", "enterprise", "business"])
+
+# JSON fields whose values are email addresses
+EMAIL_FIELDS = frozenset(["email", "billingEmail", "billing_email"])
+
+# Logins and enterprise slugs given as GraphQL arguments, e.g. `user(login: "x")`,
+# or as a search of a team's members
+GRAPHQL_LOGIN_ARGUMENT = re.compile(
+    r'\b(login|enterprise\(slug|members\(query):\s*"([^"]*)"'
+)
+
+# The response headers that are recorded
+RECORDED_HEADERS = (
+    "Content-Type",
+    "Link",
+    "Retry-After",
+    "X-RateLimit-Limit",
+    "X-RateLimit-Remaining",
+    "X-RateLimit-Reset",
+    "X-RateLimit-Resource",
+    "X-RateLimit-Used",
+)
+
+
+class Recorder:
+    """
+    Writes the requests a transport sends, with their responses, to a cassette.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._secret = os.urandom(16)
+        self._lock = threading.Lock()
+        # Lowercased logins seen so far, to find them in URLs and text elsewhere
+        self._logins: set[str] = set()
+        self._hosts: set[str] = set()
+        # The pattern of `redact_text`, and the number of logins it was built for
+        self._pattern: re.Pattern[str] | None = None
+        self._pattern_size = 0
+        self._file = open(path, "w", encoding="utf-8")
+        self._write(
+            {
+                "version": VERSION,
+                "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+        )
+        self.count = 0
+
+    def _write(self, line: dict[str, Any]) -> None:
+        self._file.write(json.dumps(line) + "\n")
+        # So the cassette can be used, or followed, while the run goes on
+        self._file.flush()
+
+    def alias(self, login: str) -> str:
+        """The pseudonym of a login (case-insensitive, as logins are)."""
+        digest = hashlib.sha256(self._secret + login.lower().encode("utf-8"))
+        return "login-{}".format(digest.hexdigest()[:10])
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        kwargs: dict[str, Any],
+        response: requests.Response,
+        elapsed: float,
+    ) -> None:
+        """Record one request, with its response and the seconds it took."""
+        try:
+            body: Any = json.loads(response.content) if response.content else None
+            is_json = True
+        except ValueError:
+            body, is_json = response.text, False
+        request_body = kwargs.get("json")
+        headers = {
+            name: response.headers[name]
+            for name in RECORDED_HEADERS
+            if name in response.headers
+        }
+        with self._lock:
+            self._hosts.add(urlsplit(url).netloc)
+            self._collect_url(url)
+            self._collect(request_body)
+            self._collect(body)
+            self._write(
+                {
+                    "method": method,
+                    "url": self.redact_url(url, path_only=True),
+                    "body": self.redact(request_body),
+                    "status": response.status_code,
+                    "headers": self.redact(headers),
+                    "json": is_json,
+                    "response": (
+                        self.redact(body) if is_json else self.redact_text(body)
+                    ),
+                    "elapsed_ms": round(elapsed * 1000, 1),
+                }
+            )
+            self.count += 1
+
+    def _collect_url(self, url: str) -> None:
+        """Remember the logins in a URL's path."""
+        segments = urlsplit(url).path.split("/")
+        for previous, segment in zip(segments, segments[1:]):
+            if previous in LOGIN_SEGMENTS and segment:
+                self._logins.add(segment.lower())
+
+    def _collect(self, value: Any) -> None:
+        """Remember the logins in a JSON value."""
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key in LOGIN_FIELDS and isinstance(item, str):
+                    self._logins.add(item.lower())
+                elif key == "team" and isinstance(item, str) and "/" in item:
+                    # Audit log events name teams "org/team-slug"
+                    self._logins.add(item.split("/")[0].lower())
+                elif key == "query" and isinstance(item, str):
+                    for _, login in GRAPHQL_LOGIN_ARGUMENT.findall(item):
+                        self._logins.add(login.lower())
+                else:
+                    self._collect(item)
+        elif isinstance(value, list):
+            for item in value:
+                self._collect(item)
+
+    def redact(self, value: Any, key: str | None = None) -> Any:
+        """A JSON value with its logins, email addresses and hosts redacted."""
+        if isinstance(value, dict):
+            return {k: self.redact(item, k) for k, item in value.items()}
+        if isinstance(value, list):
+            return [self.redact(item, key) for item in value]
+        if not isinstance(value, str) or not value:
+            return value
+        if key in LOGIN_FIELDS:
+            return self.alias(value)
+        if key in EMAIL_FIELDS:
+            return "{}@example.invalid".format(self.alias(value))
+        if key == "team" and "/" in value:
+            org, team = value.split("/", 1)
+            return "{}/{}".format(self.alias(org), team)
+        if key == "query":
+            return GRAPHQL_LOGIN_ARGUMENT.sub(
+                lambda m: '{}: "{}"'.format(m.group(1), self.alias(m.group(2))), value
+            )
+        if key == "Link":
+            return re.sub(
+                r"<([^>]*)>",
+                lambda m: "<{}>".format(self.redact_url(m.group(1))),
+                value,
+            )
+        if value.startswith("http://") or value.startswith("https://"):
+            return self.redact_url(value)
+        return self.redact_text(value)
+
+    def redact_url(self, url: str, path_only: bool = False) -> str:
+        """
+        A URL with the logins in its path and query redacted, and the API's host
+        replaced; or only its path and query.
+
+        Any path segment that is a known login is redacted, whatever the host: on
+        GHES, the web UI's URLs (`html_url`s) are on the API's host too.
+        """
+        parts = urlsplit(url)
+        is_api = path_only or parts.netloc in self._hosts
+        path = "/".join(
+            self.alias(segment) if segment.lower() in self._logins else segment
+            for segment in parts.path.split("/")
+        )
+        # The query is kept as it was encoded, for requests to match on replay
+        query = "&".join(
+            (
+                "{}={}".format(name, self.alias(unquote(value)))
+                if unquote(value).lower() in self._logins
+                else parameter
+            )
+            for parameter in parts.query.split("&")
+            if parameter
+            for name, _, value in [parameter.partition("=")]
+        )
+        if path_only:
+            return urlunsplit(("", "", path, query, ""))
+        host = REPLAY_HOST if is_api else parts.netloc
+        return urlunsplit((parts.scheme, host, path, query, parts.fragment))
+
+    def redact_text(self, text: str) -> str:
+        """Text, such as an error message, with the known logins in it redacted."""
+        if not self._logins:
+            return text
+        if self._pattern is None or self._pattern_size != len(self._logins):
+            self._pattern = re.compile(
+                r"(?<![\w-])({})(?![\w-])".format(
+                    "|".join(
+                        map(re.escape, sorted(self._logins, key=len, reverse=True))
+                    )
+                ),
+                re.IGNORECASE,
+            )
+            self._pattern_size = len(self._logins)
+        return self._pattern.sub(lambda m: self.alias(m.group(1)), text)
+
+
+def request_key(method: str, url: str, body: Any) -> tuple[str, str, str]:
+    """What a recorded request is matched on: its method, path and query, and body."""
+    parts = urlsplit(url)
+    return (
+        method,
+        urlunsplit(("", "", parts.path, parts.query, "")),
+        json.dumps(body, sort_keys=True),
+    )
+
+
+class Replayer:
+    """
+    Answers requests from a cassette, after the recorded latency times
+    `latency_scale` (0 to answer at once).
+
+    Requests are matched on their method, path, query and body. Identical requests
+    get their recorded responses in order, and the last one once those run out.
+    Requests that are not in the cassette get a 404, and are counted in `unmatched`.
+    """
+
+    def __init__(self, path: str, latency_scale: float = 1.0) -> None:
+        self.latency_scale = latency_scale
+        self.interactions: list[dict[str, Any]] = []
+        with open(path, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != VERSION:
+                raise ValueError(
+                    "Unsupported cassette version {}".format(header.get("version"))
+                )
+            for line in f:
+                interaction = json.loads(line) if line.strip() else None
+                # Cassettes can be concatenated, headers and all
+                if interaction and "version" not in interaction:
+                    self.interactions.append(interaction)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Start answering from the first recorded response again."""
+        with self._lock:
+            self._responses: dict[tuple[str, str, str], list[dict[str, Any]]] = {}
+            for interaction in self.interactions:
+                key = request_key(
+                    interaction["method"], interaction["url"], interaction["body"]
+                )
+                self._responses.setdefault(key, []).append(interaction)
+            self.unmatched = 0
+
+    def api_urls(self) -> tuple[str, str]:
+        """The REST and GraphQL endpoints that the recorded requests went to."""
+        rest_prefix = ""
+        graphql_path = "/graphql"
+        for interaction in self.interactions:
+            path = urlsplit(interaction["url"]).path
+            if path.startswith("/api/v3/"):
+                rest_prefix = "/api/v3"
+            elif path.endswith("/graphql"):
+                graphql_path = path
+        base = "https://" + REPLAY_HOST
+        return base + rest_prefix, base + graphql_path
+
+    def respond(
+        self, method: str, url: str, kwargs: dict[str, Any]
+    ) -> requests.Response:
+        """The recorded response to a request, once its latency has passed."""
+        key = request_key(method, url, kwargs.get("json"))
+        with self._lock:
+            recorded = self._responses.get(key)
+            interaction = None
+            if recorded:
+                interaction = recorded.pop(0) if len(recorded) > 1 else recorded[0]
+            else:
+                self.unmatched += 1
+        if interaction is None:
+            LOG.debug("Not in the cassette: {} {}".format(method, url))
+            return make_response(url, 404, {}, {"message": "Not in the cassette"})
+        if self.latency_scale > 0:
+            time.sleep(interaction["elapsed_ms"] / 1000 * self.latency_scale)
+        return make_response(
+            url,
+            interaction["status"],
+            interaction["headers"],
+            interaction["response"],
+            interaction["json"],
+        )
+
+    def recorded_seconds(self) -> float:
+        """The total latency of the recorded requests."""
+        return (
+            sum(interaction["elapsed_ms"] for interaction in self.interactions) / 1000
+        )
+
+
+def make_response(
+    url: str,
+    status: int,
+    headers: dict[str, str],
+    body: Any,
+    is_json: bool = True,
+) -> requests.Response:
+    """A `requests.Response` built from a recorded response."""
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response.reason = HTTPStatus(status).phrase
+    response.headers = CaseInsensitiveDict(headers)
+    if is_json:
+        response._content = b"" if body is None else json.dumps(body).encode("utf-8")
+    else:
+        response._content = body.encode("utf-8")
+    response.encoding = "utf-8"
+    return response
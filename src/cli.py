@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+The `enterprise-security-team` command: one entry point for all the scripts, as
+subcommands.
+
+Each subcommand is one of the scripts, imported only when it is run, so starting the
+command, `--help`, and the light subcommands (such as `query-inventory`) do not pay
+for importing `requests` and the rest of `src`. The scripts still run on their own,
+too; `bench-startup.py` measures the difference.
+
+Run it from a checkout with `python . <subcommand>`, or build a single-file zipapp
+with `make-zipapp.py`.
+"""
+
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+import runpy
+import sys
+
+PROG = "enterprise-security-team"
+
+# Subcommands, with the script (module) that runs each, and a one-line description
+COMMANDS = {
+    "promote": (
+        "org-admin-promote",
+        "Promote the enterprise admin to owner of every organization",
+    ),
+    "manage": (
+        "manage-sec-team",
+        "Create or update the security manager team in each organization",
+    ),
+    "demote": (
+        "org-admin-demote",
+        "Demote the enterprise admin from the organizations in a list",
+    ),
+    "multi": (
+        "multi-enterprise",
+        "Run promote, manage and demote on several enterprises side by side",
+    ),
+    "query-inventory": (
+        "query-inventory",
+        "Query the SQLite inventory of organizations, teams and members",
+    ),
+    "merge-shard-reports": (
+        "merge-shard-reports",
+        "Merge the JSON summaries of several shards into one",
+    ),
+    "send-test-webhook": (
+        "send-test-webhook",
+        "Send a signed test webhook delivery to a running --daemon",
+    ),
+    "bench-transport": (
+        "bench-transport",
+        "Measure request throughput over HTTP/1.1 and HTTP/2",
+    ),
+    "bench-json": (
+        "bench-json",
+        "Measure the CPU and memory of decoding large listings",
+    ),
+    "bench-replay": (
+        "bench-replay",
+        "Replay recorded API traffic against the src functions, per scenario",
+    ),
+    "bench-startup": (
+        "bench-startup",
+        "Measure the startup time of the command and the scripts",
+    ),
+}
+
+
+def make_parser() -> ArgumentParser:
+    """The top-level command line parser, listing the subcommands."""
+    parser = ArgumentParser(
+        prog=PROG,
+        description=__doc__,
+        formatter_class=RawDescriptionHelpFormatter,
+        epilog="subcommands:\n"
+        + "\n".join(
+            "  {:<22}{}".format(name, description)
+            for name, (_, description) in COMMANDS.items()
+        )
+        + "\n\nRun '{} <subcommand> --help' for a subcommand's options.".format(PROG),
+    )
+    parser.add_argument(
+        "command", metavar="subcommand", choices=list(COMMANDS), help="What to run"
+    )
+    return parser
+
+
+def run(command: str, args: list[str]) -> None:
+    """
+    Import a subcommand's script and run it with the given arguments, as if it was
+    run on its own.
+    """
+    # The scripts parse sys.argv; their usage shows the full command
+    sys.argv = ["{} {}".format(PROG, command)] + args
+    runpy.run_module(COMMANDS[command][0], run_name="__main__")
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line entrypoint."""
+    argv = sys.argv[1:] if argv is None else argv
+    # Only the subcommand is parsed here; its options are left to its script
+    args = make_parser().parse_args(argv[:1])
+    run(args.command, argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+"""
+Long-running reconciliation: full passes on an interval, and webhook deliveries that
+trigger reconciling just the organization they are about.
+
+The webhook endpoint is a small local HTTP server. It checks each delivery's
+`X-Hub-Signature-256` (HMAC-SHA256 of the body with the webhook secret), works out
+which organization the event affects, and queues it. Organizations queued in a burst
+(e.g. several membership changes) are deduplicated and reconciled together after a
+short debounce.
+
+Events that trigger a reconciliation:
+- `organization`: an organization created (GHES global webhooks), renamed, or its
+  members changed
+- `membership` and `team`: changes to one of the managed teams
+- `ping` is answered, and everything else is acknowledged and ignored
+"""
+
+from contextvars import copy_context
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import hmac
+import json
+import threading
+import time
+from typing import Any, Callable
+from urllib.parse import parse_qs
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Largest delivery accepted, in bytes (GitHub caps payloads at 25 MB)
+MAX_BODY = 25 * 1024 * 1024
+# Seconds to wait for more deliveries after the first of a burst
+DEBOUNCE = 2.0
+
+
+def sign(secret: bytes, body: bytes) -> str:
+    """The `X-Hub-Signature-256` header GitHub sends for a body."""
+    return "sha256=" + hmac.new(secret, body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: bytes, body: bytes, signature: str | None) -> bool:
+    """Whether a delivery's `X-Hub-Signature-256` header matches its body."""
+    return signature is not None and hmac.compare_digest(sign(secret, body), signature)
+
+
+def affected_org(
+    event: str, payload: dict[str, Any], team_names: set[str]
+) -> dict[str, str] | None:
+    """
+    The organization (`login` and node `id`) a webhook event should trigger
+    reconciling, or None if it does not concern the managed teams.
+
+    `team_names` are the managed teams' names, lowercased.
+    """
+    org = payload.get("organization") or {}
+    if not org.get("login"):
+        return None
+    if event == "organization":
+        if payload.get("action") == "deleted":
+            return None
+    elif event in ("membership", "team"):
+        team = payload.get("team") or {}
+        names = {str(team.get("name", "")).lower(), str(team.get("slug", "")).lower()}
+        if not names & team_names:
+            return None
+    else:
+        return None
+    return {"login": org["login"], "id": org.get("node_id", "")}
+
+
+class Triggers:
+    """
+    Organizations waiting to be reconciled, deduplicated by login. Safe to share
+    between threads.
+    """
+
+    def __init__(self) -> None:
+        self._orgs: dict[str, dict[str, str]] = {}
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def add(self, org: dict[str, str]) -> None:
+        """Queue an organization."""
+        with self._cond:
+            self._orgs[org["login"].lower()] = org
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        """Wake up any waiter, for shutdown."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def drain(self) -> list[dict[str, str]]:
+        """Take all queued organizations."""
+        with self._cond:
+            orgs = list(self._orgs.values())
+            self._orgs.clear()
+            return orgs
+
+    def wait(self, timeout: float, debounce: float = DEBOUNCE) -> list[dict[str, str]]:
+        """
+        Wait up to `timeout` seconds for an organization to be queued, then `debounce`
+        seconds more for others, and take them all.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._orgs or self.closed, timeout=timeout)
+            if not self._orgs or self.closed:
+                return []
+        end = time.monotonic() + debounce
+        with self._cond:
+            while not self.closed and time.monotonic() < end:
+                self._cond.wait(end - time.monotonic())
+        return self.drain()
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Receives webhook deliveries, and answers health checks on `/healthz`."""
+
+    server: "WebhookServer"
+
+    def _reply(self, status: int, body: dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/healthz":
+            self._reply(200, {"status": "ok"})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            self._reply(413, {"error": "payload too large"})
+            return
+        body = self.rfile.read(length)
+        if self.server.secret is not None and not verify_signature(
+            self.server.secret, body, self.headers.get("X-Hub-Signature-256")
+        ):
+            LOG.warning(
+                "⚠️ Rejected webhook delivery {} with a bad signature".format(
+                    self.headers.get("X-GitHub-Delivery")
+                )
+            )
+            self._reply(401, {"error": "bad signature"})
+            return
+        try:
+            if self.headers.get("Content-Type", "").startswith(
+                "application/x-www-form-urlencoded"
+            ):
+                body = parse_qs(body.decode("utf-8")).get("payload", ["{}"])[0]
+            payload = json.loads(body)
+        except (UnicodeDecodeError, ValueError):
+            self._reply(400, {"error": "invalid payload"})
+            return
+        event = self.headers.get("X-GitHub-Event", "")
+        if event == "ping":
+            self._reply(200, {"pong": True})
+            return
+        org = self.server.on_delivery(event, payload)
+        if org is None:
+            LOG.debug("Ignored {} webhook".format(event))
+            self._reply(202, {"queued": None})
+            return
+        LOG.info(
+            "Webhook {} ({}) queued organization {}".format(
+                event, payload.get("action"), org["login"]
+            )
+        )
+        self._reply(202, {"queued": org["login"]})
+
+    def log_message(self, format: str, *args: Any) -> None:
+        LOG.debug(format % args)
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """
+    HTTP server for webhook deliveries.
+
+    `on_delivery(event, payload)` queues the affected organization and returns it, or
+    returns None if the delivery is ignored. Without a secret, deliveries are not
+    verified.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        secret: bytes | None,
+        on_delivery: Callable[[str, dict[str, Any]], dict[str, str] | None],
+    ) -> None:
+        super().__init__(address, WebhookHandler)
+        self.secret = secret
+        self.on_delivery = on_delivery
+
+
+def start_server(
+    host: str,
+    port: int,
+    secret: bytes | None,
+    on_delivery: Callable[[str, dict[str, Any]], dict[str, str] | None],
+) -> WebhookServer:
+    """Start a webhook server in a background thread."""
+    server = WebhookServer((host, port), secret, on_delivery)
+    threading.Thread(target=server.serve_forever, name="webhooks", daemon=True).start()
+    LOG.info(
+        "Listening for webhooks on http://{}:{}/".format(*server.server_address[:2])
+    )
+    return server
+
+
+def run(
+    reconcile: Callable[[list[dict[str, str]] | None], None],
+    triggers: Triggers,
+    interval: float,
+    debounce: float = DEBOUNCE,
+) -> None:
+    """
+    Reconcile until `triggers` is closed: every organization every `interval` seconds
+    (`reconcile(None)`), and queued organizations as they arrive.
+
+    Full passes run on a thread of their own, so queued organizations are reconciled
+    while a pass is in progress rather than after it. The next pass starts `interval`
+    seconds after the last one finished; once closed, a pass in progress is finished.
+    """
+    next_full = time.monotonic()
+    full_pass: threading.Thread | None = None
+
+    def reconcile_all() -> None:
+        nonlocal next_full
+        try:
+            reconcile(None)
+        finally:
+            next_full = time.monotonic() + interval
+
+    while not triggers.closed:
+        running = full_pass is not None and full_pass.is_alive()
+        if not running and time.monotonic() >= next_full:
+            # Not due again until this pass has finished
+            next_full = float("inf")
+            full_pass = threading.Thread(
+                target=copy_context().run,
+                args=(reconcile_all,),
+                name="full-pass",
+                daemon=True,
+            )
+            full_pass.start()
+            continue
+        # While a pass runs, wake up at least every `interval` to schedule the next
+        timeout = min(next_full - time.monotonic(), interval)
+        orgs = triggers.wait(max(timeout, 0), debounce)
+        if orgs:
+            reconcile(orgs)
+    if full_pass is not None:
+        full_pass.join()
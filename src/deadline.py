@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+Deadline-bounded runs: stop starting organizations when there is no longer time to
+finish one, and work on the riskiest organizations first.
+
+The time an organization takes is projected as an exponentially weighted moving
+average (EWMA) of the organizations finished so far, so it follows the run as it
+speeds up or slows down. Organizations that are not started are left for a later
+run (see the scripts' `--checkpoint`), rather than the run being stopped partway
+through one.
+"""
+
+from datetime import datetime
+import re
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+# Weight of the latest organization in the moving average
+EWMA_ALPHA = 0.3
+
+# Risk tiers, riskiest first
+RISK_MISSING_TEAM = 0
+RISK_DRIFT = 1
+RISK_REVERIFY = 2
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_deadline(spec: str, now: float | None = None) -> float:
+    """
+    Parse a deadline into a timestamp.
+
+    Accepts a duration from now (`3600`, `90s`, `45m`, `2h`) or an ISO 8601 time
+    (`2024-05-01T18:00:00+00:00`; without a time zone, local time). Raises ValueError
+    for anything else.
+    """
+    now = time.time() if now is None else now
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*", spec)
+    if match:
+        return now + float(match.group(1)) * DURATION_UNITS[match.group(2) or "s"]
+    try:
+        return datetime.fromisoformat(spec.strip()).timestamp()
+    except ValueError:
+        raise ValueError(
+            "Invalid deadline '{}': expected a duration (e.g. 45m, 2h) or an ISO 8601 time".format(
+                spec
+            )
+        ) from None
+
+
+class Deadline:
+    """
+    Tracks the time left before a deadline and the projected time of one organization.
+    """
+
+    def __init__(self, at: float, alpha: float = EWMA_ALPHA) -> None:
+        self.at = at
+        self.alpha = alpha
+        self.average: float | None = None
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline."""
+        return self.at - time.time()
+
+    def record(self, seconds: float) -> None:
+        """Record how long an organization took."""
+        with self._lock:
+            if self.average is None:
+                self.average = seconds
+            else:
+                self.average = self.alpha * seconds + (1 - self.alpha) * self.average
+
+    def allows_start(self) -> bool:
+        """
+        Whether there is time to start another organization: the time left must
+        exceed the projected time of one (unknown until one has finished).
+        """
+        return self.remaining() > (self.average or 0.0)
+
+
+def risk_of(
+    missing_team: Iterable[str],
+    drifted: Iterable[str],
+    known: Iterable[str] | None = None,
+) -> Callable[[str], int]:
+    """
+    Rank organization logins by risk: missing (or never listed) team first, then
+    membership drift, then organizations that only need re-verifying.
+
+    If the `known` logins are given, any other organization counts as missing the team.
+    """
+    missing = {login.lower() for login in missing_team}
+    drift = {login.lower() for login in drifted}
+    known_set = {login.lower() for login in known} if known is not None else None
+
+    def risk(login: str) -> int:
+        if login.lower() in missing or (
+            known_set is not None and login.lower() not in known_set
+        ):
+            return RISK_MISSING_TEAM
+        if login.lower() in drift:
+            return RISK_DRIFT
+        return RISK_REVERIFY
+
+    return risk
+
+
+def prioritize(items: Iterable[Any], risk: Callable[[Any], int]) -> list[Any]:
+    """
+    Order items riskiest first, keeping the existing order within each tier.
+    """
+    return sorted(items, key=risk)
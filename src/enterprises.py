@@ -5,7 +5,7 @@ This file holds enterprise-related functions
 """
 
 from typing import Any
-import requests
+from . import fastjson, metacache, transport
 from .util import add_request_headers
 
 
@@ -14,10 +14,16 @@ def get_enterprise_id(
     enterprise_slug: str,
     headers: dict[str, str],
     verify: str | bool | None = True,
+    cache: metacache.MetaCache | None = None,
 ) -> str:
     """
-    Get the ID of an enterprise by its slug.
+    Get the ID of an enterprise by its slug, from the metadata cache if given.
     """
+    cache_key = metacache.key("enterprise_id", api_endpoint, enterprise_slug)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
     enterprise_query = """
     query {
       enterprise(slug: "ENTERPRISE_SLUG") {
@@ -27,14 +33,36 @@ def get_enterprise_id(
     """.replace(
         "ENTERPRISE_SLUG", enterprise_slug
     )
-    response = requests.post(
+    response = transport.request(
+        "POST",
         api_endpoint,
         json={"query": enterprise_query},
         headers=add_request_headers(headers),
         verify=verify,
+        idempotent=True,
     )
     response.raise_for_status()
-    return response.json()["data"]["enterprise"]["id"]
+    enterprise_id = fastjson.response_json(response)["data"]["enterprise"]["id"]
+    if cache is not None:
+        cache.set(cache_key, enterprise_id)
+    return enterprise_id
+
+
+def is_not_found(result: dict[str, Any]) -> bool:
+    """
+    Whether a GraphQL result failed because an ID it was given does not exist.
+    """
+    return any(error.get("type") == "NOT_FOUND" for error in result.get("errors") or [])
+
+
+def invalidate_enterprise_id(
+    cache: metacache.MetaCache | None, api_endpoint: str, enterprise_slug: str
+) -> None:
+    """
+    Drop an enterprise ID from the metadata cache, after it was rejected.
+    """
+    if cache is not None:
+        cache.invalidate(metacache.key("enterprise_id", api_endpoint, enterprise_slug))
 
 
 def make_promote_mutation(enterprise_id: str, org_id: str, role: str) -> str:
@@ -68,11 +96,47 @@ def promote_admin(
     Promote an enterprise admin to an organization owner.
     """
     promote_query = make_promote_mutation(enterprise_id, org_id, role)
-    response = requests.post(
+    response = transport.request(
+        "POST",
         api_endpoint,
         json={"query": promote_query},
         headers=add_request_headers(headers),
         verify=verify,
+        # Setting the same role twice has the same effect as setting it once
+        idempotent=True,
     )
     response.raise_for_status()
-    return response.json()
+    return fastjson.response_json(response)
+
+
+def change_org_role(
+    api_endpoint: str,
+    headers: dict[str, str],
+    enterprise_slug: str,
+    enterprise_id: str,
+    org_id: str,
+    role: str,
+    verify: str | bool | None = True,
+    cache: metacache.MetaCache | None = None,
+) -> tuple[dict[str, Any], str]:
+    """
+    Set the enterprise admin's role in an organization with `promote_admin`.
+
+    If the enterprise ID may have come from the metadata cache and is not found, it
+    is resolved again and, if it changed, the mutation is retried once. Returns the
+    result and the enterprise ID to use from now on.
+    """
+    result = promote_admin(api_endpoint, headers, enterprise_id, org_id, role, verify)
+    if cache is None or not is_not_found(result):
+        return result, enterprise_id
+    invalidate_enterprise_id(cache, api_endpoint, enterprise_slug)
+    fresh_id = get_enterprise_id(
+        api_endpoint, enterprise_slug, headers, verify=verify, cache=cache
+    )
+    if fresh_id == enterprise_id:
+        # The organization is what was not found
+        return result, enterprise_id
+    return (
+        promote_admin(api_endpoint, headers, fresh_id, org_id, role, verify),
+        fresh_id,
+    )
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+"""
+Dry-run estimates of the API budget a run needs, and whether it fits.
+
+Each phase (promote, manage, demote) is estimated from what is known locally: the
+org list, the org catalog or the inventory. An estimate is a plain dict:
+
+- phase: name of the phase
+- orgs: organizations it covers
+- rest: REST API calls
+- graphql: GraphQL rate limit points
+- writes: calls that change something (subject to GitHub's limits on content creation)
+
+`plan` then compares the estimates with the current rate limit budget (one call to
+`/rate_limit`, which does not count against it) to tell whether the run fits, how
+long it should take, and how many workers and tokens would help.
+"""
+
+from math import ceil
+import time
+from typing import Any, Iterable
+from . import fastjson, organizations, scheduler, teams, transport, users
+from .util import add_request_headers
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# GitHub asks for no more than 80 content-creating requests per minute
+WRITES_PER_MINUTE = 80
+# Most workers suggested: beyond this, secondary rate limits on concurrency bite
+MAX_SUGGESTED_WORKERS = 8
+# Rate limit window, in seconds
+WINDOW = 3600
+
+
+def get_rate_limits(
+    api_endpoint: str,
+    headers: dict[str, str],
+    verify: str | bool | None = True,
+) -> tuple[dict[str, dict[str, int]] | None, float]:
+    """
+    Get the current REST and GraphQL rate limit budgets, and the call's latency in seconds.
+
+    The budgets are None when rate limiting is disabled (GitHub Enterprise Server).
+    """
+    start = time.monotonic()
+    response = transport.request(
+        "GET",
+        api_endpoint + "/rate_limit",
+        headers=add_request_headers(headers),
+        verify=verify,
+    )
+    latency = time.monotonic() - start
+    if response.status_code == 404:
+        return None, latency
+    response.raise_for_status()
+    return fastjson.response_json(response)["resources"], latency
+
+
+def _pages(count: int, page_size: int = scheduler.PAGE_SIZE) -> int:
+    return max(1, ceil(count / page_size))
+
+
+def estimate_promote(
+    org_count: int, unmanaged_count: int, catalog: bool = False
+) -> dict[str, Any]:
+    """
+    Estimate `org-admin-promote.py`: count, enterprise ID, the listing (twice, unless
+    an org catalog is kept) and one mutation per unmanaged organization.
+    """
+    listings = 0 if catalog else 2
+    return {
+        "phase": "promote",
+        "orgs": org_count,
+        "rest": 0,
+        "graphql": 2
+        + listings * _pages(org_count, organizations.MAX_PAGE_SIZE)
+        + unmanaged_count,
+        "writes": unmanaged_count,
+    }
+
+
+def estimate_demote(unmanaged_count: int) -> dict[str, Any]:
+    """
+    Estimate `org-admin-demote.py`: enterprise ID and one mutation per organization.
+    """
+    return {
+        "phase": "demote",
+        "orgs": unmanaged_count,
+        "rest": 0,
+        "graphql": 1 + unmanaged_count,
+        "writes": unmanaged_count,
+    }
+
+
+def estimate_manage(
+    orgs: Iterable[str],
+    members: Iterable[str] = (),
+    sizes: dict[str, dict[str, int]] | None = None,
+    missing_team: Iterable[str] = (),
+    drift: dict[str, tuple[list[str], list[str]]] | None = None,
+    cached_roles: Iterable[str] = (),
+    shared: Iterable[str] = (),
+    precheck: bool = False,
+) -> dict[str, Any]:
+    """
+    Estimate `manage-sec-team.py` for organization logins, except for its GraphQL
+    checks (see `estimate_checks`).
+
+    `sizes` are the inventory's counts (see `inventory.org_sizes`), `missing_team`
+    the organizations where the team is missing or was never listed, and `drift` the
+    (missing, extra) members of the team where it was listed. Without an inventory,
+    every organization is assumed to lack the team. `cached_roles` are the
+    organizations whose role ID is in the metadata cache, so their roles are not listed.
+    `shared` are the organizations whose roles, teams and members were already
+    counted for another team (see `combine`). With the `precheck`, teams are not
+    listed, nor members where the team is known to be in sync.
+    """
+    sizes = sizes or {}
+    drift = drift or {}
+    missing = {login.lower() for login in missing_team}
+    cached = {login.lower() for login in cached_roles}
+    already_listed = {login.lower() for login in shared}
+    desired = list(members)
+    org_count = rest = writes = 0
+    for login in orgs:
+        org_count += 1
+        size = sizes.get(login.lower())
+        in_sync = (
+            precheck
+            and size is not None
+            and login.lower() not in missing
+            and login.lower() not in drift
+        )
+        # Role check, and team members if syncing them
+        rest += 1 + (_pages(len(desired)) if desired and not in_sync else 0)
+        if login.lower() not in already_listed:
+            # Roles (unless cached), teams and org members are listed once per org
+            rest += 0 if login.lower() in cached else 1
+            if not precheck:
+                rest += _pages(size["teams"] if size else 0)
+            if desired and not in_sync:
+                rest += _pages(size["members"] if size else 0)
+        if size is None or login.lower() in missing:
+            # Create the team, give it the role, and add everyone
+            writes += 2 + len(desired)
+        elif login.lower() in drift:
+            add, remove = drift[login.lower()]
+            writes += len(add) + len(remove)
+    rest += writes
+    return {
+        "phase": "manage",
+        "orgs": org_count,
+        "rest": rest,
+        "graphql": 0,
+        "writes": writes,
+    }
+
+
+def estimate_checks(member_count: int, precheck_aliases: int = 0) -> dict[str, Any]:
+    """
+    Estimate the GraphQL checks of `manage-sec-team.py`, batched across organizations
+    and teams: validating `member_count` logins, and pre-checking teams with
+    `precheck_aliases` aliased fields in all (see `teams.precheck_aliases`).
+    """
+    return {
+        "phase": "manage",
+        "orgs": 0,
+        "rest": 0,
+        "graphql": ceil(member_count / users.MAX_BATCH)
+        + ceil(precheck_aliases / teams.PRECHECK_MAX_ALIASES),
+        "writes": 0,
+    }
+
+
+def combine(estimates: list[dict[str, Any]], org_count: int) -> dict[str, Any]:
+    """
+    Combine the estimates of one phase for several teams into one, over `org_count`
+    organizations.
+    """
+    return {
+        "phase": estimates[0]["phase"],
+        "orgs": org_count,
+        "rest": sum(e["rest"] for e in estimates),
+        "graphql": sum(e["graphql"] for e in estimates),
+        "writes": sum(e["writes"] for e in estimates),
+    }
+
+
+def plan(
+    estimates: list[dict[str, Any]],
+    rate_limits: dict[str, dict[str, int]] | None,
+    latency: float,
+    workers: int = 1,
+) -> dict[str, Any]:
+    """
+    Compare estimates with the current rate limit budget.
+
+    Returns per resource whether the run fits, the tokens needed to finish without
+    waiting for a reset, each phase's expected duration, and the suggested number of
+    workers for the parallel (manage) phase.
+    """
+    now = time.time()
+    needs = {
+        "core": sum(e["rest"] for e in estimates),
+        "graphql": sum(e["graphql"] for e in estimates),
+    }
+    budget: dict[str, dict[str, Any]] = {}
+    wait = 0.0
+    tokens = 1
+    for resource, need in needs.items():
+        if rate_limits is None or resource not in rate_limits:
+            budget[resource] = {"need": need, "remaining": None, "fits": True}
+            continue
+        limit = rate_limits[resource]
+        over = need - limit["remaining"]
+        budget[resource] = {
+            "need": need,
+            "remaining": limit["remaining"],
+            "limit": limit["limit"],
+            "fits": over <= 0,
+        }
+        if over > 0 and limit["limit"]:
+            windows = ceil(over / limit["limit"])
+            tokens = max(tokens, 1 + windows)
+            # Wait for the next reset, then a full window for each further overflow
+            wait = max(wait, max(0.0, limit["reset"] - now) + (windows - 1) * WINDOW)
+
+    phases = []
+    suggested_workers = None
+    for e in estimates:
+        calls = e["rest"] + e["graphql"]
+        phase_workers = workers if e["phase"] == "manage" else 1
+        floor = e["writes"] * 60 / WRITES_PER_MINUTE
+        if e["phase"] == "manage":
+            # Enough workers that latency is no longer what limits the phase
+            suggested_workers = max(
+                1,
+                min(
+                    MAX_SUGGESTED_WORKERS,
+                    e["orgs"],
+                    ceil(calls * latency / max(floor, 1.0)),
+                ),
+            )
+        phases.append(
+            {
+                "phase": e["phase"],
+                "workers": phase_workers,
+                "seconds": max(calls * latency / phase_workers, floor),
+            }
+        )
+    return {
+        "budget": budget,
+        "latency": latency,
+        "phases": phases,
+        "wait": wait,
+        "seconds": sum(p["seconds"] for p in phases) + wait,
+        "tokens": tokens,
+        "suggested_workers": suggested_workers,
+    }
+
+
+def log_plan(estimates: list[dict[str, Any]], run_plan: dict[str, Any]) -> None:
+    """
+    Log estimates and their plan.
+    """
+    LOG.info("===== Estimate =====")
+    for e, phase in zip(estimates, run_plan["phases"]):
+        LOG.info(
+            "{}: {} organizations, {} REST calls, {} GraphQL points, {} writes, ~{:.0f}s with {} worker(s)".format(
+                e["phase"],
+                e["orgs"],
+                e["rest"],
+                e["graphql"],
+                e["writes"],
+                phase["seconds"],
+                phase["workers"],
+            )
+        )
+    for resource, budget in run_plan["budget"].items():
+        if budget["remaining"] is None:
+            LOG.info("{}: {} needed, no rate limit".format(resource, budget["need"]))
+            continue
+        LOG.info(
+            "{} {}: {} needed, {} of {} remaining".format(
+                "✓" if budget["fits"] else "⚠️",
+                resource,
+                budget["need"],
+                budget["remaining"],
+                budget["limit"],
+            )
+        )
+    if run_plan["wait"]:
+        LOG.warning(
+            "⚠️ The run does not fit in the current budget: about {:.0f}s waiting for rate limit resets with one token".format(
+                run_plan["wait"]
+            )
+        )
+    LOG.info(
+        "Expected duration: ~{:.0f}s ({:.0f} ms per call)".format(
+            run_plan["seconds"], run_plan["latency"] * 1000
+        )
+    )
+    LOG.info(
+        "Tokens to finish without waiting for a reset: {}".format(run_plan["tokens"])
+    )
+    if run_plan["suggested_workers"] is not None:
+        LOG.info(
+            "Suggested manage-sec-team.py --workers: {}".format(
+                run_plan["suggested_workers"]
+            )
+        )
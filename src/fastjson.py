@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""
+JSON decoding of API responses, with optional faster backends:
+
+- `orjson`, if installed, decodes documents faster than `json`
+- `ijson`, if installed, parses very large documents incrementally, keeping only
+  the fields that are used instead of building every object in full. It needs a
+  fraction of the memory, but more CPU, so it is only used above
+  `STREAM_MIN_BYTES`; GitHub's pages of at most 100 items are well below it.
+
+Listings keep only the fields that are used either way, which is most of the
+memory saving on REST objects full of URLs. Neither backend is required: without
+them the standard library gives the same results. `bench-json.py` measures them.
+"""
+
+from io import BytesIO
+import json
+from typing import Any, Iterator
+import requests
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional
+    orjson = None
+
+# ijson, once `load_ijson` has imported it, as it is only needed for large bodies
+ijson: Any = None
+
+# ijson events for values that are not containers
+SCALAR_EVENTS = frozenset(["string", "number", "boolean", "null"])
+
+# Bodies from which parsing incrementally saves enough memory to be worth its CPU
+STREAM_MIN_BYTES = 4 * 1024 * 1024
+
+
+def loads(data: bytes | str) -> Any:
+    """Decode a JSON document, with orjson if it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_ijson() -> bool:
+    """Import ijson, if it is installed. Returns whether it is."""
+    global ijson
+    if ijson is None:
+        try:
+            import ijson as ijson_module
+        except ImportError:  # pragma: no cover - optional
+            return False
+        ijson = ijson_module
+    return True
+
+
+def response_json(response: requests.Response) -> Any:
+    """Decode a response's JSON body; the drop-in for `response.json()`."""
+    return loads(response.content)
+
+
+def iter_fields(data: bytes, fields: tuple[str, ...]) -> Iterator[dict[str, Any]]:
+    """
+    Yield the objects of a JSON array with only the given (top-level, scalar) fields,
+    parsing incrementally if the body is large and ijson is installed.
+    """
+    if len(data) >= STREAM_MIN_BYTES and load_ijson():
+        yield from stream_fields(data, fields)
+        return
+    for item in loads(data):
+        yield {field: item[field] for field in fields if field in item}
+
+
+def stream_fields(data: bytes, fields: tuple[str, ...]) -> Iterator[dict[str, Any]]:
+    """
+    Like `iter_fields`, always parsing incrementally with ijson (see `load_ijson`).
+    """
+    wanted = {"item." + field: field for field in fields}
+    current: dict[str, Any] | None = None
+    for prefix, event, value in ijson.parse(BytesIO(data)):
+        if prefix == "item":
+            if event == "start_map":
+                current = {}
+            elif event == "end_map" and current is not None:
+                yield current
+                current = None
+        elif current is not None and prefix in wanted and event in SCALAR_EVENTS:
+            current[wanted[prefix]] = value
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+
+"""
+A persisted local inventory of organizations, teams and memberships.
+
+The scripts populate it as a side effect of the listings they already do (and
+keep it current as they change memberships), so questions such as "which orgs
+lack the security team?" or "where is user X a security manager?" can be answered
+locally without a live scan of the enterprise.
+
+Each listing replaces only the part of the inventory it covers (one org's teams,
+one team's members, ...), so the inventory is refreshed incrementally rather than
+rebuilt. The `*_seen_at` columns record when each part was last listed; None means
+it has never been listed, which is different from "listed and empty".
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Iterable
+from .records import Member, Org, Team
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# One lock for all inventory writes, so concurrent workers can share a connection
+_LOCK = threading.RLock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orgs (
+    login TEXT PRIMARY KEY COLLATE NOCASE,
+    node_id TEXT,
+    created_at TEXT,
+    viewer_can_administer INTEGER,
+    repo_count INTEGER,
+    seen_at REAL,
+    teams_seen_at REAL,
+    members_seen_at REAL
+);
+CREATE INDEX IF NOT EXISTS orgs_node_id ON orgs (node_id);
+
+CREATE TABLE IF NOT EXISTS teams (
+    org_login TEXT NOT NULL COLLATE NOCASE,
+    slug TEXT NOT NULL COLLATE NOCASE,
+    name TEXT,
+    role TEXT,
+    seen_at REAL,
+    members_seen_at REAL,
+    PRIMARY KEY (org_login, slug)
+);
+CREATE INDEX IF NOT EXISTS teams_slug ON teams (slug);
+
+CREATE TABLE IF NOT EXISTS team_members (
+    org_login TEXT NOT NULL COLLATE NOCASE,
+    team_slug TEXT NOT NULL COLLATE NOCASE,
+    login TEXT NOT NULL COLLATE NOCASE,
+    seen_at REAL,
+    PRIMARY KEY (org_login, team_slug, login)
+);
+CREATE INDEX IF NOT EXISTS team_members_login ON team_members (login);
+
+CREATE TABLE IF NOT EXISTS org_members (
+    org_login TEXT NOT NULL COLLATE NOCASE,
+    login TEXT NOT NULL COLLATE NOCASE,
+    seen_at REAL,
+    PRIMARY KEY (org_login, login)
+);
+CREATE INDEX IF NOT EXISTS org_members_login ON org_members (login);
+"""
+
+
+def open_inventory(path: str) -> sqlite3.Connection:
+    """
+    Open (creating if needed) the inventory database.
+    """
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _ensure_org(conn: sqlite3.Connection, org_login: str) -> None:
+    conn.execute("INSERT OR IGNORE INTO orgs (login) VALUES (?)", (org_login,))
+
+
+def _ensure_team(conn: sqlite3.Connection, org_login: str, team_slug: str) -> None:
+    _ensure_org(conn, org_login)
+    conn.execute(
+        "INSERT OR IGNORE INTO teams (org_login, slug, name) VALUES (?, ?, ?)",
+        (org_login, team_slug, team_slug),
+    )
+
+
+def record_orgs(
+    conn: sqlite3.Connection, orgs: Iterable[Org], complete: bool = False
+) -> None:
+    """
+    Record organizations from a listing (`list_orgs`).
+
+    If the listing covers the whole enterprise (`complete`), organizations that are
+    no longer listed are removed along with their teams and memberships.
+    """
+    now = time.time()
+    with _LOCK, conn:
+        logins = []
+        for org in orgs:
+            logins.append(org.login)
+            conn.execute(
+                """
+                INSERT INTO orgs (login, node_id, created_at, viewer_can_administer, repo_count, seen_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (login) DO UPDATE SET
+                    node_id = COALESCE(excluded.node_id, node_id),
+                    created_at = COALESCE(excluded.created_at, created_at),
+                    viewer_can_administer = COALESCE(excluded.viewer_can_administer, viewer_can_administer),
+                    repo_count = COALESCE(excluded.repo_count, repo_count),
+                    seen_at = excluded.seen_at
+                """,
+                (
+                    org.login,
+                    org.id,
+                    org.created_at,
+                    org.viewer_can_administer,
+                    org.repository_count,
+                    now,
+                ),
+            )
+        if complete:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS listed (login TEXT)")
+            conn.execute("DELETE FROM listed")
+            conn.executemany(
+                "INSERT INTO listed VALUES (?)", ((login,) for login in logins)
+            )
+            for table, column in (
+                ("team_members", "org_login"),
+                ("org_members", "org_login"),
+                ("teams", "org_login"),
+                ("orgs", "login"),
+            ):
+                conn.execute(
+                    "DELETE FROM {} WHERE {} COLLATE NOCASE NOT IN (SELECT login FROM listed)".format(
+                        table, column
+                    )
+                )
+
+
+def record_teams(
+    conn: sqlite3.Connection, org_login: str, teams: Iterable[Team]
+) -> None:
+    """
+    Record the complete list of teams in an organization (from `list_teams`).
+    """
+    now = time.time()
+    with _LOCK, conn:
+        _ensure_org(conn, org_login)
+        slugs = []
+        for team in teams:
+            slugs.append(team.slug)
+            conn.execute(
+                """
+                INSERT INTO teams (org_login, slug, name, seen_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (org_login, slug) DO UPDATE SET
+                    name = excluded.name, seen_at = excluded.seen_at
+                """,
+                (org_login, team.slug, team.name, now),
+            )
+        placeholders = ",".join("?" * len(slugs))
+        for table, column in (("team_members", "team_slug"), ("teams", "slug")):
+            conn.execute(
+                "DELETE FROM {} WHERE org_login = ? AND {} NOT IN ({})".format(
+                    table, column, placeholders
+                ),
+                (org_login, *slugs),
+            )
+        conn.execute(
+            "UPDATE orgs SET teams_seen_at = ? WHERE login = ?", (now, org_login)
+        )
+
+
+def record_team(
+    conn: sqlite3.Connection,
+    org_login: str,
+    team_slug: str,
+    role: str | None = None,
+    name: str | None = None,
+) -> None:
+    """
+    Record that a team exists (e.g. after creating it), optionally with its role and
+    name.
+    """
+    with _LOCK, conn:
+        _ensure_team(conn, org_login, team_slug)
+        conn.execute(
+            "UPDATE teams SET seen_at = ?, role = COALESCE(?, role), name = COALESCE(?, name) WHERE org_login = ? AND slug = ?",
+            (time.time(), role, name, org_login, team_slug),
+        )
+
+
+def record_team_members(
+    conn: sqlite3.Connection,
+    org_login: str,
+    team_slug: str,
+    members: Iterable[Member],
+) -> None:
+    """
+    Record the complete list of members of a team (from `list_team_members`).
+    """
+    now = time.time()
+    with _LOCK, conn:
+        _ensure_team(conn, org_login, team_slug)
+        conn.execute(
+            "DELETE FROM team_members WHERE org_login = ? AND team_slug = ?",
+            (org_login, team_slug),
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO team_members VALUES (?, ?, ?, ?)",
+            ((org_login, team_slug, m.login, now) for m in members),
+        )
+        conn.execute(
+            "UPDATE teams SET members_seen_at = ? WHERE org_login = ? AND slug = ?",
+            (now, org_login, team_slug),
+        )
+
+
+def record_org_members(
+    conn: sqlite3.Connection, org_login: str, members: Iterable[Member]
+) -> None:
+    """
+    Record the complete list of members of an organization (from `list_org_users`).
+    """
+    now = time.time()
+    with _LOCK, conn:
+        _ensure_org(conn, org_login)
+        conn.execute("DELETE FROM org_members WHERE org_login = ?", (org_login,))
+        conn.executemany(
+            "INSERT OR REPLACE INTO org_members VALUES (?, ?, ?)",
+            ((org_login, m.login, now) for m in members),
+        )
+        conn.execute(
+            "UPDATE orgs SET members_seen_at = ? WHERE login = ?", (now, org_login)
+        )
+
+
+def record_team_membership(
+    conn: sqlite3.Connection,
+    org_login: str,
+    team_slug: str,
+    login: str,
+    present: bool,
+) -> None:
+    """
+    Record a single team membership change made by a script.
+
+    Adding someone to a team also makes them a member of the organization.
+    """
+    now = time.time()
+    with _LOCK, conn:
+        if present:
+            _ensure_team(conn, org_login, team_slug)
+            conn.execute(
+                "INSERT OR REPLACE INTO team_members VALUES (?, ?, ?, ?)",
+                (org_login, team_slug, login, now),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO org_members VALUES (?, ?, ?)",
+                (org_login, login, now),
+            )
+        else:
+            conn.execute(
+                "DELETE FROM team_members WHERE org_login = ? AND team_slug = ? AND login = ?",
+                (org_login, team_slug, login),
+            )
+
+
+def orgs_missing_team(conn: sqlite3.Connection, team_slug: str) -> dict[str, list[str]]:
+    """
+    Find organizations that do not have a team.
+
+    Returns a dict with `missing` (teams were listed, and the team is not among
+    them) and `unknown` (the org's teams have never been listed).
+    """
+    missing = [
+        row[0]
+        for row in conn.execute(
+            """
+            SELECT login FROM orgs
+            WHERE teams_seen_at IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM teams WHERE org_login = orgs.login AND slug = ?)
+            ORDER BY login
+            """,
+            (team_slug,),
+        )
+    ]
+    unknown = [
+        row[0]
+        for row in conn.execute(
+            """
+            SELECT login FROM orgs
+            WHERE teams_seen_at IS NULL
+              AND NOT EXISTS (SELECT 1 FROM teams WHERE org_login = orgs.login AND slug = ?)
+            ORDER BY login
+            """,
+            (team_slug,),
+        )
+    ]
+    return {"missing": missing, "unknown": unknown}
+
+
+def user_teams(
+    conn: sqlite3.Connection, login: str, role: str | None = None
+) -> list[tuple[str, str, str | None]]:
+    """
+    List the (organization, team, role) of every team a user is a member of,
+    optionally only teams with a given role (e.g. `security_manager`).
+    """
+    query = """
+        SELECT tm.org_login, tm.team_slug, t.role FROM team_members tm
+        JOIN teams t ON t.org_login = tm.org_login AND t.slug = tm.team_slug
+        WHERE tm.login = ?
+    """
+    params: tuple[str, ...] = (login,)
+    if role is not None:
+        query += " AND t.role = ?"
+        params = (login, role)
+    return [
+        (row[0], row[1], row[2])
+        for row in conn.execute(query + " ORDER BY tm.org_login, tm.team_slug", params)
+    ]
+
+
+def team_drift(
+    conn: sqlite3.Connection, team_slug: str, desired: Iterable[str]
+) -> list[tuple[str, list[str], list[str]]]:
+    """
+    Compare the recorded members of a team in every organization with a desired list.
+
+    Returns (organization, missing members, extra members) for each organization whose
+    team members were listed and differ. Logins are compared case-insensitively.
+    """
+    desired_set = {login.lower() for login in desired}
+    actual: dict[str, set[str]] = {}
+    for row in conn.execute(
+        "SELECT org_login FROM teams WHERE slug = ? AND members_seen_at IS NOT NULL",
+        (team_slug,),
+    ):
+        actual[row[0]] = set()
+    for row in conn.execute(
+        "SELECT org_login, login FROM team_members WHERE team_slug = ?", (team_slug,)
+    ):
+        if row[0] in actual:
+            actual[row[0]].add(row[1].lower())
+    drift = []
+    for org_login in sorted(actual):
+        missing = sorted(desired_set - actual[org_login])
+        extra = sorted(actual[org_login] - desired_set)
+        if missing or extra:
+            drift.append((org_login, missing, extra))
+    return drift
+
+
+def stats(conn: sqlite3.Connection) -> dict[str, int]:
+    """
+    Count the rows in each inventory table.
+    """
+    return {
+        table: conn.execute("SELECT COUNT(*) FROM {}".format(table)).fetchone()[0]
+        for table in ("orgs", "teams", "team_members", "org_members")
+    }
+
+
+def known_orgs(conn: sqlite3.Connection) -> list[Org]:
+    """
+    The recorded organizations, with their `id`, `login` and `viewer_can_administer`.
+    """
+    return [
+        Org(
+            row["node_id"],
+            row["login"],
+            (
+                None
+                if row["viewer_can_administer"] is None
+                else bool(row["viewer_can_administer"])
+            ),
+        )
+        for row in conn.execute(
+            "SELECT node_id, login, viewer_can_administer FROM orgs ORDER BY login"
+        )
+    ]
+
+
+def org_sizes(conn: sqlite3.Connection) -> dict[str, dict[str, int]]:
+    """
+    The recorded repository, member and team counts of each organization, keyed by
+    lowercased login.
+    """
+    sizes: dict[str, dict[str, int]] = {}
+    for row in conn.execute(
+        """
+        SELECT o.login, o.repo_count,
+            (SELECT COUNT(*) FROM org_members m WHERE m.org_login = o.login),
+            (SELECT COUNT(*) FROM teams t WHERE t.org_login = o.login)
+        FROM orgs o
+        """
+    ):
+        sizes[row[0].lower()] = {
+            "repos": row[1] or 0,
+            "members": row[2],
+            "teams": row[3],
+        }
+    return sizes
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+"""
+A small persistent cache of slow-changing metadata, kept in a JSON file between runs:
+
+- the enterprise's node ID, by slug
+- each organization's role IDs, by role name (`security_manager`, or any role a
+  team is given)
+- organization node IDs and logins, both ways
+
+Entries expire after a TTL, and the least recently used are evicted beyond
+`max_entries`. Callers invalidate an entry when using it fails with a 404 or 422
+(or a GraphQL NOT_FOUND), and then resolve it again.
+"""
+
+from argparse import ArgumentParser
+import json
+import os
+import threading
+import time
+from typing import Any
+from urllib.parse import urlparse
+import requests
+import logging
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_TTL = 7 * 24 * 3600
+MAX_ENTRIES = 50000
+
+# Statuses that mean a cached ID is no longer valid
+STALE_STATUSES = frozenset([404, 422])
+
+
+def key(kind: str, api_endpoint: str, *parts: str) -> str:
+    """A cache key for a kind of metadata on the GitHub server of an API endpoint."""
+    return "|".join((kind, urlparse(api_endpoint).netloc) + parts)
+
+
+def is_stale(error: Exception) -> bool:
+    """Whether an HTTP error means a cached ID used in the request is no longer valid."""
+    return (
+        isinstance(error, requests.exceptions.HTTPError)
+        and error.response is not None
+        and error.response.status_code in STALE_STATUSES
+    )
+
+
+class MetaCache:
+    """
+    Metadata entries with a TTL and least-recently-used eviction, saved to a JSON file.
+
+    Safe to share between threads. Without a path, it is kept in memory only.
+    """
+
+    def __init__(
+        self,
+        path: str | None,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = MAX_ENTRIES,
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path is None:
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f).get("entries", {})
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError):
+            LOG.warning("⚠️ Ignoring unreadable metadata cache {}".format(path))
+
+    def get(self, cache_key: str) -> Any | None:
+        """The cached value, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None or entry["expires"] < now:
+                if entry is not None:
+                    del self._entries[cache_key]
+                    self._dirty = True
+                self.misses += 1
+                return None
+            entry["used"] = now
+            self._dirty = True
+            self.hits += 1
+            return entry["value"]
+
+    def set(self, cache_key: str, value: Any) -> None:
+        """Cache a value for the TTL."""
+        now = time.time()
+        with self._lock:
+            self._entries[cache_key] = {
+                "value": value,
+                "expires": now + self.ttl,
+                "used": now,
+            }
+            self._dirty = True
+            if len(self._entries) > self.max_entries:
+                by_use = sorted(self._entries, key=lambda k: self._entries[k]["used"])
+                for evicted in by_use[: len(self._entries) - self.max_entries]:
+                    del self._entries[evicted]
+
+    def invalidate(self, cache_key: str) -> None:
+        """Drop a cached value that turned out to be wrong."""
+        with self._lock:
+            if self._entries.pop(cache_key, None) is not None:
+                LOG.debug("Invalidated cached {}".format(cache_key))
+                self._dirty = True
+
+    def save(self) -> None:
+        """Write the cache to its file, atomically, if anything changed."""
+        with self._lock:
+            if not self._dirty or self.path is None:
+                return
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": self._entries}, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def __enter__(self) -> "MetaCache":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.save()
+
+
+def open_cache(path: str | None, ttl: float = DEFAULT_TTL) -> MetaCache | None:
+    """Open the metadata cache at a path, or None if no path is given."""
+    return MetaCache(path, ttl=ttl) if path else None
+
+
+def add_cache_args(parser: ArgumentParser) -> None:
+    """Add the metadata cache's arguments to a command line parser."""
+    parser.add_argument(
+        "--metadata-cache",
+        required=False,
+        help="JSON file caching the enterprise ID, role IDs and organization logins between runs",
+    )
+    parser.add_argument(
+        "--metadata-ttl",
+        type=float,
+        default=DEFAULT_TTL,
+        help="Seconds a cached metadata entry is trusted (default: {})".format(
+            DEFAULT_TTL
+        ),
+    )
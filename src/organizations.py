@@ -4,10 +4,14 @@
 Organization queries
 """
 
-from typing import Any
+from typing import Any, Iterable, Iterator
 from defusedcsv import csv
+import json
+import os
 from urllib.parse import quote
-import requests
+from . import fastjson, metacache, records, transport
+from .records import Member, Org
+from .users import MEMBER_FIELDS
 from .util import add_request_headers
 import logging
 
@@ -51,41 +55,51 @@ def get_total_count(
         """
         % enterprise_slug
     )
-    response = requests.post(
+    response = transport.request(
+        "POST",
         api_endpoint,
         json={"query": total_count_query},
         headers=add_request_headers(headers),
         verify=verify,
+        idempotent=True,
     )
     response.raise_for_status()
+    data = fastjson.response_json(response)
     try:
-        return response.json()["data"]["enterprise"]["organizations"]["totalCount"]
+        return data["data"]["enterprise"]["organizations"]["totalCount"]
     except (KeyError, TypeError):
         LOG.error("⨯ Failed to get total count of organizations")
         return 0
 
 
-# Make query for all organization names in the enterprise
-def make_org_query(enterprise_slug: str, after_cursor: str | None = None) -> str:
-    """
-    Create a GraphQL query to list all organizations in the enterprise.
-    """
-    return """
+# Fields requested for each organization, by field set. "minimal" is enough to
+# promote/demote; "full" adds the repository aggregates for the CSV inventory, which
+# are the expensive part of the query on the server side.
+ORG_FIELD_SETS: dict[str, list[str]] = {
+    "minimal": ["id", "login", "viewerCanAdminister"],
+    "full": [
+        "id",
+        "createdAt",
+        "login",
+        "email",
+        "viewerCanAdminister",
+        "viewerIsAMember",
+        "repositories { totalCount totalDiskUsage }",
+    ],
+}
+
+# Page size bounds for the organization listing
+MAX_PAGE_SIZE = 100
+MIN_PAGE_SIZE = 10
+
+# The query listing a page of organizations, with its placeholders
+ORG_QUERY = """
     query listEnterpriseOrganizations {
       enterprise(slug: SLUG) {
-        organizations(first: 100, after:AFTER) {
+        organizations(first: PAGE_SIZE, after:AFTER ORDER_BY) {
           edges{
             node{
-              id
-              createdAt
-              login
-              email
-              viewerCanAdminister
-              viewerIsAMember
-              repositories {
-                totalCount
-                totalDiskUsage
-              }
+              FIELDS
             }
             cursor
           }
@@ -96,79 +110,345 @@ def make_org_query(enterprise_slug: str, after_cursor: str | None = None) -> str
         }
       }
     }
-    """.replace(
-        "SLUG", '"{}"'.format(enterprise_slug)
-    ).replace(
-        "AFTER", '"{}"'.format(after_cursor) if after_cursor else "null"
+    """
+
+
+# Make query for all organization names in the enterprise
+def make_org_query(
+    enterprise_slug: str,
+    after_cursor: str | None = None,
+    newest_first: bool = False,
+    fields: str = "full",
+    page_size: int = MAX_PAGE_SIZE,
+) -> str:
+    """
+    Create a GraphQL query to list all organizations in the enterprise.
+
+    If `newest_first` is set, organizations are ordered by creation time, newest first.
+    `fields` selects one of the ORG_FIELD_SETS.
+    """
+    return (
+        ORG_QUERY.replace("FIELDS", "\n              ".join(ORG_FIELD_SETS[fields]))
+        .replace(
+            "ORDER_BY",
+            ", orderBy: {field: CREATED_AT, direction: DESC}" if newest_first else "",
+        )
+        .replace("PAGE_SIZE", str(page_size))
+        .replace("SLUG", '"{}"'.format(enterprise_slug))
+        .replace("AFTER", '"{}"'.format(after_cursor) if after_cursor else "null")
     )
 
 
-def list_orgs(
+def next_page_size(page_size: int) -> int:
+    """
+    The page size after a page that was read, growing back towards MAX_PAGE_SIZE
+    after timeouts shrank it.
+
+    Pages only shrink on timeouts: a page's cost in rate limit points is about the
+    same per organization whatever its size, so smaller pages would only add calls.
+    """
+    return min(MAX_PAGE_SIZE, page_size * 2)
+
+
+def iter_org_pages(
     api_endpoint: str,
     enterprise_slug: str,
     headers: dict[str, str],
     verify: str | bool | None = True,
-) -> list[dict[str, Any]]:
+    fields: str = "full",
+    newest_first: bool = False,
+) -> Iterator[list[Org] | None]:
     """
-    List all organizations in the enterprise by name.
+    Page through the organizations in the enterprise, yielding the organizations of
+    each page.
+
+    The page size is halved when the server still times out on a page (HTTP 502/504)
+    once the transport's own retries are exhausted, and grows back towards
+    MAX_PAGE_SIZE after each page that is read. Yields None if a page could not be
+    read.
     """
-    orgs = []
     after_cursor = None
+    page_size = MAX_PAGE_SIZE
     while True:
-        response = requests.post(
+        response = transport.request(
+            "POST",
             api_endpoint,
-            json={"query": make_org_query(enterprise_slug, after_cursor)},
+            json={
+                "query": make_org_query(
+                    enterprise_slug, after_cursor, newest_first, fields, page_size
+                )
+            },
             headers=add_request_headers(headers),
             verify=verify,
+            idempotent=True,
         )
+        if response.status_code in (502, 504) and page_size > MIN_PAGE_SIZE:
+            page_size = max(MIN_PAGE_SIZE, page_size // 2)
+            LOG.debug("Organization page timed out; retrying with {}".format(page_size))
+            continue
         response.raise_for_status()
-        data = response.json()
+        data = fastjson.response_json(response)
         try:
             org_data = data["data"]["enterprise"]["organizations"]
-            orgs.extend(org_data["edges"])
-            if org_data["pageInfo"]["hasNextPage"]:
-                after_cursor = org_data["pageInfo"]["endCursor"]
-            else:
-                break
+            edges = org_data["edges"]
+            page_info = org_data["pageInfo"]
         except (KeyError, TypeError):
             LOG.error("⨯ Failed to get organizations")
             if "errors" in data:
                 LOG.error(format_errors(data["errors"]))
+            yield None
+            return
+        yield [records.org_from_node(edge["node"]) for edge in edges]
+        if not page_info["hasNextPage"]:
+            return
+        after_cursor = page_info["endCursor"]
+        page_size = next_page_size(page_size)
+
+
+def list_orgs(
+    api_endpoint: str,
+    enterprise_slug: str,
+    headers: dict[str, str],
+    verify: str | bool | None = True,
+    fields: str = "full",
+) -> list[Org]:
+    """
+    List all organizations in the enterprise by name.
+    """
+    orgs = []
+    for page in iter_org_pages(
+        api_endpoint, enterprise_slug, headers, verify=verify, fields=fields
+    ):
+        if page is None:
             break
+        orgs.extend(page)
+    return orgs
+
+
+def list_new_orgs(
+    api_endpoint: str,
+    enterprise_slug: str,
+    headers: dict[str, str],
+    known_ids: set[str],
+    verify: str | bool | None = True,
+    fields: str = "full",
+) -> list[Org] | None:
+    """
+    List the organizations created since the known ones, newest first.
+
+    Pages through the organizations by creation time and stops at the first known
+    organization. Returns None if the listing failed.
+    """
+    orgs: list[Org] = []
+    for page in iter_org_pages(
+        api_endpoint,
+        enterprise_slug,
+        headers,
+        verify=verify,
+        fields=fields,
+        newest_first=True,
+    ):
+        if page is None:
+            return None
+        for org in page:
+            if org.id in known_ids:
+                return orgs
+            orgs.append(org)
     return orgs
 
 
-def write_orgs_to_csv(orgs: list[dict[str, Any]], filename: str):
+def read_org_catalog(
+    path: str, enterprise_slug: str, fields: str | None = None
+) -> list[Org] | None:
     """
-    Write the list of organizations to a CSV file.
+    Read the cached organizations of an enterprise from an org catalog file.
+
+    Returns None if there is no catalog, it is for a different enterprise, or (if
+    `fields` is given) it was listed with a different field set.
     """
-    with open(filename, "w") as f:
-        writer = csv.writer(f)
-        writer.writerow(
-            [
-                "id",
-                "createdAt",
-                "login",
-                "email",
-                "viewerCanAdminister",
-                "viewerIsAMember",
-                "repositories.totalCount",
-                "repositories.totalDiskUsage",
-            ]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        LOG.warning("⚠️ Ignoring unreadable org catalog {}".format(path))
+        return None
+    if catalog.get("enterprise") != enterprise_slug:
+        LOG.warning(
+            "⚠️ Org catalog {} is for enterprise '{}'; ignoring it".format(
+                path, catalog.get("enterprise")
+            )
         )
-        for org in orgs:
-            writer.writerow(
-                [
-                    org["node"]["id"],
-                    org["node"]["createdAt"],
-                    org["node"]["login"],
-                    org["node"]["email"],
-                    org["node"]["viewerCanAdminister"],
-                    org["node"]["viewerIsAMember"],
-                    org["node"]["repositories"]["totalCount"],
-                    org["node"]["repositories"]["totalDiskUsage"],
-                ]
+        return None
+    if fields is not None and catalog.get("fields", "full") != fields:
+        LOG.info(
+            "Org catalog {} has '{}' fields, not '{}'; ignoring it".format(
+                path, catalog.get("fields", "full"), fields
             )
+        )
+        return None
+    return [_catalog_org(entry) for entry in catalog["orgs"]]
+
+
+def _catalog_org(entry: list[Any] | dict[str, Any]) -> Org:
+    # Catalogs written before the records hold GraphQL edges
+    if isinstance(entry, dict):
+        return records.org_from_node(entry["node"])
+    return Org(*entry)
+
+
+def write_org_catalog(
+    path: str, enterprise_slug: str, orgs: list[Org], fields: str = "full"
+) -> None:
+    """
+    Write the organizations of an enterprise to an org catalog file, each as a list
+    of its fields.
+
+    The file is replaced atomically, so an interrupted run leaves the old catalog intact.
+    """
+    tmp_path = "{}.tmp".format(path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "enterprise": enterprise_slug,
+                "fields": fields,
+                "orgs": [list(org) for org in orgs],
+            },
+            f,
+        )
+    os.replace(tmp_path, path)
+
+
+def update_org_catalog(
+    path: str, enterprise_slug: str, org_ids: set[str], viewer_can_administer: bool
+) -> None:
+    """
+    Update the cached `viewerCanAdminister` of organizations after promoting or demoting.
+
+    Does nothing if there is no catalog for the enterprise.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return
+    if catalog.get("enterprise") != enterprise_slug:
+        return
+    orgs = [
+        (
+            org._replace(viewer_can_administer=viewer_can_administer)
+            if org.id in org_ids
+            else org
+        )
+        for org in map(_catalog_org, catalog["orgs"])
+    ]
+    write_org_catalog(path, enterprise_slug, orgs, catalog.get("fields", "full"))
+
+
+def list_orgs_incremental(
+    api_endpoint: str,
+    enterprise_slug: str,
+    headers: dict[str, str],
+    catalog_path: str,
+    verify: str | bool | None = True,
+    total_count: int | None = None,
+    fields: str = "full",
+) -> list[Org]:
+    """
+    List all organizations in the enterprise, using a cached org catalog.
+
+    Only organizations created since the catalog was written are fetched. If the
+    resulting count disagrees with the enterprise's total count (e.g. because
+    organizations were deleted), falls back to a full listing. The catalog is
+    updated either way.
+
+    The enterprise's total count is fetched unless it is provided.
+    """
+    cached = read_org_catalog(catalog_path, enterprise_slug, fields)
+    orgs: list[Org] | None = None
+    if cached is not None:
+        if total_count is None:
+            total_count = get_total_count(
+                api_endpoint, enterprise_slug, headers, verify=verify
+            )
+        new_orgs = list_new_orgs(
+            api_endpoint,
+            enterprise_slug,
+            headers,
+            {org.id for org in cached},
+            verify=verify,
+            fields=fields,
+        )
+        if new_orgs is not None and len(cached) + len(new_orgs) == total_count:
+            LOG.info("New organizations since the last run: {}".format(len(new_orgs)))
+            orgs = new_orgs + cached
+        else:
+            LOG.info(
+                "Org catalog is out of date (organizations removed?); doing a full listing"
+            )
+    if orgs is None:
+        orgs = list_orgs(
+            api_endpoint, enterprise_slug, headers, verify=verify, fields=fields
+        )
+    write_org_catalog(catalog_path, enterprise_slug, orgs, fields)
+    return orgs
+
+
+# CSV columns for each org field set, as (header, `Org` field)
+ORG_CSV_COLUMNS: dict[str, list[tuple[str, str]]] = {
+    "minimal": [
+        ("id", "id"),
+        ("login", "login"),
+        ("viewerCanAdminister", "viewer_can_administer"),
+    ],
+    "full": [
+        ("id", "id"),
+        ("createdAt", "created_at"),
+        ("login", "login"),
+        ("email", "email"),
+        ("viewerCanAdminister", "viewer_can_administer"),
+        ("viewerIsAMember", "viewer_is_a_member"),
+        ("repositories.totalCount", "repository_count"),
+        ("repositories.totalDiskUsage", "repository_disk_usage"),
+    ],
+}
+
+
+class OrgCsvWriter:
+    """
+    Writes organizations to a CSV file, with the columns of a field set, as they are
+    listed: each `write` is flushed.
+    """
+
+    def __init__(self, filename: str, fields: str = "full") -> None:
+        self.columns = ORG_CSV_COLUMNS[fields]
+        self._file = open(filename, "w")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([header for header, _ in self.columns])
+
+    def write(self, orgs: Iterable[Org]) -> None:
+        """Write organizations, and flush them to the file."""
+        for org in orgs:
+            self._writer.writerow([getattr(org, field) for _, field in self.columns])
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "OrgCsvWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def write_orgs_to_csv(orgs: list[Org], filename: str, fields: str = "full"):
+    """
+    Write the list of organizations to a CSV file, with the columns of a field set.
+    """
+    with OrgCsvWriter(filename, fields) as writer:
+        writer.write(orgs)
 
 
 def list_org_users(
@@ -176,21 +456,27 @@ def list_org_users(
     headers: dict[str, str],
     org: str,
     verify: str | bool | None = True,
-) -> list[dict[str, Any]]:
+) -> list[Member]:
     """
     List all users in an organization, using REST API with pagination.
     """
     users = []
     page = 1
     while True:
-        response = requests.get(
+        response = transport.request(
+            "GET",
             api_endpoint
             + "/orgs/{}/members?page={}".format(quote(org), quote(str(page))),
             headers=add_request_headers(headers),
             verify=verify,
         )
         response.raise_for_status()
-        users.extend(response.json())
+        users.extend(
+            map(
+                records.member_from_json,
+                fastjson.iter_fields(response.content, MEMBER_FIELDS),
+            )
+        )
         if "next" not in response.links:
             break
         page += 1
@@ -207,7 +493,8 @@ def add_org_user(
     """
     Invite a user to an organization.
     """
-    response = requests.put(
+    response = transport.request(
+        "PUT",
         api_endpoint + "/orgs/{}/memberships/{}".format(quote(org), quote(username)),
         json={"role": "member"},
         headers=add_request_headers(headers),
@@ -215,7 +502,7 @@ def add_org_user(
     )
     response.raise_for_status()
     if LOG.isEnabledFor(logging.DEBUG):
-        LOG.debug(response.json())
+        LOG.debug(fastjson.response_json(response))
 
 
 def list_org_roles(
@@ -227,10 +514,135 @@ def list_org_roles(
     """
     List all roles in an organization.
     """
-    response = requests.get(
+    response = transport.request(
+        "GET",
         api_endpoint + "/orgs/{}/organization-roles".format(quote(org)),
         headers=add_request_headers(headers),
         verify=verify,
     )
     response.raise_for_status()
-    return response.json()
+    return fastjson.response_json(response)
+
+
+def get_role_ids(
+    api_endpoint: str,
+    headers: dict[str, str],
+    org: str,
+    role_names: list[str],
+    verify: str | bool | None = True,
+    cache: metacache.MetaCache | None = None,
+) -> dict[str, Any]:
+    """
+    Get the IDs of organization roles by name, from the metadata cache if given.
+
+    The roles are listed once if any is not cached. Roles the organization does not
+    have are left out.
+    """
+    role_ids: dict[str, Any] = {}
+    if cache is not None:
+        for role_name in role_names:
+            cached = cache.get(
+                metacache.key("role_id", api_endpoint, org.lower(), role_name)
+            )
+            if cached is not None:
+                role_ids[role_name] = cached
+    if all(role_name in role_ids for role_name in role_names):
+        return role_ids
+    org_roles = list_org_roles(api_endpoint, headers, org, verify=verify)
+    if "roles" not in org_roles:
+        LOG.error("⨯ Malformed response from GitHub API")
+        return role_ids
+    for role in org_roles["roles"]:
+        if role["name"] in role_names and role["name"] not in role_ids:
+            role_ids[role["name"]] = role["id"]
+            if cache is not None:
+                cache.set(
+                    metacache.key("role_id", api_endpoint, org.lower(), role["name"]),
+                    role["id"],
+                )
+    return role_ids
+
+
+def get_role_id(
+    api_endpoint: str,
+    headers: dict[str, str],
+    org: str,
+    role_name: str,
+    verify: str | bool | None = True,
+    cache: metacache.MetaCache | None = None,
+) -> Any | None:
+    """
+    Get the ID of an organization role by name, from the metadata cache if given.
+
+    Returns None if the organization has no such role.
+    """
+    return get_role_ids(
+        api_endpoint, headers, org, [role_name], verify=verify, cache=cache
+    ).get(role_name)
+
+
+def invalidate_role_id(
+    cache: metacache.MetaCache | None, api_endpoint: str, org: str, role_name: str
+) -> None:
+    """
+    Drop an organization role ID from the metadata cache, after it was rejected.
+    """
+    if cache is not None:
+        cache.invalidate(metacache.key("role_id", api_endpoint, org.lower(), role_name))
+
+
+def remember_org_logins(
+    cache: metacache.MetaCache | None, api_endpoint: str, orgs: Iterable[Org]
+) -> None:
+    """
+    Record organization node IDs and logins, both ways, in the metadata cache.
+    """
+    if cache is None:
+        return
+    for org in orgs:
+        if org.id and org.login:
+            cache.set(metacache.key("org_login", api_endpoint, org.id), org.login)
+            cache.set(metacache.key("org_id", api_endpoint, org.login.lower()), org.id)
+
+
+def get_org_logins(
+    api_endpoint: str,
+    headers: dict[str, str],
+    org_ids: list[str],
+    verify: str | bool | None = True,
+    cache: metacache.MetaCache | None = None,
+) -> dict[str, str]:
+    """
+    Get the logins of organizations by node ID: from the metadata cache if given,
+    then in batches of 100 with GraphQL `nodes` for the rest. IDs that no longer
+    exist are left out.
+    """
+    logins: dict[str, str] = {}
+    if cache is not None:
+        for org_id in org_ids:
+            login = cache.get(metacache.key("org_login", api_endpoint, org_id))
+            if login is not None:
+                logins[org_id] = login
+    missing = [org_id for org_id in org_ids if org_id not in logins]
+    for i in range(0, len(missing), MAX_PAGE_SIZE):
+        response = transport.request(
+            "POST",
+            api_endpoint,
+            json={
+                "query": "query($ids: [ID!]!) { nodes(ids: $ids) { ... on Organization { id login } } }",
+                "variables": {"ids": missing[i : i + MAX_PAGE_SIZE]},
+            },
+            headers=add_request_headers(headers),
+            verify=verify,
+            idempotent=True,
+        )
+        response.raise_for_status()
+        data = fastjson.response_json(response).get("data") or {}
+        found = [
+            Org(node["id"], node["login"])
+            for node in data.get("nodes") or []
+            if node and node.get("login")
+        ]
+        remember_org_logins(cache, api_endpoint, found)
+        logins.update((org.id, org.login) for org in found)
+    return logins
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+"""
+Live progress of a run: organizations per second, requests per second, remaining
+rate limit budget, work in flight and an ETA.
+
+A background ticker renders it, so the loop doing the work only counts organizations
+as they start and finish. On an interactive terminal it is one line redrawn in place;
+otherwise (CI logs, files) it is a `key=value` log line every `interval` seconds.
+"""
+
+import sys
+import threading
+import time
+from typing import Any, TextIO
+from . import transport as transport_module
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Seconds between updates on a terminal, and in logs
+TTY_INTERVAL = 1.0
+LOG_INTERVAL = 30.0
+
+
+def format_duration(seconds: float | None) -> str:
+    """Format a duration as e.g. 1h02m, 4m05s or 12s."""
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return "{}h{:02d}m".format(seconds // 3600, seconds % 3600 // 60)
+    if seconds >= 60:
+        return "{}m{:02d}s".format(seconds // 60, seconds % 60)
+    return "{}s".format(seconds)
+
+
+class Progress:
+    """
+    Tracks the organizations of a run and reports progress from a background thread.
+
+    Use as a context manager around the work, calling `started()` and `finished()`
+    for each organization (from any thread).
+    """
+
+    def __init__(
+        self,
+        total: int,
+        label: str = "orgs",
+        transport: transport_module.Transport | None = None,
+        interval: float | None = None,
+        stream: TextIO | None = None,
+    ) -> None:
+        self.total = total
+        self.label = label
+        self.transport = transport or transport_module.get_transport()
+        self.stream = stream or sys.stderr
+        self.tty = self.stream.isatty()
+        self.interval = interval or (TTY_INTERVAL if self.tty else LOG_INTERVAL)
+        self.done = 0
+        self.active = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start = time.monotonic()
+        self._last = (self._start, self.transport.stats["requests"])
+
+    def started(self, n: int = 1) -> None:
+        """Count organizations whose work has started."""
+        with self._lock:
+            self.active += n
+
+    def finished(self, n: int = 1) -> None:
+        """Count organizations whose work has finished."""
+        with self._lock:
+            self.active -= n
+            self.done += n
+
+    def snapshot(self) -> dict[str, Any]:
+        """The current progress figures."""
+        now = time.monotonic()
+        requests_total = self.transport.stats["requests"]
+        last_time, last_requests = self._last
+        self._last = (now, requests_total)
+        elapsed = now - self._start
+        with self._lock:
+            done, active = self.done, self.active
+        rate = done / elapsed if elapsed > 0 else 0.0
+        return {
+            "done": done,
+            "total": self.total,
+            "per_s": rate,
+            "req_per_s": (
+                (requests_total - last_requests) / (now - last_time)
+                if now > last_time
+                else 0.0
+            ),
+            "rate_limits": {
+                resource: budget["remaining"]
+                for resource, budget in sorted(self.transport.rate_limits.items())
+            },
+            "active": active,
+            "requests_in_flight": self.transport.in_flight,
+            "elapsed": elapsed,
+            "eta": (self.total - done) / rate if rate > 0 else None,
+        }
+
+    def render(self, snapshot: dict[str, Any]) -> str:
+        """Format a snapshot as one line for a terminal."""
+        line = "{} {}/{} ({:.1f}/s) | {:.1f} req/s".format(
+            self.label,
+            snapshot["done"],
+            snapshot["total"],
+            snapshot["per_s"],
+            snapshot["req_per_s"],
+        )
+        if snapshot["rate_limits"]:
+            line += " | rate limit " + ", ".join(
+                "{} {}".format(resource, remaining)
+                for resource, remaining in snapshot["rate_limits"].items()
+            )
+        return line + " | in flight {} {}, {} req | ETA {}".format(
+            snapshot["active"],
+            self.label,
+            snapshot["requests_in_flight"],
+            format_duration(snapshot["eta"]),
+        )
+
+    def structured(self, snapshot: dict[str, Any]) -> str:
+        """Format a snapshot as `key=value` pairs for logs."""
+        fields = [
+            ("done", snapshot["done"]),
+            ("total", snapshot["total"]),
+            ("{}_per_s".format(self.label), "{:.2f}".format(snapshot["per_s"])),
+            ("req_per_s", "{:.1f}".format(snapshot["req_per_s"])),
+        ]
+        fields.extend(
+            ("rate_limit_{}".format(resource), remaining)
+            for resource, remaining in snapshot["rate_limits"].items()
+        )
+        fields.extend(
+            [
+                ("in_flight", snapshot["active"]),
+                ("requests_in_flight", snapshot["requests_in_flight"]),
+                ("elapsed_s", int(snapshot["elapsed"])),
+                (
+                    "eta_s",
+                    int(snapshot["eta"]) if snapshot["eta"] is not None else "unknown",
+                ),
+            ]
+        )
+        return "progress " + " ".join("{}={}".format(k, v) for k, v in fields)
+
+    def report(self) -> None:
+        """Show the current progress once."""
+        snapshot = self.snapshot()
+        if self.tty:
+            self.stream.write("\r\033[K" + self.render(snapshot))
+            self.stream.flush()
+        else:
+            LOG.info(self.structured(snapshot))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def start(self) -> "Progress":
+        """Start reporting in the background."""
+        self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop reporting, after showing the final progress."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.report()
+        if self.tty:
+            self.stream.write("\n")
+            self.stream.flush()
+
+    def __enter__(self) -> "Progress":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+class NoProgress:
+    """Stands in for `Progress` when progress reporting is off."""
+
+    def started(self, n: int = 1) -> None:
+        pass
+
+    def finished(self, n: int = 1) -> None:
+        pass
+
+    def __enter__(self) -> "NoProgress":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+
+def tracker(enabled: bool, total: int, label: str = "orgs") -> Progress | NoProgress:
+    """A progress reporter for `total` items, or one that does nothing if disabled."""
+    return Progress(total, label=label) if enabled else NoProgress()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+"""
+Compact records of what the API listings return, built directly by the parsers in
+`organizations` and `teams` instead of keeping GitHub's nested JSON.
+
+They are named tuples: no per-object dict, fields by attribute (`org.login`), and
+`_asdict()`/`_replace()` where a dict or a changed copy is needed. Fields not in
+the listing's field set are None.
+"""
+
+from typing import Any, NamedTuple
+
+
+class Org(NamedTuple):
+    """An organization of the enterprise, from the GraphQL listing."""
+
+    id: str
+    login: str
+    viewer_can_administer: bool | None = None
+    created_at: str | None = None
+    email: str | None = None
+    viewer_is_a_member: bool | None = None
+    repository_count: int | None = None
+    repository_disk_usage: int | None = None
+
+
+class Team(NamedTuple):
+    """A team of an organization, from the REST listing."""
+
+    name: str
+    slug: str
+    id: int | None = None
+
+
+class Member(NamedTuple):
+    """A member of an organization or team, from the REST listing."""
+
+    login: str
+    id: int | None = None
+
+
+def org_from_node(node: dict[str, Any]) -> Org:
+    """An organization from a GraphQL `Organization` node."""
+    repositories = node.get("repositories") or {}
+    return Org(
+        node["id"],
+        node["login"],
+        node.get("viewerCanAdminister"),
+        node.get("createdAt"),
+        node.get("email"),
+        node.get("viewerIsAMember"),
+        repositories.get("totalCount"),
+        repositories.get("totalDiskUsage"),
+    )
+
+
+def org_from_row(row: dict[str, str]) -> Org:
+    """An organization from a row of an org list CSV (see `write_orgs_to_csv`)."""
+
+    def flag(value: str | None) -> bool | None:
+        return None if value in (None, "") else value == "True"
+
+    def number(value: str | None) -> int | None:
+        return None if value in (None, "") else int(value)
+
+    return Org(
+        row["id"],
+        row["login"],
+        flag(row.get("viewerCanAdminister")),
+        row.get("createdAt") or None,
+        row.get("email") or None,
+        flag(row.get("viewerIsAMember")),
+        number(row.get("repositories.totalCount")),
+        number(row.get("repositories.totalDiskUsage")),
+    )
+
+
+def team_from_json(team: dict[str, Any]) -> Team:
+    """A team from a REST team object."""
+    return Team(team["name"], team.get("slug") or team["name"], team.get("id"))
+
+
+def member_from_json(member: dict[str, Any]) -> Member:
+    """A member from a REST user object."""
+    return Member(member["login"], member.get("id"))
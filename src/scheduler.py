@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+"""
+Longest-processing-time-first (LPT) scheduling of organizations over parallel workers.
+
+Each organization gets a cost estimate in "units" (roughly, API calls) from the
+sizes that are cheap to know up front: its repository count from the org CSV and,
+if an inventory is available, its member and team counts. The largest organizations
+are dispatched first, so a few big ones do not hold up the end of the run.
+
+After the run, the units are calibrated to seconds (total actual time over total
+estimated units), so each organization's estimated and actual times can be compared.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from math import ceil
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator
+from . import transport
+
+# Calls made for every organization (roles, teams, role check, team members)
+BASE_UNITS = 4
+# Items per page of REST listings
+PAGE_SIZE = 30
+# Repositories per unit: large orgs are slower to answer even for small listings
+REPOS_PER_UNIT = 500
+
+# Limits the items in progress at a time across all `run_parallel` calls, if set
+_SHARED_SLOTS: threading.BoundedSemaphore | None = None
+
+
+def _as_int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def estimate_org_cost(
+    org: dict[str, Any], counts: dict[str, int] | None = None
+) -> float:
+    """
+    Estimate the cost of reconciling an organization (a row of the org CSV).
+
+    `counts` may give the org's known `members`, `teams` and `repos` counts (see
+    `inventory.org_sizes`); the repository count is taken from the CSV when it has one.
+    """
+    counts = counts or {}
+    repos = _as_int(org.get("repositories.totalCount")) or _as_int(counts.get("repos"))
+    return (
+        BASE_UNITS
+        + ceil(_as_int(counts.get("members")) / PAGE_SIZE)
+        + ceil(_as_int(counts.get("teams")) / PAGE_SIZE)
+        + repos / REPOS_PER_UNIT
+    )
+
+
+def lpt_order(items: Iterable[Any], cost: Callable[[Any], float]) -> list[Any]:
+    """
+    Order items largest estimated cost first.
+    """
+    return sorted(items, key=cost, reverse=True)
+
+
+def share_workers(limit: int | None) -> None:
+    """
+    Limit the items in progress at a time across all `run_parallel` calls in the
+    process, such as those of several enterprises run side by side, to `limit`
+    (None or 0 for no limit). Each call still runs up to its own `workers` at a time.
+
+    Items must not wait for other items run with `run_parallel`, or they may wait
+    for a slot that is never freed.
+    """
+    global _SHARED_SLOTS
+    _SHARED_SLOTS = threading.BoundedSemaphore(limit) if limit else None
+
+
+@contextmanager
+def shared_slot() -> Iterator[None]:
+    """
+    Hold one of the slots of `share_workers`, if it sets a limit, for one item of work
+    run outside `run_parallel`, or by a `run_parallel(..., shared=False)` worker.
+    """
+    slots = _SHARED_SLOTS
+    if slots is None:
+        yield
+        return
+    with slots:
+        yield
+
+
+def run_parallel(
+    items: Iterable[Any],
+    work: Callable[[Any], Any],
+    workers: int = 1,
+    shared: bool = True,
+) -> None:
+    """
+    Run `work` on each item, in order of dispatch, on up to `workers` threads, and
+    within the limit of `share_workers`, if any, unless `shared` is False: for
+    long-lived workers that hold a `shared_slot` for each item they take on instead.
+    """
+    slots = _SHARED_SLOTS if shared else None
+    if slots is not None:
+        unlimited = work
+
+        def work(item: Any) -> Any:
+            with slots:
+                return unlimited(item)
+
+    if workers <= 1:
+        for item in items:
+            work(item)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [transport.submit(pool, work, item) for item in items]
+        for future in futures:
+            future.result()
+
+
+class Timings:
+    """
+    Collects the estimated units and actual seconds of each organization in a run.
+    """
+
+    def __init__(self) -> None:
+        self.start = time.monotonic()
+        self.entries: list[tuple[str, float, float]] = []
+
+    def record(self, name: str, units: float, seconds: float) -> None:
+        """Record one organization's estimate and actual time."""
+        self.entries.append((name, units, seconds))
+
+    def report(self) -> dict[str, Any]:
+        """
+        The run's makespan, and each organization's estimated vs actual seconds.
+        """
+        total_units = sum(units for _, units, _ in self.entries)
+        total_seconds = sum(seconds for _, _, seconds in self.entries)
+        seconds_per_unit = total_seconds / total_units if total_units else 0.0
+        return {
+            "makespan": round(time.monotonic() - self.start, 3),
+            "seconds_per_unit": round(seconds_per_unit, 4),
+            "orgs": [
+                [name, round(units * seconds_per_unit, 3), round(seconds, 3)]
+                for name, units, seconds in self.entries
+            ],
+        }
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+"""
+Deterministic sharding of organizations across several runners.
+
+Each organization is assigned to exactly one shard by a stable hash of its login
+(or node ID), so independent runners given `--shard 1/N` ... `--shard N/N` cover
+the whole enterprise without any coordination.
+"""
+
+from hashlib import sha256
+from typing import Callable, Iterable, TypeVar
+
+T = TypeVar("T")
+
+SHARD_KEYS = ("login", "id")
+
+
+def parse_shard(spec: str | None) -> tuple[int, int] | None:
+    """
+    Parse a `K/N` shard specification (1-based K) into a (K, N) tuple.
+
+    Raises ValueError if the specification is malformed.
+    """
+    if spec is None or spec.strip() == "":
+        return None
+    try:
+        k_text, n_text = spec.split("/", 1)
+        k, n = int(k_text), int(n_text)
+    except ValueError:
+        raise ValueError("Invalid shard '{}' - expected K/N, e.g. 1/4".format(spec))
+    if n < 1 or k < 1 or k > n:
+        raise ValueError("Invalid shard '{}' - K must be between 1 and N".format(spec))
+    return k, n
+
+
+def shard_of(key: str, shard_count: int) -> int:
+    """
+    Return the 1-based shard that a key belongs to.
+
+    Uses SHA-256 rather than `hash()` so the result is the same on every machine
+    and Python process. Keys are case-folded, as GitHub logins are case-insensitive.
+    """
+    digest = sha256(key.strip().lower().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count + 1
+
+
+def filter_shard(
+    items: Iterable[T],
+    shard: tuple[int, int] | None,
+    key: Callable[[T], str],
+) -> list[T]:
+    """
+    Keep only the items that belong to the given shard.
+
+    If no shard is given, all items are returned.
+    """
+    if shard is None:
+        return list(items)
+    k, n = shard
+    return [item for item in items if shard_of(key(item), n) == k]
+
+
+def format_shard(shard: tuple[int, int] | None) -> str | None:
+    """Format a (K, N) tuple back into its `K/N` form."""
+    if shard is None:
+        return None
+    return "{}/{}".format(*shard)
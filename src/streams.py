@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+"""
+Streaming outputs: the scripts' results written record by record, as they happen,
+so a crash loses nothing already done and other jobs can follow a run in progress.
+
+- JSON Lines (the default): one JSON object per line, flushed after each record,
+  so `tail -f` and the like see every record at once
+- Arrow IPC stream (a path ending in `.arrow`, needs `pyarrow`): columnar, several
+  times smaller than JSON Lines and fast to load into pandas, Polars or DuckDB, for
+  large inventories. Records are written in flushed batches of `ARROW_BATCH_SIZE`;
+  readers see every complete batch, even of a run that crashed.
+
+Each kind of record has a fixed list of fields and types (`ORG_FIELDS`, ...), so
+the columns are the same whatever the first records happen to hold.
+"""
+
+from datetime import datetime, timezone
+import json
+import threading
+from typing import Any
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Records per batch of an Arrow stream
+ARROW_BATCH_SIZE = 1000
+
+# The fields of each kind of record, with their types
+ORG_FIELDS = (
+    ("id", "string"),
+    ("login", "string"),
+    ("viewer_can_administer", "bool"),
+    ("created_at", "string"),
+    ("email", "string"),
+    ("viewer_is_a_member", "bool"),
+    ("repository_count", "int64"),
+    ("repository_disk_usage", "int64"),
+)
+ROLE_CHANGE_FIELDS = (
+    ("time", "string"),
+    ("id", "string"),
+    ("login", "string"),
+    ("role", "string"),
+    ("ok", "bool"),
+    ("error", "string"),
+)
+OUTCOME_FIELDS = (
+    ("time", "string"),
+    ("org", "string"),
+    ("status", "string"),
+    ("reason", "string"),
+    ("seconds", "float64"),
+    ("added", "list<string>"),
+    ("removed", "list<string>"),
+)
+
+
+def now() -> str:
+    """The current UTC time, for the `time` field of records."""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def role_change(
+    org_id: str, login: str | None, role: str, result: dict[str, Any]
+) -> dict[str, Any]:
+    """The record of a change of the enterprise admin's role, from its GraphQL result."""
+    errors = result.get("errors")
+    return {
+        "id": org_id,
+        "login": login,
+        "role": role,
+        "ok": not errors,
+        "error": (
+            "; ".join(error.get("message", "") for error in errors) if errors else None
+        ),
+    }
+
+
+class RecordStream:
+    """
+    A stream of records of one kind. This base class discards them, as the stream
+    for an output that was not asked for; `open_stream` gives the writing ones.
+    """
+
+    def __init__(self, fields: tuple[tuple[str, str], ...]) -> None:
+        self.fields = fields
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def write(self, record: dict[str, Any]) -> None:
+        """Write a record; fields it lacks are null, and `time` is now if unset."""
+        row = {name: record.get(name) for name, _ in self.fields}
+        if "time" in row and row["time"] is None:
+            row["time"] = now()
+        with self._lock:
+            self._write(row)
+            self.count += 1
+
+    def _write(self, row: dict[str, Any]) -> None:
+        pass
+
+    def close(self) -> None:
+        """Write out what is buffered, and close the file."""
+
+    def __enter__(self) -> "RecordStream":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class JsonLinesStream(RecordStream):
+    """Writes records as JSON Lines, flushing each one."""
+
+    def __init__(self, path: str, fields: tuple[tuple[str, str], ...]) -> None:
+        super().__init__(fields)
+        self._file = open(path, "w", encoding="utf-8")
+
+    def _write(self, row: dict[str, Any]) -> None:
+        self._file.write(json.dumps(row) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class ArrowStream(RecordStream):
+    """Writes records as an Arrow IPC stream, in flushed batches."""
+
+    def __init__(
+        self,
+        path: str,
+        fields: tuple[tuple[str, str], ...],
+        batch_size: int = ARROW_BATCH_SIZE,
+    ) -> None:
+        super().__init__(fields)
+        try:
+            import pyarrow
+        except ImportError:
+            raise ValueError(
+                "Writing {} needs pyarrow (pip install pyarrow)".format(path)
+            )
+        self._pyarrow = pyarrow
+        types = {
+            "string": pyarrow.string(),
+            "bool": pyarrow.bool_(),
+            "int64": pyarrow.int64(),
+            "float64": pyarrow.float64(),
+            "list<string>": pyarrow.list_(pyarrow.string()),
+        }
+        self._schema = pyarrow.schema(
+            [(name, types[type_name]) for name, type_name in fields]
+        )
+        self._file = pyarrow.OSFile(path, "wb")
+        self._writer = pyarrow.ipc.new_stream(self._file, self._schema)
+        self._batch: list[dict[str, Any]] = []
+        self.batch_size = batch_size
+
+    def _write(self, row: dict[str, Any]) -> None:
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._batch:
+            self._writer.write_batch(
+                self._pyarrow.RecordBatch.from_pylist(self._batch, schema=self._schema)
+            )
+            self._file.flush()
+            self._batch = []
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            self._writer.close()
+            self._file.close()
+
+
+def open_stream(path: str | None, fields: tuple[tuple[str, str], ...]) -> RecordStream:
+    """
+    Open a stream of records: an Arrow stream if the path ends in `.arrow`, JSON Lines
+    otherwise, or one that discards them if there is no path.
+
+    Raises OSError if the file cannot be created, or ValueError if pyarrow is needed
+    and missing.
+    """
+    if not path:
+        return RecordStream(fields)
+    if path.endswith(".arrow"):
+        return ArrowStream(path, fields)
+    return JsonLinesStream(path, fields)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+"""
+Run summaries: building, logging, saving and merging them.
+
+A summary is a plain dict so it can be written as JSON by one runner and merged
+by another:
+
+- script: name of the script that produced it
+- shard: `K/N` string, or None for an unsharded run
+- total: number of organizations in scope
+- successful: organizations that completed without issues
+- failed: list of [organization, reason] pairs
+- unmanaged: organization IDs that were promoted on (promote only)
+- deferred: optional list of organizations not started before the deadline
+- timings: optional makespan, seconds per estimated cost unit, and a list of
+  [organization, estimated seconds, actual seconds] (see `scheduler.Timings`)
+- requests: optional API requests `sent`, and those saved by coalescing
+  (`coalesced`, `memo_hits`; see `transport.request_counts`)
+"""
+
+import json
+import logging
+from typing import Any
+
+LOG = logging.getLogger(__name__)
+
+# Slowest organizations listed when logging a summary with timings
+TIMINGS_SHOWN = 5
+
+
+def make_summary(
+    script: str,
+    shard: str | None = None,
+    total: int = 0,
+    successful: list[str] | None = None,
+    failed: list[tuple[str, str]] | None = None,
+    unmanaged: list[str] | None = None,
+    timings: dict[str, Any] | None = None,
+    deferred: list[str] | None = None,
+    requests: dict[str, int] | None = None,
+) -> dict[str, Any]:
+    """
+    Create a summary of a run.
+    """
+    result = {
+        "script": script,
+        "shard": shard,
+        "total": total,
+        "successful": list(successful or []),
+        "failed": [[name, reason] for name, reason in (failed or [])],
+        "unmanaged": list(unmanaged or []),
+    }
+    if timings is not None:
+        result["timings"] = timings
+    if deferred is not None:
+        result["deferred"] = list(deferred)
+    if requests is not None:
+        result["requests"] = dict(requests)
+    return result
+
+
+def log_summary(summary: dict[str, Any]) -> None:
+    """
+    Log a summary of a run.
+    """
+    LOG.info("===== Summary =====")
+    if summary.get("shards"):
+        LOG.info("Shards merged: {}".format(", ".join(summary["shards"])))
+    elif summary.get("shard"):
+        LOG.info("Shard: {}".format(summary["shard"]))
+    LOG.info("Organizations processed: {}".format(summary["total"]))
+    LOG.info("Successful: {}".format(len(summary["successful"])))
+    LOG.info("With issues: {}".format(len(summary["failed"])))
+    for name, reason in summary["failed"]:
+        LOG.info("  - {}: {}".format(name, reason))
+    if summary["unmanaged"]:
+        LOG.info("Promoted on organizations: {}".format(len(summary["unmanaged"])))
+    if summary.get("deferred"):
+        LOG.info("Not started before the deadline: {}".format(len(summary["deferred"])))
+    if summary.get("requests"):
+        counts = summary["requests"]
+        LOG.info(
+            "API requests: {} sent, {} saved ({} coalesced, {} memoized)".format(
+                counts["sent"],
+                counts["coalesced"] + counts["memo_hits"],
+                counts["coalesced"],
+                counts["memo_hits"],
+            )
+        )
+    if summary.get("timings"):
+        LOG.info("Makespan: {:.1f}s".format(summary["timings"]["makespan"]))
+        LOG.info("Slowest organizations:")
+        slowest = sorted(summary["timings"]["orgs"], key=lambda t: t[2], reverse=True)
+        for name, estimated, actual in slowest[:TIMINGS_SHOWN]:
+            LOG.info(
+                "  - {}: {:.1f}s (estimated {:.1f}s)".format(name, actual, estimated)
+            )
+
+
+def write_summary(path: str, summary: dict[str, Any]) -> None:
+    """
+    Write a summary to a JSON file.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+        f.write("\n")
+
+
+def read_summary(path: str) -> dict[str, Any]:
+    """
+    Read a summary from a JSON file.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def merge_summaries(summaries: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Merge per-shard summaries into one summary.
+
+    Raises ValueError if the summaries come from different scripts or disagree on
+    the shard count. Missing or duplicated shards are logged as warnings.
+    """
+    scripts = {s["script"] for s in summaries}
+    if len(scripts) > 1:
+        raise ValueError(
+            "Cannot merge summaries from different scripts: {}".format(
+                ", ".join(sorted(scripts))
+            )
+        )
+
+    shards = [s["shard"] for s in summaries if s.get("shard")]
+    shard_counts = {int(shard.split("/")[1]) for shard in shards}
+    if len(shard_counts) > 1:
+        raise ValueError("Cannot merge summaries with different shard counts")
+    if shard_counts:
+        shard_count = shard_counts.pop()
+        seen = [int(shard.split("/")[0]) for shard in shards]
+        missing = sorted(set(range(1, shard_count + 1)) - set(seen))
+        duplicated = sorted({k for k in seen if seen.count(k) > 1})
+        if missing:
+            LOG.warning(
+                "⚠️ Missing shards: {}".format(
+                    ", ".join("{}/{}".format(k, shard_count) for k in missing)
+                )
+            )
+        if duplicated:
+            LOG.warning(
+                "⚠️ Duplicated shards: {}".format(
+                    ", ".join("{}/{}".format(k, shard_count) for k in duplicated)
+                )
+            )
+
+    merged = make_summary(scripts.pop() if scripts else "unknown")
+    merged["shards"] = sorted(shards, key=lambda shard: int(shard.split("/")[0]))
+    for s in summaries:
+        merged["total"] += s["total"]
+        merged["successful"].extend(s["successful"])
+        merged["failed"].extend(s["failed"])
+        merged["unmanaged"].extend(s["unmanaged"])
+        if s.get("deferred"):
+            merged.setdefault("deferred", []).extend(s["deferred"])
+        if s.get("timings"):
+            timings = merged.setdefault("timings", {"makespan": 0.0, "orgs": []})
+            # Shards run side by side, so the merged makespan is the longest one
+            timings["makespan"] = max(timings["makespan"], s["timings"]["makespan"])
+            timings["orgs"].extend(s["timings"]["orgs"])
+        if s.get("requests"):
+            counts = merged.setdefault("requests", {})
+            for name, count in s["requests"].items():
+                counts[name] = counts.get(name, 0) + count
+    return merged
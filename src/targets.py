@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+"""
+Config of several enterprises (targets) to run the scripts against side by side, in
+one process, with `multi-enterprise.py`.
+
+A config is a JSON file (or TOML, with Python 3.11+) with a list of targets. Each
+target has a name, its token, optionally its GitHub URL and CA bundle (for GHES or
+data residency), and the steps to run: the `promote`, `manage` and `demote`
+subcommands of the `enterprise-security-team` command, with their arguments:
+
+    {
+      "steps": [
+        ["promote", "{enterprise}"],
+        ["manage", "--sec-team-name", "security-managers", "--workers", "8"],
+        ["demote", "{enterprise}"]
+      ],
+      "targets": [
+        {"name": "cloud", "enterprise": "acme", "token_file": "cloud.token"},
+        {"name": "emea", "enterprise": "acme-emea", "token_file": "emea.token",
+         "github_url": "https://github.emea.example.com",
+         "ca_bundle": "emea-ca.pem"}
+      ]
+    }
+
+- `steps`: at the top level, the steps of the targets that do not give their own.
+  `{name}` and `{enterprise}` in their arguments are replaced with the target's.
+- `token_file`, `ca_bundle` and `directory` are relative to the config. Every target
+  names its `token_file`, which must exist and hold a token, so no token is used
+  against the wrong instance by default (the scripts fall back to `GITHUB_TOKEN`).
+- `directory` (default: the target's name) holds the target's files that the steps
+  do not name, e.g. `all_orgs.csv` (see `TARGET_FILES`), so targets do not overwrite
+  each other's, and each target's steps find what its earlier steps wrote.
+
+`compile_targets` validates a config into a list of plain dicts with `name`,
+`enterprise`, `github_url`, `ca_bundle`, `token_file`, `directory` and `steps`, each
+step with its arguments complete.
+"""
+
+import os
+from typing import Any
+from . import teamconfig
+
+# The subcommands that can be steps
+COMMANDS = ("promote", "manage", "demote")
+
+# Per subcommand, the options for files that default to the working directory, with
+# their file names; a target's steps that do not give them use its directory
+TARGET_FILES = {
+    "promote": {
+        "--orgs-csv": "all_orgs.csv",
+        "--unmanaged-orgs": "unmanaged_orgs.txt",
+        "--summary-file": "promote-summary.json",
+    },
+    "manage": {
+        "--org-list": "all_orgs.csv",
+        "--checkpoint": "remaining_orgs.csv",
+        "--summary-file": "manage-summary.json",
+    },
+    "demote": {
+        "--unmanaged-orgs": "unmanaged_orgs.txt",
+        "--checkpoint": "remaining_unmanaged_orgs.txt",
+    },
+}
+
+
+def has_option(args: list[str], option: str) -> bool:
+    """Whether command line arguments give an option, as `--x value` or `--x=value`."""
+    return any(arg == option or arg.startswith(option + "=") for arg in args)
+
+
+def option_value(args: list[str], option: str) -> str | None:
+    """The value of an option in command line arguments, if given."""
+    for i, arg in enumerate(args):
+        if arg == option and i + 1 < len(args):
+            return args[i + 1]
+        if arg.startswith(option + "="):
+            return arg[len(option) + 1 :]
+    return None
+
+
+def has_token(path: str) -> bool:
+    """Whether a token file exists and is not empty."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return bool(f.read().strip())
+    except OSError:
+        return False
+
+
+def compile_step(step: Any, target: dict[str, Any]) -> list[str]:
+    """
+    Validate a step, and complete its arguments for a target: its placeholders, URL,
+    CA bundle, token and files.
+
+    Raises ValueError if the step is invalid.
+    """
+    if (
+        not isinstance(step, list)
+        or not step
+        or not all(isinstance(arg, str) for arg in step)
+    ):
+        raise ValueError(
+            "Target '{}': every step must be a list of a subcommand and its arguments".format(
+                target["name"]
+            )
+        )
+    command = step[0]
+    if command not in COMMANDS:
+        raise ValueError(
+            "Target '{}': unknown step '{}' (use {})".format(
+                target["name"], command, ", ".join(COMMANDS)
+            )
+        )
+    if not target["enterprise"] and any("{enterprise}" in arg for arg in step):
+        raise ValueError(
+            "Target '{}' needs an 'enterprise' for its steps".format(target["name"])
+        )
+    args = [
+        arg.replace("{name}", target["name"]).replace(
+            "{enterprise}", target["enterprise"] or ""
+        )
+        for arg in step[1:]
+    ]
+    if has_option(args, "--daemon"):
+        raise ValueError(
+            "Target '{}': --daemon cannot be run with other targets".format(
+                target["name"]
+            )
+        )
+    for option in ("--github-url", "--ca-bundle", "--token-file"):
+        if has_option(args, option):
+            raise ValueError(
+                "Target '{}': give {} in the target, not in its steps".format(
+                    target["name"], option
+                )
+            )
+    if target["github_url"]:
+        args += ["--github-url", target["github_url"]]
+    if target["ca_bundle"]:
+        args += ["--ca-bundle", target["ca_bundle"]]
+    args += ["--token-file", target["token_file"]]
+    for option, filename in TARGET_FILES[command].items():
+        if not has_option(args, option):
+            args += [option, os.path.join(target["directory"], filename)]
+    return [command] + args
+
+
+def compile_targets(
+    config: dict[str, Any], base_dir: str = "."
+) -> list[dict[str, Any]]:
+    """
+    Validate a config into a list of targets.
+
+    Raises ValueError if the config is invalid.
+    """
+    targets = config.get("targets") if isinstance(config, dict) else None
+    if not isinstance(targets, list) or not targets:
+        raise ValueError("The config must have a non-empty list of 'targets'")
+    compiled = []
+    for target in targets:
+        if not isinstance(target, dict) or not isinstance(target.get("name"), str):
+            raise ValueError("Every target in the config needs a 'name'")
+        name = target["name"]
+        if not isinstance(target.get("token_file"), str):
+            raise ValueError("Target '{}' needs a 'token_file'".format(name))
+        steps = target.get("steps", config.get("steps"))
+        if not isinstance(steps, list) or not steps:
+            raise ValueError(
+                "Target '{}' needs a non-empty list of 'steps' (or the config does)".format(
+                    name
+                )
+            )
+        token_file = os.path.join(base_dir, target["token_file"])
+        if not has_token(token_file):
+            raise ValueError(
+                "Target '{}': no token in its token_file {}".format(name, token_file)
+            )
+        ca_bundle = target.get("ca_bundle")
+        compiled_target = {
+            "name": name,
+            "enterprise": target.get("enterprise"),
+            "github_url": target.get("github_url"),
+            "ca_bundle": os.path.join(base_dir, ca_bundle) if ca_bundle else None,
+            "token_file": token_file,
+            "directory": os.path.join(base_dir, target.get("directory", name)),
+        }
+        compiled_target["steps"] = [
+            compile_step(step, compiled_target) for step in steps
+        ]
+        compiled.append(compiled_target)
+    for field in ("name", "directory"):
+        values = [os.path.normpath(target[field]) for target in compiled]
+        duplicated = sorted({value for value in values if values.count(value) > 1})
+        if duplicated:
+            raise ValueError(
+                "Targets must not share a {}: {}".format(field, ", ".join(duplicated))
+            )
+    return compiled
+
+
+def load_targets(path: str) -> list[dict[str, Any]]:
+    """Read and compile a targets config; its files are relative to it."""
+    return compile_targets(
+        teamconfig.read_config(path), os.path.dirname(os.path.abspath(path))
+    )
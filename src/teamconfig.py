@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+"""
+Declarative config of the role teams to keep in each organization.
+
+A config is a JSON file (or TOML, with Python 3.11+) with a list of teams. Each team
+has a name, the organization role it is given (`security_manager`, or any custom role
+from `organizations.list_org_roles`), optionally its members, and the organizations
+it applies to:
+
+    {
+      "teams": [
+        {"name": "security-managers", "role": "security_manager",
+         "members": ["alice", "bob"]},
+        {"name": "emea-auditors", "role": "all_repo_read",
+         "members_file": "emea.txt", "orgs": ["emea-*"], "exclude": ["emea-sandbox"]}
+      ]
+    }
+
+- `members` or `members_file` (one login per line, relative to the config): the team's
+  members. Without either (or with an empty list), the team's membership is left
+  alone, e.g. when it is managed by Team Sync.
+- `orgs` and `exclude`: shell-style patterns matched against organization logins,
+  ignoring case. Without `orgs`, the team applies to every organization.
+
+The same team name may be declared more than once, e.g. with a different member list
+for each group of organizations, as long as no organization matches two of them.
+
+`compile_plan` validates a config into a plan: a list of plain dicts with `name`,
+`role`, `members` (a list, or None) and `orgs`/`exclude`. `teams_for` gives the teams
+of one organization.
+"""
+
+from fnmatch import fnmatchcase
+import json
+import os
+from typing import Any
+
+try:
+    import tomllib
+except ImportError:  # pragma: no cover - Python < 3.11
+    tomllib = None
+
+DEFAULT_ROLE = "security_manager"
+
+
+def read_config(path: str) -> dict[str, Any]:
+    """
+    Read a config file, as TOML if it ends in `.toml` and as JSON otherwise.
+
+    Raises ValueError if it cannot be parsed.
+    """
+    if path.endswith(".toml"):
+        if tomllib is None:
+            raise ValueError("Reading TOML configs needs Python 3.11 or later")
+        with open(path, "rb") as f:
+            try:
+                return tomllib.load(f)
+            except tomllib.TOMLDecodeError as e:
+                raise ValueError("Invalid config {}: {}".format(path, e)) from None
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError("Invalid config {}: {}".format(path, e)) from None
+
+
+def single_team_config(name: str, members: list[str] | None) -> dict[str, Any]:
+    """
+    The config of the single security managers team given on the command line.
+    """
+    team: dict[str, Any] = {"name": name, "role": DEFAULT_ROLE}
+    if members:
+        team["members"] = list(members)
+    return {"teams": [team]}
+
+
+def _patterns(team: dict[str, Any], field: str) -> list[str]:
+    value = team.get(field, [])
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(p, str) for p in value):
+        raise ValueError(
+            "Team '{}': '{}' must be a list of patterns".format(team.get("name"), field)
+        )
+    return [pattern.lower() for pattern in value]
+
+
+def compile_plan(
+    config: dict[str, Any], base_dir: str = ".", legacy: bool = False
+) -> list[dict[str, Any]]:
+    """
+    Validate a config into a plan of teams, reading any members files.
+
+    Raises ValueError if the config is invalid. With `legacy`, only the security
+    manager role can be given (the legacy API has no other roles).
+    """
+    teams = config.get("teams") if isinstance(config, dict) else None
+    if not isinstance(teams, list) or not teams:
+        raise ValueError("The config must have a non-empty list of 'teams'")
+    plan = []
+    for team in teams:
+        if not isinstance(team, dict) or not isinstance(team.get("name"), str):
+            raise ValueError("Every team in the config needs a 'name'")
+        role = team.get("role", DEFAULT_ROLE)
+        if not isinstance(role, str) or not role:
+            raise ValueError(
+                "Team '{}': 'role' must be the name of a role".format(team["name"])
+            )
+        if legacy and role != DEFAULT_ROLE:
+            raise ValueError(
+                "Team '{}': only the {} role can be managed with --legacy".format(
+                    team["name"], DEFAULT_ROLE
+                )
+            )
+        if "members" in team and "members_file" in team:
+            raise ValueError(
+                "Team '{}': use either 'members' or 'members_file'".format(team["name"])
+            )
+        members = team.get("members")
+        if "members_file" in team:
+            if not isinstance(team["members_file"], str):
+                raise ValueError(
+                    "Team '{}': 'members_file' must be a file name".format(team["name"])
+                )
+            path = os.path.join(base_dir, team["members_file"])
+            with open(path, "r", encoding="utf-8") as f:
+                members = [line.strip() for line in f if line.strip()]
+            # As with --sec-team-members-file, an empty file is a mistake, not a
+            # request to remove every member
+            if not members:
+                raise ValueError(
+                    "Team '{}': No security team members found in file {}".format(
+                        team["name"], path
+                    )
+                )
+        if members is not None and (
+            not isinstance(members, list)
+            or not all(isinstance(m, str) for m in members)
+        ):
+            raise ValueError(
+                "Team '{}': 'members' must be a list of logins".format(team["name"])
+            )
+        plan.append(
+            {
+                "name": team["name"],
+                "role": role,
+                "members": members,
+                "orgs": _patterns(team, "orgs"),
+                "exclude": _patterns(team, "exclude"),
+            }
+        )
+    return plan
+
+
+def load_plan(path: str, legacy: bool = False) -> list[dict[str, Any]]:
+    """Read and compile a config file; members files are relative to it."""
+    return compile_plan(
+        read_config(path), os.path.dirname(os.path.abspath(path)), legacy=legacy
+    )
+
+
+def applies_to(team: dict[str, Any], login: str) -> bool:
+    """Whether a team of a plan applies to an organization login."""
+    login = login.lower()
+    if team["orgs"] and not any(fnmatchcase(login, p) for p in team["orgs"]):
+        return False
+    return not any(fnmatchcase(login, p) for p in team["exclude"])
+
+
+def teams_for(plan: list[dict[str, Any]], login: str) -> list[dict[str, Any]]:
+    """
+    The teams of a plan that apply to an organization.
+
+    Raises ValueError if two declarations of the same team apply to it.
+    """
+    teams = [team for team in plan if applies_to(team, login)]
+    names = [team["name"].lower() for team in teams]
+    for name in set(names):
+        if names.count(name) > 1:
+            raise ValueError(
+                "Team '{}' is declared more than once for organization {}".format(
+                    name, login
+                )
+            )
+    return teams
+
+
+def check_plan(plan: list[dict[str, Any]], logins: list[str]) -> None:
+    """
+    Check that no organization gets two declarations of the same team.
+
+    Raises ValueError for the first one that does.
+    """
+    for login in logins:
+        teams_for(plan, login)
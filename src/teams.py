@@ -6,13 +6,26 @@ This file holds team-related functions
 - create team if not
 - add users to team
 - assign team custom role on all org repos
+- pre-check many teams' members at once
 """
 
+import json
+import re
 from typing import Any
-import requests
 from urllib.parse import quote
+from . import fastjson, records, transport
+from .records import Member, Team
+from .users import MEMBER_FIELDS
 from .util import add_request_headers
 
+# The fields of teams in REST listings that are used
+TEAM_FIELDS = ("id", "name", "slug")
+
+
+def slugify(name: str) -> str:
+    """The slug GitHub gives a team of this name, e.g. "Security Managers" -> "security-managers"."""
+    return re.sub(r"[^a-z0-9_]+", "-", name.lower()).strip("-")
+
 
 # List teams using REST API with pagination
 def list_teams(
@@ -20,21 +33,27 @@ def list_teams(
     headers: dict[str, str],
     org: str,
     verify: str | bool | None = True,
-) -> list[dict[str, Any]]:
+) -> list[Team]:
     """
     List all teams in an organization.
     """
     teams = []
     page = 1
     while True:
-        response = requests.get(
+        response = transport.request(
+            "GET",
             api_endpoint
             + "/orgs/{}/teams?page={}".format(quote(org), quote(str(page))),
             headers=add_request_headers(headers),
             verify=verify,
         )
         response.raise_for_status()
-        teams.extend(response.json())
+        teams.extend(
+            map(
+                records.team_from_json,
+                fastjson.iter_fields(response.content, TEAM_FIELDS),
+            )
+        )
         if "next" not in response.links:
             break
         page += 1
@@ -53,7 +72,8 @@ def create_team(
     """
     Create a new team in an organization.
     """
-    response = requests.post(
+    response = transport.request(
+        "POST",
         api_endpoint + "/orgs/{}/teams".format(quote(org)),
         json={
             "name": team_slug,
@@ -64,7 +84,7 @@ def create_team(
         verify=verify,
     )
     response.raise_for_status()
-    return response.json()
+    return fastjson.response_json(response)
 
 
 # Change that security manager team's role to "security manager"
@@ -81,7 +101,8 @@ def change_team_role(
     Change the role of a team in an organization to "security manager"
     """
     if legacy:
-        response = requests.put(
+        response = transport.request(
+            "PUT",
             api_endpoint
             + "/orgs/{}/security-managers/teams/{}".format(
                 quote(org), quote(team_slug)
@@ -92,7 +113,8 @@ def change_team_role(
         response.raise_for_status()
     else:
         # /orgs/{org}/organization-roles/teams/{team_slug}/{role_id}
-        response = requests.put(
+        response = transport.request(
+            "PUT",
             api_endpoint
             + "/orgs/{}/organization-roles/teams/{}/{}".format(
                 quote(org), quote(team_slug), quote(str(security_manager_role_id))
@@ -117,20 +139,22 @@ def has_team_role(
     """
     if legacy:
         # http(s)://HOSTNAME/api/v3/orgs/ORG/security-managers
-        response = requests.get(
+        response = transport.request(
+            "GET",
             api_endpoint + "/orgs/{}/security-managers".format(quote(org)),
             headers=add_request_headers(headers),
             verify=verify,
         )
         response.raise_for_status()
-        roles = response.json()
+        roles = fastjson.response_json(response)
         return any(role["slug"] == team_slug for role in roles)
     else:
         # Use paginated retrieval for teams assigned a specific organization role.
         # Endpoint pattern: GET /orgs/{org}/organization-roles/{role_id}/teams?page=N
         page = 1
         while True:
-            response = requests.get(
+            response = transport.request(
+                "GET",
                 api_endpoint
                 + "/orgs/{}/organization-roles/{}/teams?page={}".format(
                     quote(org), quote(str(role_id)), quote(str(page))
@@ -139,7 +163,7 @@ def has_team_role(
                 verify=verify,
             )
             response.raise_for_status()
-            teams_page = response.json()
+            teams_page = fastjson.iter_fields(response.content, ("slug",))
             if any(team.get("slug") == team_slug for team in teams_page):
                 return True
             if "next" not in response.links:
@@ -155,14 +179,15 @@ def list_team_members(
     org: str,
     team_slug: str,
     verify: str | bool | None = True,
-) -> list[dict[str, Any]]:
+) -> list[Member]:
     """
     List all members of a team in an organization.
     """
     members = []
     page = 1
     while True:
-        response = requests.get(
+        response = transport.request(
+            "GET",
             api_endpoint
             + "/orgs/{}/teams/{}/members?page={}".format(
                 quote(org), quote(team_slug), quote(str(page))
@@ -171,7 +196,12 @@ def list_team_members(
             verify=verify,
         )
         response.raise_for_status()
-        members.extend(response.json())
+        members.extend(
+            map(
+                records.member_from_json,
+                fastjson.iter_fields(response.content, MEMBER_FIELDS),
+            )
+        )
         if "next" not in response.links:
             break
         page += 1
@@ -190,7 +220,8 @@ def add_team_member(
     """
     Add a user to a team in an organization.
     """
-    response = requests.put(
+    response = transport.request(
+        "PUT",
         api_endpoint
         + "/orgs/{}/teams/{}/memberships/{}".format(
             quote(org), quote(team_slug), quote(username)
@@ -213,7 +244,8 @@ def remove_team_member(
     """
     Remove a user from a team in an organization.
     """
-    response = requests.delete(
+    response = transport.request(
+        "DELETE",
         api_endpoint
         + "/orgs/{}/teams/{}/memberships/{}".format(
             quote(org), quote(team_slug), quote(username)
@@ -222,3 +254,90 @@ def remove_team_member(
         verify=verify,
     )
     response.raise_for_status()
+
+
+# Most aliased fields in one pre-check query
+PRECHECK_MAX_ALIASES = 100
+
+
+def precheck_aliases(members: list[str] | None) -> int:
+    """The number of aliased fields a team's pre-check takes."""
+    return 1 + len(members or [])
+
+
+def make_precheck_query(checks: list[tuple[str, str, list[str] | None]]) -> str:
+    """
+    Create a GraphQL query of the member count of teams, and whether each desired
+    member is one, from (org, team slug, desired members) checks.
+    """
+    fields = []
+    for i, (org, team_slug, members) in enumerate(checks):
+        lookups = "".join(
+            " m{}: members(query: {}, first: 10) {{ nodes {{ login }} }}".format(
+                j, json.dumps(login)
+            )
+            for j, login in enumerate(members or [])
+        )
+        fields.append(
+            "c{}: organization(login: {}) {{ team(slug: {}) {{ members {{ totalCount }}{} }} }}".format(
+                i, json.dumps(org), json.dumps(team_slug), lookups
+            )
+        )
+    return "query {\n" + "\n".join(fields) + "\n}"
+
+
+def precheck_teams(
+    api_endpoint: str,
+    headers: dict[str, str],
+    checks: list[tuple[str, str, list[str] | None]],
+    verify: str | bool | None = True,
+) -> list[dict[str, bool] | None]:
+    """
+    Check in one GraphQL query whether teams exist and have exactly their desired
+    members (ignoring case), from (org, team slug, desired members) checks. Desired
+    members of None only checks that the team exists.
+
+    Returns, for each check, a dict of `exists` and `in_sync`, or None if the
+    organization or its team could not be queried, e.g. forbidden or timed out.
+    """
+    response = transport.request(
+        "POST",
+        api_endpoint,
+        json={"query": make_precheck_query(checks)},
+        headers=add_request_headers(headers),
+        verify=verify,
+        idempotent=True,
+    )
+    response.raise_for_status()
+    # Inaccessible organizations and teams come back as null, with errors
+    result = fastjson.response_json(response)
+    data = result.get("data") or {}
+    failed = {
+        error["path"][0]
+        for error in result.get("errors") or []
+        if isinstance(error, dict) and error.get("path")
+    }
+    results: list[dict[str, bool] | None] = []
+    for i, (_, _, members) in enumerate(checks):
+        alias = "c{}".format(i)
+        org = data.get(alias)
+        if org is None or alias in failed:
+            results.append(None)
+            continue
+        team = org.get("team")
+        if team is None:
+            results.append({"exists": False, "in_sync": False})
+            continue
+        wanted = {login.lower() for login in members or []}
+        found = all(
+            any(
+                node["login"].lower() == login.lower()
+                for node in team["m{}".format(j)]["nodes"]
+            )
+            for j, login in enumerate(members or [])
+        )
+        in_sync = members is None or (
+            found and team["members"]["totalCount"] == len(wanted)
+        )
+        results.append({"exists": True, "in_sync": in_sync})
+    return results
@@ -0,0 +1,731 @@
+#!/usr/bin/env python3
+
+"""
+HTTP transport shared by all API calls in `src`.
+
+Adds what a long run against GitHub needs on top of `requests`:
+- connect/read timeouts on every request, so a stuck connection cannot hang a run
+- retries with exponential backoff and full jitter for transient failures (5xx,
+  timeouts, connection errors) and waits for rate limits (429/403 with Retry-After
+  or an exhausted rate limit). Only idempotent requests (GET, PUT, DELETE, and
+  POSTs marked `idempotent=True`, such as GraphQL queries) are retried after the
+  server may have acted on them; other POSTs are only retried when they could not
+  have been sent.
+- optional hedged GETs: if a GET has not answered after `hedge_after` seconds, a
+  second identical request is sent and whichever answers first is used
+- a per-host circuit breaker: after `breaker_threshold` consecutive failures,
+  requests to that host pause for `breaker_cooldown` seconds instead of failing
+- optional HTTP/2 (`http2=True`, needs `httpx[http2]`), multiplexing concurrent
+  requests over a few connections; it falls back to HTTP/1.1 when httpx is not
+  installed, the server does not offer HTTP/2, or an HTTP/2 connection misbehaves
+  (sending the failed request again only if it is idempotent).
+  Responses are converted to `requests.Response`, so callers see no difference.
+- the latest rate limit budget seen for each resource (`core`, `graphql`, ...),
+  and the number of requests in flight, for progress reporting
+- request coalescing (single-flight): identical reads (GETs, and GraphQL queries
+  that are not mutations) sent while one is in flight wait for its response instead
+  of going to the network. Optionally (`memoize=True`), successful responses are
+  also memoized for the rest of the run, up to `MEMO_MAX_BYTES` of response bodies.
+  A write drops the memoized responses of its organization (`/orgs/{org}`) and those
+  not under an organization, such as GraphQL queries, on its host; a write not under
+  an organization, such as a GraphQL mutation, drops all of the host's. The calls
+  saved are counted in `stats` as `coalesced` and `memo_hits`.
+- optional recording of the requests and responses to a cassette, redacted, and
+  replay of a cassette instead of the network (see `cassette`)
+
+The scripts configure it once from the command line with `add_transport_args` and
+`configure_from_args`; the `src` functions call `request`. Code run in a context with
+a transport of its own (`use_transport`, kept across threads by `submit`) uses and
+configures that one instead, e.g. one per enterprise, each with its own connections
+and rate limit budget.
+"""
+
+from argparse import ArgumentParser, Namespace
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import ContextVar, copy_context
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Callable
+import requests
+from requests.structures import CaseInsensitiveDict
+from . import cassette
+import logging
+
+LOG = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+RETRY_STATUSES = frozenset([500, 502, 503, 504])
+READ_METHODS = frozenset(["GET", "HEAD"])
+# Bytes of response bodies kept in the per-run memo, least recently used dropped first
+MEMO_MAX_BYTES = 64 * 1024 * 1024
+# httpx, for HTTP/2, once `load_httpx` has imported it. It is only imported when
+# HTTP/2 is asked for, as it takes longer to import than the rest of a script.
+httpx: Any = None
+
+
+def load_httpx() -> bool:
+    """
+    Import httpx with HTTP/2 support, if it is installed. Returns whether it is.
+    """
+    global httpx
+    if httpx is None:
+        try:
+            import httpx as httpx_module
+            import h2  # noqa: F401 - httpx needs it for HTTP/2
+        except ImportError:  # pragma: no cover - optional dependency
+            return False
+        # httpx logs every request at INFO, which would flood the scripts' output
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        httpx = httpx_module
+    return True
+
+
+def memo_scope(url: str) -> str:
+    """
+    The part of the API a request belongs to, for dropping memoized responses after a
+    write: the organization (host and `/orgs/{org}`), or else the whole host.
+    """
+    parsed = urlparse(url)
+    match = re.search(r"/orgs/[^/]+", parsed.path)
+    return parsed.netloc + (match.group(0).lower() if match else "")
+
+
+def is_read(method: str, url: str, idempotent: bool, kwargs: dict[str, Any]) -> bool:
+    """Whether a request only reads: a GET, or a GraphQL query that is not a mutation."""
+    if method in READ_METHODS:
+        return True
+    query = (kwargs.get("json") or {}).get("query")
+    return (
+        method == "POST"
+        and idempotent
+        and url.endswith("/graphql")
+        and isinstance(query, str)
+        and not query.lstrip().startswith("mutation")
+    )
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive failures to one host, and pauses callers while it is open.
+    """
+
+    def __init__(self, host: str, threshold: int, cooldown: float) -> None:
+        self.host = host
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until the breaker lets a request through."""
+        with self._lock:
+            delay = self.open_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, success: bool) -> None:
+        """Record the outcome of a request, opening the breaker if needed."""
+        with self._lock:
+            if success:
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.threshold and self.failures >= self.threshold:
+                self.open_until = time.monotonic() + self.cooldown
+                LOG.warning(
+                    "⚠️ {} consecutive failures from {}; pausing requests to it for {:.0f}s".format(
+                        self.failures, self.host, self.cooldown
+                    )
+                )
+
+
+class Transport:
+    """
+    Sends HTTP requests with timeouts, retries, hedging and circuit breaking.
+
+    Each thread gets its own `requests.Session`, so connections are reused within
+    a thread and never shared between threads.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = 10,
+        read_timeout: float = 60,
+        retries: int = 4,
+        backoff: float = 1,
+        max_backoff: float = 60,
+        hedge_after: float | None = None,
+        breaker_threshold: int = 10,
+        breaker_cooldown: float = 60,
+        http2: bool = False,
+        coalesce: bool = True,
+        memoize: bool = False,
+        recorder: cassette.Recorder | None = None,
+        replay: cassette.Replayer | None = None,
+    ) -> None:
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.stats: dict[str, int] = {
+            "requests": 0,
+            "retries": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "coalesced": 0,
+            "memo_hits": 0,
+            "elapsed_ms": 0,
+        }
+        # Latest X-RateLimit-* values per resource, e.g. {"core": {"remaining": 4999, ...}}
+        self.rate_limits: dict[str, dict[str, int]] = {}
+        self.in_flight = 0
+        self._local = threading.local()
+        # Every thread's session, to close them all with the transport
+        self._sessions: list[requests.Session] = []
+        self._lock = threading.Lock()
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self.coalesce = coalesce
+        self.memoize = memoize
+        self.recorder = recorder
+        self.replay = replay
+        # Reads in flight and memoized responses, by request; bumping the generation
+        # stops reads that were in flight during a write from being memoized
+        self._flights: dict[tuple, Future] = {}
+        self._memo: OrderedDict[tuple, tuple[str, requests.Response]] = OrderedDict()
+        self._memo_bytes = 0
+        self._generation = 0
+        self._memo_lock = threading.Lock()
+        self._hedge_pool: ThreadPoolExecutor | None = None
+        # One HTTP/2 client per `verify` setting, shared by all threads
+        self._http2_clients: dict[str | bool | None, Any] = {}
+        self.http2 = http2
+        if http2 and not load_httpx():
+            LOG.warning(
+                "⚠️ HTTP/2 needs httpx with HTTP/2 support (pip install 'httpx[http2]'); using HTTP/1.1"
+            )
+            self.http2 = False
+
+    def session(self) -> requests.Session:
+        """The calling thread's session."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self) -> None:
+        """
+        Close the transport's connections: every thread's session, the HTTP/2 clients
+        and the pool of hedged requests.
+        """
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+            clients, self._http2_clients = list(self._http2_clients.values()), {}
+            pool, self._hedge_pool = self._hedge_pool, None
+        for session in sessions:
+            session.close()
+        for client in clients:
+            client.close()
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        """The circuit breaker for a URL's host."""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(
+                    host, self.breaker_threshold, self.breaker_cooldown
+                )
+            return self._breakers[host]
+
+    def count(self, stat: str, n: int = 1) -> None:
+        """Add to a transport statistic."""
+        with self._lock:
+            self.stats[stat] = self.stats.get(stat, 0) + n
+
+    def count_in_flight(self, n: int) -> None:
+        """Track requests that have been sent and not yet answered."""
+        with self._lock:
+            self.in_flight += n
+
+    def record_rate_limit(self, response: requests.Response) -> None:
+        """Remember the rate limit budget a response reports, if any."""
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        if remaining is None or not remaining.isdigit():
+            return
+        resource = response.headers.get("X-RateLimit-Resource", "core")
+        limit = response.headers.get("X-RateLimit-Limit", "")
+        reset = response.headers.get("X-RateLimit-Reset", "")
+        with self._lock:
+            self.rate_limits[resource] = {
+                "remaining": int(remaining),
+                "limit": int(limit) if limit.isdigit() else 0,
+                "reset": int(reset) if reset.isdigit() else 0,
+            }
+
+    def request(
+        self, method: str, url: str, idempotent: bool | None = None, **kwargs: Any
+    ) -> requests.Response:
+        """
+        Send a request, retrying transient failures, and sharing identical reads.
+
+        Returns the final response (whatever its status); raises the last exception
+        if the request could not be completed.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", self.timeout)
+        if not self.coalesce:
+            return self._request(method, url, idempotent, kwargs)
+        if is_read(method, url, idempotent, kwargs):
+            return self._shared_read(method, url, idempotent, kwargs)
+        # Drop what the write may change, both before (so no read started from now
+        # on is memoized) and after it (in case one started during it)
+        self.invalidate(url)
+        try:
+            return self._request(method, url, idempotent, kwargs)
+        finally:
+            self.invalidate(url)
+
+    def invalidate(self, url: str) -> None:
+        """Drop memoized responses, and stop sharing reads in flight, that a write to a URL may change."""
+        scope = memo_scope(url)
+        host = scope.split("/", 1)[0]
+        host_wide = scope == host
+
+        def affected(entry_scope: str) -> bool:
+            # Reads not under an organization, such as GraphQL queries, may read any
+            # organization's data
+            return (
+                entry_scope == scope
+                or entry_scope == host
+                or (host_wide and entry_scope.split("/", 1)[0] == host)
+            )
+
+        with self._memo_lock:
+            self._generation += 1
+            for key in [k for k, (s, _) in self._memo.items() if affected(s)]:
+                self._forget(key)
+            for key in [k for k in self._flights if affected(k[0])]:
+                del self._flights[key]
+
+    def clear_memo(self) -> None:
+        """Forget all memoized responses, e.g. between the passes of a long-running process."""
+        with self._memo_lock:
+            self._generation += 1
+            self._memo.clear()
+            self._memo_bytes = 0
+
+    def _forget(self, key: tuple) -> None:
+        """Drop a memoized response; the caller holds the memo lock."""
+        _, response = self._memo.pop(key)
+        self._memo_bytes -= len(response.content)
+
+    def _shared_read(
+        self, method: str, url: str, idempotent: bool, kwargs: dict[str, Any]
+    ) -> requests.Response:
+        """
+        Send a read unless an identical one is in flight or memoized, in which case
+        its response is used.
+        """
+        key = (
+            memo_scope(url),
+            method,
+            url,
+            json.dumps(kwargs.get("params"), sort_keys=True, default=str),
+            json.dumps(kwargs.get("json"), sort_keys=True, default=str),
+            tuple(sorted((kwargs.get("headers") or {}).items())),
+            str(kwargs.get("verify")),
+        )
+        with self._memo_lock:
+            memoized = self._memo.get(key)
+            if memoized is not None:
+                self._memo.move_to_end(key)
+            flight = self._flights.get(key)
+            leader = memoized is None and flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+                generation = self._generation
+        if memoized is not None:
+            self.count("memo_hits")
+            return memoized[1]
+        if not leader:
+            self.count("coalesced")
+            return flight.result()
+
+        try:
+            response = self._request(method, url, idempotent, kwargs)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._memo_lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+        with self._memo_lock:
+            if (
+                self.memoize
+                and response.ok
+                and generation == self._generation
+                and key not in self._memo
+            ):
+                self._memo[key] = (key[0], response)
+                self._memo_bytes += len(response.content)
+                while self._memo_bytes > MEMO_MAX_BYTES:
+                    self._forget(next(iter(self._memo)))
+        flight.set_result(response)
+        return response
+
+    def _request(
+        self, method: str, url: str, idempotent: bool, kwargs: dict[str, Any]
+    ) -> requests.Response:
+        """Send a request, retrying transient failures."""
+        breaker = self.breaker(url)
+
+        attempt = 0
+        while True:
+            breaker.wait()
+            self.count("requests")
+            self.count_in_flight(1)
+            try:
+                response = self._send(method, url, idempotent, **kwargs)
+            except requests.exceptions.RequestException as e:
+                breaker.record(False)
+                # Only a failed connect guarantees a non-idempotent request was not sent
+                retryable = idempotent or isinstance(
+                    e, requests.exceptions.ConnectTimeout
+                )
+                if not retryable or attempt >= self.retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                LOG.debug(
+                    "{} {} failed ({}); retrying in {:.1f}s".format(
+                        method, url, e, delay
+                    )
+                )
+            else:
+                rate_limit_delay = self._rate_limit_delay(response)
+                if rate_limit_delay is not None:
+                    # Rate limited requests were not processed, so any can be retried
+                    breaker.record(True)
+                    if attempt >= self.retries:
+                        return response
+                    delay = rate_limit_delay
+                    LOG.warning(
+                        "⚠️ Rate limited by {}; waiting {:.0f}s".format(
+                            breaker.host, delay
+                        )
+                    )
+                elif response.status_code in RETRY_STATUSES:
+                    breaker.record(False)
+                    if not idempotent or attempt >= self.retries:
+                        return response
+                    delay = self._backoff_delay(attempt)
+                    LOG.debug(
+                        "{} {} returned HTTP {}; retrying in {:.1f}s".format(
+                            method, url, response.status_code, delay
+                        )
+                    )
+                else:
+                    breaker.record(True)
+                    return response
+            finally:
+                self.count_in_flight(-1)
+            attempt += 1
+            self.count("retries")
+            time.sleep(delay)
+
+    def _send(
+        self, method: str, url: str, idempotent: bool = True, **kwargs: Any
+    ) -> requests.Response:
+        """Send one attempt, hedging slow GETs if enabled."""
+        if self.hedge_after is None or method != "GET":
+            return self._send_once(method, url, kwargs, idempotent)
+
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(
+                    max_workers=32, thread_name_prefix="hedge"
+                )
+            pool = self._hedge_pool
+        primary = pool.submit(self._send_once, method, url, kwargs)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        self.count("hedges")
+        hedge = pool.submit(self._send_once, method, url, kwargs)
+        futures: list[Future] = [primary, hedge]
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.remove(future)
+                if future.exception() is None or not futures:
+                    if future is hedge and future.exception() is None:
+                        self.count("hedge_wins")
+                    return future.result()
+        raise RuntimeError("unreachable")  # pragma: no cover
+
+    def _send_once(
+        self,
+        method: str,
+        url: str,
+        kwargs: dict[str, Any],
+        idempotent: bool = True,
+    ) -> requests.Response:
+        """
+        Send a single request over HTTP/2 or HTTP/1.1, and record its version and time.
+
+        After an HTTP/2 protocol error, HTTP/1.1 is used from then on. The request is
+        sent again over HTTP/1.1 only if it is idempotent, as the server may already
+        have acted on it; otherwise a `requests` ConnectionError is raised.
+        """
+        start = time.monotonic()
+        response = None
+        if self.replay is not None:
+            response, version = self.replay.respond(method, url, kwargs), "replay"
+        elif self.http2:
+            try:
+                response, version = self._send_http2(method, url, kwargs)
+            except httpx.ProtocolError as e:
+                with self._lock:
+                    first = self.http2
+                    self.http2 = False
+                if first:
+                    LOG.warning(
+                        "⚠️ HTTP/2 protocol error ({}); falling back to HTTP/1.1".format(
+                            e
+                        )
+                    )
+                if not idempotent:
+                    raise requests.exceptions.ConnectionError(str(e))
+        if response is None:
+            response = self.session().request(method, url, **kwargs)
+            version = "http/1.1"
+        elapsed = time.monotonic() - start
+        self.count(version)
+        self.count("elapsed_ms", int(elapsed * 1000))
+        self.record_rate_limit(response)
+        if self.recorder is not None:
+            self.recorder.record(method, url, kwargs, response, elapsed)
+        return response
+
+    def _send_http2(
+        self, method: str, url: str, kwargs: dict[str, Any]
+    ) -> tuple[requests.Response, str]:
+        """
+        Send a request with httpx, converting the result to a `requests.Response`.
+
+        Returns the response and the HTTP version that was negotiated.
+        """
+        verify = kwargs.get("verify", True)
+        with self._lock:
+            client = self._http2_clients.get(verify)
+            if client is None:
+                client = self._http2_clients[verify] = httpx.Client(
+                    http2=True, verify=True if verify is None else verify
+                )
+        connect_timeout, read_timeout = kwargs.get("timeout", self.timeout)
+        try:
+            r = client.request(
+                method,
+                url,
+                json=kwargs.get("json"),
+                headers=kwargs.get("headers"),
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            )
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(str(e))
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ReadTimeout(str(e))
+        except httpx.ProtocolError:
+            raise
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+
+        response = requests.Response()
+        response.status_code = r.status_code
+        response.reason = r.reason_phrase
+        response.headers = CaseInsensitiveDict(r.headers)
+        response._content = r.content
+        response.encoding = r.encoding
+        response.url = str(r.url)
+        response.elapsed = r.elapsed
+        response.request = requests.Request(method, url).prepare()
+        return response, r.http_version.lower()
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def _rate_limit_delay(self, response: requests.Response) -> float | None:
+        """How long to wait before retrying a rate limited response, or None if it was not rate limited."""
+        if response.status_code not in (403, 429):
+            return None
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    return max(
+                        0.0,
+                        parsedate_to_datetime(retry_after).timestamp() - time.time(),
+                    )
+                except (TypeError, ValueError):
+                    return self.max_backoff
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset = response.headers.get("X-RateLimit-Reset")
+            if reset and reset.isdigit():
+                return max(0.0, int(reset) - time.time()) + 1
+            return self.max_backoff
+        if response.status_code == 429:
+            return self.max_backoff
+        return None
+
+
+_DEFAULT = Transport()
+_CURRENT: ContextVar[Transport | None] = ContextVar("transport", default=None)
+
+
+def get_transport() -> Transport:
+    """The transport used by the current context (see `use_transport`), or the default one."""
+    return _CURRENT.get() or _DEFAULT
+
+
+def use_transport(transport: Transport) -> None:
+    """Use a transport for requests made in the current context."""
+    _CURRENT.set(transport)
+
+
+def submit(pool: ThreadPoolExecutor, fn: Callable[..., Any], *args: Any) -> Future:
+    """
+    Submit work to a thread pool, keeping the caller's transport.
+
+    Worker threads do not inherit context variables, so each task runs in a copy of
+    the submitting context.
+    """
+    return pool.submit(copy_context().run, fn, *args)
+
+
+def configure(**kwargs: Any) -> Transport:
+    """
+    Replace the transport of the current context (see `use_transport`), or the default
+    one if the context has none, with one built from the given settings.
+
+    So a script run in a context of its own, such as one target of several (see
+    `multi-enterprise.py`), configures its own transport and leaves the others alone.
+    """
+    global _DEFAULT
+    transport = Transport(**kwargs)
+    if _CURRENT.get() is not None:
+        _CURRENT.set(transport)
+    else:
+        _DEFAULT = transport
+    return transport
+
+
+def request(
+    method: str, url: str, idempotent: bool | None = None, **kwargs: Any
+) -> requests.Response:
+    """Send a request through the current transport."""
+    return get_transport().request(method, url, idempotent=idempotent, **kwargs)
+
+
+def request_counts() -> dict[str, int]:
+    """Requests the current transport sent, and those that coalescing saved."""
+    stats = get_transport().stats
+    return {
+        "sent": stats["requests"],
+        "coalesced": stats["coalesced"],
+        "memo_hits": stats["memo_hits"],
+    }
+
+
+def add_transport_args(parser: ArgumentParser) -> None:
+    """Add the transport's arguments to a command line parser."""
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=10,
+        help="Seconds to wait for a connection to GitHub (default: 10)",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=60,
+        help="Seconds to wait for GitHub to respond (default: 60)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=4,
+        help="Retries for transient failures and rate limits (default: 4)",
+    )
+    parser.add_argument(
+        "--hedge-after",
+        type=float,
+        required=False,
+        help="Send a second copy of a GET that has not answered after this many seconds",
+    )
+    parser.add_argument(
+        "--breaker-threshold",
+        type=int,
+        default=10,
+        help="Consecutive failures from a host before pausing requests to it (default: 10, 0 to disable)",
+    )
+    parser.add_argument(
+        "--breaker-cooldown",
+        type=float,
+        default=60,
+        help="Seconds to pause requests to a failing host (default: 60)",
+    )
+    parser.add_argument(
+        "--http2",
+        action="store_true",
+        help="Use HTTP/2 where the server supports it (needs httpx[http2])",
+    )
+    parser.add_argument(
+        "--no-coalesce",
+        action="store_true",
+        help="Send every read to GitHub, even if an identical one is in flight",
+    )
+    parser.add_argument(
+        "--memoize",
+        action="store_true",
+        help="Reuse the responses of reads for the rest of the run, until a write may change them",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="CASSETTE",
+        required=False,
+        help="Record the requests and responses, redacted, to this file (see bench-replay.py)",
+    )
+
+
+def configure_from_args(args: Namespace) -> Transport:
+    """Configure the default transport from parsed command line arguments."""
+    return configure(
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        retries=args.retries,
+        hedge_after=args.hedge_after,
+        breaker_threshold=args.breaker_threshold,
+        breaker_cooldown=args.breaker_cooldown,
+        http2=args.http2,
+        coalesce=not args.no_coalesce,
+        memoize=args.memoize,
+        recorder=cassette.Recorder(args.record) if args.record else None,
+    )
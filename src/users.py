@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""
+User queries
+- resolve many logins at once, to validate them
+"""
+
+import json
+from typing import Any
+from . import fastjson, transport
+from .util import add_request_headers
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Most aliased `user` lookups in one query
+MAX_BATCH = 100
+
+# The fields of users in REST listings (of members) that are used
+MEMBER_FIELDS = ("id", "login")
+
+
+def make_users_query(logins: list[str]) -> str:
+    """
+    Create a GraphQL query looking up users by login, aliased `u0`, `u1`, ...
+    """
+    return (
+        "query {\n"
+        + "\n".join(
+            "u{}: user(login: {}) {{ login }}".format(i, json.dumps(login))
+            for i, login in enumerate(logins)
+        )
+        + "\n}"
+    )
+
+
+def resolve_logins(
+    api_endpoint: str,
+    headers: dict[str, str],
+    logins: list[str],
+    verify: str | bool | None = True,
+) -> dict[str, str | None]:
+    """
+    Look up users by login, in batches of aliased GraphQL queries.
+
+    Returns each login (lowercased) with its login as GitHub spells it, or None if
+    there is no such user (a NOT_FOUND error on its alias). Logins that could not be
+    looked up, for any other error or a failed query, are returned as given.
+    """
+    given: dict[str, str] = {}
+    for login in logins:
+        given.setdefault(login.lower(), login)
+    unique = list(given)
+    resolved: dict[str, str | None] = {}
+    for i in range(0, len(unique), MAX_BATCH):
+        batch = unique[i : i + MAX_BATCH]
+        response = transport.request(
+            "POST",
+            api_endpoint,
+            json={"query": make_users_query(batch)},
+            headers=add_request_headers(headers),
+            verify=verify,
+            idempotent=True,
+        )
+        response.raise_for_status()
+        result = fastjson.response_json(response)
+        errors: list[dict[str, Any]] = result.get("errors") or []
+        # Unknown users come back as null, with a NOT_FOUND error on their alias;
+        # other errors (rate limits, timeouts) say nothing about whether they exist
+        not_found = {
+            error["path"][0]
+            for error in errors
+            if error.get("type") == "NOT_FOUND" and error.get("path")
+        }
+        data: dict[str, Any] = result.get("data") or {}
+        unvalidated = []
+        for j, login in enumerate(batch):
+            alias = "u{}".format(j)
+            user = data.get(alias)
+            if user:
+                resolved[login] = user["login"]
+            elif alias in not_found:
+                resolved[login] = None
+            else:
+                resolved[login] = given[login]
+                unvalidated.append(given[login])
+        if unvalidated:
+            LOG.warning(
+                "⚠️ Could not look up {} users, kept as given: {}".format(
+                    len(unvalidated),
+                    "; ".join(
+                        error.get("message", "")
+                        for error in errors
+                        if error.get("type") != "NOT_FOUND"
+                    )
+                    or "no data",
+                )
+            )
+    return resolved
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+
+"""
+A local SQLite work queue of organizations, shared by any number of worker processes.
+
+The org list is loaded once, each organization with a priority and an estimated
+cost; workers then claim organizations by priority, then largest first, with a
+time-limited lease that they renew while they work on it, record the outcome, and
+take over leases that expired because a worker crashed. Re-running a worker only
+picks up what is still unfinished.
+
+Job states:
+- pending: not yet claimed
+- claimed: leased to a worker until `lease_expires`
+- done: completed without issues
+- failed: completed with an issue, recorded in `reason`
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Iterable
+import logging
+
+LOG = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    login TEXT PRIMARY KEY,
+    org_id TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    reason TEXT,
+    updated_at REAL,
+    cost REAL NOT NULL DEFAULT 0,
+    priority INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+"""
+
+# Columns added since the first version of the queue
+ADDED_COLUMNS = (
+    ("cost", "REAL NOT NULL DEFAULT 0"),
+    ("priority", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+
+def open_queue(path: str) -> sqlite3.Connection:
+    """
+    Open (creating if needed) the work queue database.
+
+    Uses WAL journaling so that workers can read while another one is claiming.
+    """
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    # Queues created before costs and priorities were recorded
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for column, definition in ADDED_COLUMNS:
+        if column not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN {} {}".format(column, definition))
+    return conn
+
+
+def load_orgs(
+    conn: sqlite3.Connection,
+    orgs: Iterable[dict[str, Any]],
+    cost: Callable[[dict[str, Any]], float] | None = None,
+    priority: Callable[[dict[str, Any]], int] | None = None,
+) -> int:
+    """
+    Load organizations (rows of the org CSV) into the queue as pending jobs, with
+    an optional priority (lowest first) and estimated cost (largest first) for each,
+    which order the claims.
+
+    Organizations already in the queue are left untouched. Returns the number added.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        before = conn.total_changes
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO jobs (login, org_id, updated_at, cost, priority)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                (
+                    org["login"],
+                    org.get("id"),
+                    now,
+                    cost(org) if cost else 0,
+                    priority(org) if priority else 0,
+                )
+                for org in orgs
+            ),
+        )
+        added = conn.total_changes - before
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return added
+
+
+def claim(
+    conn: sqlite3.Connection, worker: str, lease_seconds: float
+) -> dict[str, Any] | None:
+    """
+    Claim the next unfinished organization for a worker.
+
+    Pending jobs are claimed first, by priority and then largest estimated cost
+    first, then jobs whose lease has expired. Returns the claimed job, or None when
+    nothing is left to do.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            """
+            SELECT login, org_id, status, worker, cost FROM jobs
+            WHERE status = 'pending' OR (status = 'claimed' AND lease_expires < ?)
+            ORDER BY status = 'claimed', priority, cost DESC, rowid
+            LIMIT 1
+            """,
+            (now,),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            """
+            UPDATE jobs SET status = 'claimed', worker = ?, lease_expires = ?,
+                attempts = attempts + 1, updated_at = ?
+            WHERE login = ?
+            """,
+            (worker, now + lease_seconds, now, row["login"]),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if row["status"] == "claimed":
+        LOG.warning(
+            "⚠️ Taking over organization '{}' from worker {} (lease expired)".format(
+                row["login"], row["worker"]
+            )
+        )
+    return {"login": row["login"], "id": row["org_id"], "cost": row["cost"]}
+
+
+def renew(
+    conn: sqlite3.Connection, login: str, worker: str, lease_seconds: float
+) -> bool:
+    """
+    Extend a worker's lease on a claimed organization to `lease_seconds` from now.
+
+    Returns False if the worker no longer holds the lease (another worker took it over).
+    """
+    now = time.time()
+    cursor = conn.execute(
+        """
+        UPDATE jobs SET lease_expires = ?, updated_at = ?
+        WHERE login = ? AND worker = ? AND status = 'claimed'
+        """,
+        (now + lease_seconds, now, login, worker),
+    )
+    return cursor.rowcount > 0
+
+
+class Heartbeat:
+    """
+    Renews a worker's lease on an organization in the background while it is being
+    processed, every third of the lease, so that long organizations are not taken
+    over by another worker.
+
+    Uses a connection of its own, as SQLite connections stay on their thread.
+    """
+
+    def __init__(
+        self, path: str, login: str, worker: str, lease_seconds: float
+    ) -> None:
+        self.path = path
+        self.login = login
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _run(self) -> None:
+        conn = None
+        try:
+            conn = open_queue(self.path)
+            while not self._stop.wait(self.lease_seconds / 3):
+                if not renew(conn, self.login, self.worker, self.lease_seconds):
+                    LOG.warning(
+                        "⚠️ Lease on organization '{}' was lost; it may be processed twice".format(
+                            self.login
+                        )
+                    )
+                    return
+        except sqlite3.Error as e:
+            LOG.warning(
+                "⚠️ Cannot renew the lease on organization '{}': {}".format(
+                    self.login, e
+                )
+            )
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def start(self) -> "Heartbeat":
+        """Start renewing the lease in the background."""
+        self._thread = threading.Thread(target=self._run, name="heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop renewing the lease."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self) -> "Heartbeat":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def complete(
+    conn: sqlite3.Connection, login: str, worker: str, reason: str | None = None
+) -> bool:
+    """
+    Record the outcome of a claimed organization: done if no reason is given, failed otherwise.
+
+    Returns False if the worker no longer holds the lease (another worker took it over).
+    """
+    cursor = conn.execute(
+        """
+        UPDATE jobs SET status = ?, reason = ?, lease_expires = NULL, updated_at = ?
+        WHERE login = ? AND worker = ? AND status = 'claimed'
+        """,
+        ("done" if reason is None else "failed", reason, time.time(), login, worker),
+    )
+    if cursor.rowcount == 0:
+        LOG.warning(
+            "⚠️ Lease on organization '{}' was lost; outcome not recorded".format(login)
+        )
+        return False
+    return True
+
+
+def reset_failed(conn: sqlite3.Connection) -> int:
+    """
+    Return failed organizations to the pending state. Returns how many were reset.
+    """
+    cursor = conn.execute(
+        "UPDATE jobs SET status = 'pending', worker = NULL, updated_at = ? WHERE status = 'failed'",
+        (time.time(),),
+    )
+    return cursor.rowcount
+
+
+def counts(conn: sqlite3.Connection) -> dict[str, int]:
+    """
+    Count the jobs in each state.
+    """
+    result = {"pending": 0, "claimed": 0, "done": 0, "failed": 0}
+    for row in conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+        result[row[0]] = row[1]
+    return result
+
+
+def failures(conn: sqlite3.Connection) -> list[tuple[str, str]]:
+    """
+    List the failed organizations and their reasons.
+    """
+    return [
+        (row["login"], row["reason"])
+        for row in conn.execute(
+            "SELECT login, reason FROM jobs WHERE status = 'failed' ORDER BY login"
+        )
+    ]